@@ -11,6 +11,10 @@ MYSQL_OPERATOR_PYTHON_DEPS_VERSION="3.9.5"
 MYSQL_SHELL_VERSION=8.0.33
 MYSQL_CONFIG_PKG="mysql80-community-release"
 MYSQL_SHELL_REPO="mysql-tools-community"
+# mysqlbinlog for binlogArchive backups, from the client package of the
+# server version the operator deploys by default
+MYSQL_SERVER_VERSION=8.0.33
+MYSQL_SERVER_REPO="mysql80-community"
 if [ -n "${1}" ]; then
   MYSQL_REPO_URL="${1}"
 fi
@@ -26,10 +30,18 @@ fi
 if [ -n "${5}" ]; then
  MYSQL_SHELL_REPO="${5}"
 fi
+if [ -n "${6}" ]; then
+ MYSQL_SERVER_VERSION="${6}"
+fi
+if [ -n "${7}" ]; then
+ MYSQL_SERVER_REPO="${7}"
+fi
 sed 's#%%MYSQL_OPERATOR_PYTHON_DEPS%%#'"${MYSQL_OPERATOR_PYTHON_DEPS}:${MYSQL_OPERATOR_PYTHON_DEPS_VERSION}"'#g' docker-build/Dockerfile > tmpfile
 sed -i 's#%%MYSQL_SHELL_VERSION%%#'"${MYSQL_SHELL_VERSION}"'#g' tmpfile
 sed -i 's#%%MYSQL_REPO_URL%%#'"${MYSQL_REPO_URL}"'#g' tmpfile
 sed -i 's#%%MYSQL_CONFIG_PKG%%#'"${MYSQL_CONFIG_PKG}"'#g' tmpfile
 sed -i 's#%%MYSQL_SHELL_REPO%%#'"${MYSQL_SHELL_REPO}"'#g' tmpfile
+sed -i 's#%%MYSQL_SERVER_VERSION%%#'"${MYSQL_SERVER_VERSION}"'#g' tmpfile
+sed -i 's#%%MYSQL_SERVER_REPO%%#'"${MYSQL_SERVER_REPO}"'#g' tmpfile
 
 mv tmpfile Dockerfile
@@ -6,17 +6,24 @@
 
 import sys
 import os
+import math
+import time
+import shutil
+import subprocess
+import tempfile
 import multiprocessing
 import argparse
 import mysqlsh
 from .controller import consts, utils, config, shellutils
-from .controller import storage_api
+from .controller import storage_api, snapshot, binlog_archive
+from .controller.gtid import GTIDSet
 from .controller.backup.backup_api import MySQLBackup
-from .controller.backup import backup_objects
+from .controller.backup import backup_objects, backup_stats
 
 from .controller.innodbcluster.cluster_api import InnoDBCluster
 import logging
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional
 
 BACKUP_OCI_USER_NAME = "OCI_USER_NAME"
 BACKUP_OCI_FINGERPRINT = "OCI_FINGERPRINT"
@@ -28,14 +35,6 @@ OCI_API_KEY_NAME = "OCI_API_KEY_NAME"
 OCI_CONFIG_FILE_NAME = "config"
 
 
-def get_dir_size(d):
-    size = 0
-    for dirpath, dirnames, filenames in os.walk(d):
-        for f in filenames:
-            size += os.path.getsize(os.path.join(dirpath, f))
-    return size
-
-
 def execute_dump_instance(backup_source, profile, backupdir, backup_name, logger: logging.Logger):
     shell = mysqlsh.globals.shell
     util = mysqlsh.globals.util
@@ -88,13 +87,13 @@ def execute_dump_instance(backup_source, profile, backupdir, backup_name, logger
             f"Could not connect to {backup_source['host']}:{backup_source['port']}: {e}")
         raise
 
+    dump_start = time.monotonic()
     try:
         util.dump_instance(output, options)
     except mysqlsh.Error as e:
         logger.error(f"dump_instance failed: {e}")
         raise
-
-    # TODO get backup size and other stats from the dump cmd itself
+    dump_time = time.monotonic() - dump_start
 
     if profile.storage.ociObjectStorage:
         tenancy = [line.split("=")[1].strip() for line in open(
@@ -121,13 +120,16 @@ def execute_dump_instance(backup_source, profile, backupdir, backup_name, logger
     elif profile.storage.persistentVolumeClaim:
         fsinfo = os.statvfs(backupdir)
         gb_avail = (fsinfo.f_frsize * fsinfo.f_bavail) / (1024*1024*1024)
-        backup_size = get_dir_size(output) / (1024*1024*1024)
+        stats = backup_stats.get_dump_stats(output, logger)
+        backup_size = stats["size"] / (1024*1024*1024)
         info = {
             "method": "dump-instance/volume",
             "source": f"{backup_source['user']}@{backup_source['host']}:{backup_source['port']}",
             "spaceAvailable": f"{gb_avail:.4}G",
-            "size": f"{backup_size:.4}G"
+            "size": f"{backup_size:.4}G",
+            "fileCount": stats["fileCount"]
         }
+        info.update(backup_stats.dump_stats_info(stats, dump_time))
     else:
         assert False
 
@@ -136,58 +138,378 @@ def execute_dump_instance(backup_source, profile, backupdir, backup_name, logger
     return info
 
 
-def execute_clone_snapshot(backup_source, profile, backupdir: Optional[str], backup_name: str, logger: logging.Logger) -> dict:
-    ...
+def get_binlog_gtid_sets(session) -> List[binlog_archive.Binlog]:
+    """
+    Returns the name, the GTIDs executed before and the GTIDs contained in
+    each binary log of the instance, except the one being written.
+    """
+    names = [row[0] for row in session.run_sql("SHOW BINARY LOGS").fetch_all()]
+
+    previous = []
+    for name in names:
+        gtids = GTIDSet()
+        for event in session.run_sql("SHOW BINLOG EVENTS IN ? LIMIT 3", [name]).fetch_all():
+            # Log_name, Pos, Event_type, Server_id, End_log_pos, Info
+            if event[2] == "Previous_gtids":
+                gtids = GTIDSet.parse(event[5])
+                break
+        previous.append(gtids)
+
+    return [(names[i], previous[i], previous[i + 1] - previous[i])
+            for i in range(len(names) - 1)]
+
+
+def execute_binlog_archive(backup_source, profile, backupdir, cluster_name: str, logger: logging.Logger) -> dict:
+    """
+    Copy the binary logs with transactions not archived yet from the source
+    to a directory of the storage shared by all runs, and add them to the
+    index of the archive.
+
+    The index lists the GTIDs in each file, so that a restore can pick the
+    files with the transactions missing from a full dump and replay them up
+    to a point in time. Files are tracked by GTIDs rather than by name, as
+    the source may be a different instance each time.
+    """
+    mysql = mysqlsh.mysql
 
+    if not shutil.which("mysqlbinlog"):
+        raise Exception("mysqlbinlog is required for binlogArchive backups, but it was not found")
 
-def pick_source_instance(cluster, logger: logging.Logger):
-    mysql = mysqlsh.mysql
+    archive_dir = os.path.join(backupdir, f"{cluster_name}-binlogs")
+    os.makedirs(archive_dir, exist_ok=True)
+
+    index = binlog_archive.read_index(archive_dir)
+
+    source = f"{backup_source['user']}@{backup_source['host']}:{backup_source['port']}"
+
+    session = mysql.get_session(backup_source)
+    try:
+        server_uuid = session.run_sql("SELECT @@server_uuid").fetch_one()[0]
+        # close the current binlog so everything executed so far is archived,
+        # without writing the FLUSH to the binlog of other members
+        session.run_sql("FLUSH LOCAL BINARY LOGS")
+        binlogs = get_binlog_gtid_sets(session)
+    finally:
+        session.close()
+
+    to_archive, gap = binlog_archive.select_binlogs(index, binlogs, server_uuid)
+    if gap:
+        logger.warning(f"Binary logs with {gap} were purged before they could be archived, point-in-time recovery needs a full backup taken after {to_archive[0][0]}")
+    archived = binlog_archive.archived_gtids(index)
 
-    primary = None
-    best_secondary = None
-    best_secondary_applier_queue_size = None
+    logger.info(f"Archiving {len(to_archive)} binary logs from {source} to {archive_dir}")
 
-    for pod in cluster.get_pods():
-        if pod.deleting:
-            continue
+    size = 0
+    if to_archive:
+        # keep the password out of the command line and off the backup
+        # volume, in the emptyDir of the shell config (or the container)
+        fd, cnf = tempfile.mkstemp(prefix="binlog-archive-", suffix=".cnf",
+                                   dir=os.getenv("MYSQLSH_USER_CONFIG_HOME"))
         try:
-            with shellutils.DbaWrap(shellutils.connect_dba(pod.endpoint_co, logger, max_tries=3)) as dba:
-                try:
-                    tmp = dba.get_cluster().status({"extended": 1})["defaultReplicaSet"]
-                    cluster_status = tmp["status"]
-                    self_uuid = dba.session.run_sql("select @@server_uuid").fetch_one()[0]
-                    member_status = [x for x in tmp["topology"].values() if x["memberId"] == self_uuid][0]
-                except mysqlsh.Error as e:
-                    logger.warning(
-                        f"Could not get cluster status from {pod}: {e}")
-                    continue
-                applier_queue_size = dba.session.run_sql(
-                    "SELECT COUNT_TRANSACTIONS_REMOTE_IN_APPLIER_QUEUE"
-                    " FROM performance_schema.replication_group_member_stats"
-                    " WHERE member_id = @@server_uuid").fetch_one()[0]
+            with open(fd, "w") as f:
+                password = backup_source["password"].replace("\\", "\\\\").replace('"', '\\"')
+                f.write(f"[client]\npassword=\"{password}\"\n")
+            # --raw writes each binlog as <result-file><binlog name>
+            subprocess.run(["mysqlbinlog", f"--defaults-extra-file={cnf}",
+                            "--read-from-remote-server", "--raw",
+                            f"--host={backup_source['host']}",
+                            f"--port={backup_source['port']}",
+                            f"--user={backup_source['user']}",
+                            f"--result-file={archive_dir}/{server_uuid}-"]
+                           + [name for name, _, _ in to_archive],
+                           check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"mysqlbinlog failed: {e.stderr}")
+            raise
+        finally:
+            os.unlink(cnf)
+
+        now = utils.isotime()
+        for name, _, gtids in to_archive:
+            file = f"{server_uuid}-{name}"
+            file_size = os.stat(os.path.join(archive_dir, file)).st_size
+            size += file_size
+            archived |= gtids
+            index["binlogs"].append({
+                "file": file,
+                "source": source,
+                "serverUuid": server_uuid,
+                "binlog": name,
+                "gtidSet": str(gtids),
+                "size": file_size,
+                "archiveTime": now
+            })
+        binlog_archive.write_index(archive_dir, index)
+
+    fsinfo = os.statvfs(backupdir)
+    gb_avail = (fsinfo.f_frsize * fsinfo.f_bavail) / (1024*1024*1024)
+
+    logger.info(f"Binary log archive has {archived}")
+
+    return {
+        "method": "binlog-archive/volume",
+        "source": source,
+        "spaceAvailable": f"{gb_avail:.4}G",
+        "size": f"{size / (1024*1024*1024):.4}G",
+        "fileCount": len(to_archive),
+        "gtidSet": str(binlog_archive.start_gtids(index) | archived)
+    }
+
+
+# Directory shared with the scratch MySQL instance of the backup job, see
+# backup_objects.add_clone_scratch_to_pod_spec()
+CLONE_SCRATCH_DIR = "/scratch"
+# How long to wait for the scratch instance to come up, in seconds
+k_scratch_start_timeout = 300
+
+
+def connect_scratch_instance(logger: logging.Logger):
+    deadline = time.monotonic() + k_scratch_start_timeout
+    while True:
+        try:
+            return mysqlsh.mysql.get_session({"scheme": "mysql", "user": "root",
+                                              "socket": os.path.join(CLONE_SCRATCH_DIR, "mysqld.sock")})
         except mysqlsh.Error as e:
-            logger.warning(f"Could not connect to {pod}: {e}")
-            continue
+            if time.monotonic() > deadline:
+                logger.error(f"Scratch instance did not start: {e}")
+                raise
+            time.sleep(2)
+
+
+def configure_scratch_instance(backup_source, logger: logging.Logger) -> None:
+    """
+    Write the my.cnf of the scratch instance, which waits for it to start,
+    with the plugins and settings of the source, which CLONE requires the
+    recipient to have too.
+    """
+    session = mysqlsh.mysql.get_session({"scheme": "mysql", "host": backup_source["host"],
+                                         "port": int(backup_source["port"]),
+                                         "user": backup_source["user"],
+                                         "password": backup_source["password"],
+                                         "connect-timeout": 10000})
+    try:
+        plugins = dict(session.run_sql(
+            "SELECT plugin_name, plugin_library FROM information_schema.plugins"
+            " WHERE plugin_status = 'ACTIVE' AND plugin_library IS NOT NULL").fetch_all())
+        variables = dict(session.run_sql(
+            "SELECT variable_name, variable_value FROM performance_schema.global_variables"
+            " WHERE variable_name IN (" + ",".join(["?"] * len(snapshot.k_clone_recipient_variables)) + ")",
+            list(snapshot.k_clone_recipient_variables)).fetch_all())
+    finally:
+        session.close()
 
-        logger.info(
-            f"Cluster status from {pod} is {cluster_status}, member_status={member_status} applier_queue_size={applier_queue_size}")
-        if not cluster_status.startswith("OK") or member_status["memberState"] != "ONLINE":
-            continue
+    logger.info(f"Scratch instance plugins={list(plugins.values())} settings={variables}")
 
-        if member_status["memberRole"] == "SECONDARY":
-            if not best_secondary or applier_queue_size < best_secondary_applier_queue_size:
-                best_secondary = pod.endpoint_co
-                best_secondary_applier_queue_size = applier_queue_size
+    path = os.path.join(CLONE_SCRATCH_DIR, snapshot.CLONE_RECIPIENT_CNF)
+    with open(path + ".tmp", "w") as f:
+        f.write(snapshot.clone_recipient_config(CLONE_SCRATCH_DIR, plugins, variables))
+    os.replace(path + ".tmp", path)
 
-                if applier_queue_size == 0:
-                    break
-        else:
-            primary = pod.endpoint_co
 
-    if best_secondary:
-        return best_secondary
-    elif primary:
-        return primary
+def stop_scratch_instance() -> None:
+    """
+    Tell the scratch instance of a snapshot backup job to stop, otherwise
+    the Job never completes. Nothing to do for other backup methods.
+    """
+    if os.path.isdir(CLONE_SCRATCH_DIR):
+        open(os.path.join(CLONE_SCRATCH_DIR, snapshot.CLONE_RECIPIENT_DONE), "w").close()
+
+
+def execute_clone_snapshot(backup_source, profile, backupdir: Optional[str], backup_name: str, logger: logging.Logger) -> dict:
+    """
+    Clone the source into the scratch instance of the backup job and copy
+    the cloned files to the storage as compressed chunks, in parallel.
+
+    The copy is a physical snapshot of the source, with the GTIDs and binlog
+    position it's consistent with in its manifest.
+
+    The caller stops the scratch instance with stop_scratch_instance().
+    """
+    clone_dir = os.path.join(CLONE_SCRATCH_DIR, "clone")
+    output = os.path.join(backupdir, backup_name)
+    source = f"{backup_source['user']}@{backup_source['host']}:{backup_source['port']}"
+
+    configure_scratch_instance(backup_source, logger)
+
+    session = connect_scratch_instance(logger)
+    try:
+        logger.info(f"Cloning {source} into {clone_dir}")
+        clone_start = time.monotonic()
+        session.run_sql("SET GLOBAL clone_valid_donor_list = ?",
+                        [f"{backup_source['host']}:{backup_source['port']}"])
+        session.run_sql("CLONE INSTANCE FROM ?@?:? IDENTIFIED BY ? DATA DIRECTORY = ?",
+                        [backup_source["user"], backup_source["host"], int(backup_source["port"]),
+                         backup_source["password"], clone_dir])
+        clone_time = time.monotonic() - clone_start
+
+        gtid_executed, binlog_file, binlog_position = session.run_sql(
+            "SELECT gtid_executed, binlog_file, binlog_position"
+            " FROM performance_schema.clone_status").fetch_one()
+    except mysqlsh.Error as e:
+        logger.error(f"Clone failed: {e}")
+        raise
+    finally:
+        session.close()
+
+    logger.info(f"Clone finished in {clone_time:.1f}s, writing snapshot to {output}")
+
+    manifest = snapshot.write_snapshot(clone_dir, output, snapshot.default_threads(), {
+        "source": source,
+        "gtidExecuted": gtid_executed.replace("\n", ""),
+        "binlogFile": binlog_file,
+        "binlogPosition": binlog_position
+    })
+
+    stats = manifest["stats"]
+    fsinfo = os.statvfs(backupdir)
+    gb_avail = (fsinfo.f_frsize * fsinfo.f_bavail) / (1024*1024*1024)
+
+    info = {
+        "method": "clone-snapshot/volume",
+        "source": source,
+        "spaceAvailable": f"{gb_avail:.4}G",
+        "size": f"{stats['size'] / (1024*1024*1024):.4}G",
+        "dataSize": backup_stats.format_size(stats["dataSize"]),
+        "fileCount": stats["fileCount"],
+        "gtidSet": manifest["gtidExecuted"]
+    }
+    if clone_time + stats["seconds"] > 0:
+        info["throughput"] = backup_stats.format_size(stats["dataSize"] / (clone_time + stats["seconds"])) + "/s"
+    if stats["seconds"] > 0:
+        info["writeThroughput"] = backup_stats.format_size(stats["size"] / stats["seconds"]) + "/s"
+
+    logger.info(f"Snapshot finished successfully")
+
+    return info
+
+
+# Max number of instances probed at the same time by pick_source_instance()
+k_max_parallel_probes = 8
+# How long probing one instance may take, in seconds
+k_probe_timeout = 20
+
+# Weights of the load signals in the score of a backup source, lower is better.
+# A backup already running on an instance counts as much as 10s of lag
+k_score_applier_queue = 1
+k_score_lag_second = 100
+k_score_threads_running = 10
+k_score_pending_io = 10
+k_score_active_backup = 1000
+
+k_probe_member_sql = """
+SELECT m.member_state, m.member_role,
+    (SELECT COUNT(*) FROM performance_schema.replication_group_members
+        WHERE member_state = 'ONLINE'),
+    (SELECT COUNT(*) FROM performance_schema.replication_group_members),
+    s.count_transactions_remote_in_applier_queue
+FROM performance_schema.replication_group_members m
+    JOIN performance_schema.replication_group_member_stats s
+        ON s.member_id = m.member_id
+WHERE m.member_id = @@server_uuid
+"""
+
+k_probe_lag_sql = """
+SELECT COALESCE(MAX(IF(applying_transaction <> '',
+    TIMESTAMPDIFF(MICROSECOND, applying_transaction_original_commit_timestamp, NOW(6)),
+    0)), 0) / 1000000
+FROM performance_schema.replication_applier_status_by_worker
+WHERE channel_name = 'group_replication_applier'
+"""
+
+k_probe_load_sql = """
+SELECT
+    (SELECT variable_value FROM performance_schema.global_status
+        WHERE variable_name = 'Threads_running'),
+    (SELECT SUM(variable_value) FROM performance_schema.global_status
+        WHERE variable_name IN ('Innodb_data_pending_reads',
+            'Innodb_data_pending_writes', 'Innodb_os_log_pending_writes')),
+    (SELECT COUNT(*) FROM performance_schema.threads
+        WHERE processlist_command = 'Query'
+            AND processlist_info LIKE 'SELECT SQL_NO_CACHE %')
+"""
+
+
+def probe_backup_source(pod, logger: logging.Logger) -> Optional[dict]:
+    """
+    Returns the state and load of an instance as a backup source, or None if
+    it can't be used.
+
+    Uses only a few queries on performance_schema instead of the AdminAPI,
+    which would query every other member of the cluster too.
+    """
+    try:
+        with shellutils.connect_to_pod(pod, logger, max_tries=2) as session:
+            row = session.run_sql(k_probe_member_sql).fetch_one()
+            if not row:
+                logger.info(f"{pod} is not a member of the group")
+                return None
+            state, role, online, members, applier_queue = row
+            # an instance of a minority partition isn't up to date
+            if state != "ONLINE" or online * 2 <= members:
+                logger.info(f"{pod} is {state}, {online} of {members} members ONLINE")
+                return None
+
+            lag = float(session.run_sql(k_probe_lag_sql).fetch_one()[0] or 0)
+            threads_running, pending_io, active_dump_threads = \
+                session.run_sql(k_probe_load_sql).fetch_one()
+    except mysqlsh.Error as e:
+        logger.warning(f"Could not probe {pod}: {e}")
+        return None
+
+    probe = {
+        "pod": pod,
+        "role": role,
+        "applierQueue": int(applier_queue or 0),
+        "lag": lag,
+        "threadsRunning": int(threads_running or 0),
+        "pendingIO": int(pending_io or 0),
+        # dump_instance() reads chunks with SELECT SQL_NO_CACHE
+        "activeBackup": int(active_dump_threads or 0) > 0
+    }
+    probe["score"] = (probe["applierQueue"] * k_score_applier_queue
+                      + probe["lag"] * k_score_lag_second
+                      + probe["threadsRunning"] * k_score_threads_running
+                      + probe["pendingIO"] * k_score_pending_io
+                      + probe["activeBackup"] * k_score_active_backup)
+    return probe
+
+
+def pick_source_instance(cluster, logger: logging.Logger):
+    """
+    Pick the least loaded ONLINE secondary to backup from, or the primary if
+    there's none. All instances are probed in parallel.
+    """
+    pods = [pod for pod in cluster.get_pods() if not pod.deleting]
+
+    probes = []
+    if pods:
+        num_threads = min(k_max_parallel_probes, len(pods))
+        deadline = time.monotonic() + k_probe_timeout * math.ceil(len(pods) / num_threads)
+
+        executor = ThreadPoolExecutor(max_workers=num_threads,
+                                      thread_name_prefix="probe")
+        try:
+            futures = {pod: executor.submit(probe_backup_source, pod, logger)
+                       for pod in pods}
+            for pod, future in futures.items():
+                try:
+                    probe = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    logger.warning(f"Timeout probing {pod}")
+                    continue
+                if probe:
+                    logger.info(f"Backup source candidate {probe}")
+                    probes.append(probe)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    secondaries = [p for p in probes if p["role"] == "SECONDARY"]
+    primaries = [p for p in probes if p["role"] == "PRIMARY"]
+    candidates = secondaries or primaries
+    if candidates:
+        best = min(candidates, key=lambda p: (p["score"], p["pod"].index))
+        logger.info(f"Picked {best['pod']} as backup source, score={best['score']}")
+        return best["pod"].endpoint_co
 
     raise Exception(
         f"No instances available to backup from in cluster {cluster.name}")
@@ -207,6 +529,8 @@ def do_backup(backup : MySQLBackup, job_name: str, start, backupdir: Optional[st
         return execute_dump_instance(backup_source, profile.dumpInstance, backupdir, job_name, logger)
     elif profile.snapshot:
         return execute_clone_snapshot(backup_source, profile.snapshot, backupdir, job_name, logger)
+    elif profile.binlogArchive:
+        return execute_binlog_archive(backup_source, profile.binlogArchive, backupdir, cluster.name, logger)
     else:
         raise Exception(f"Invalid backup method in profile {profile.name}")
 
@@ -303,6 +627,9 @@ def command_do_create_backup(namespace, name, job_name: str, backup_dir: str, lo
             time.sleep(60*60)
 
         return False
+    finally:
+        # must happen however the backup ended, even before it started
+        stop_scratch_instance()
     return True
 
 
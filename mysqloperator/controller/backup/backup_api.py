@@ -12,24 +12,35 @@ from .. innodbcluster import cluster_api
 
 
 class Snapshot:
+    """
+    Clones the source instance into a scratch instance of the backup job and
+    copies the cloned files to the storage. The clone is kept in an emptyDir,
+    so the node needs ephemeral storage for a copy of the source instance,
+    which scratchSizeLimit requests.
+    """
     def __init__(self):
         self.storage: Optional[StorageSpec] = None
+        self.scratchSizeLimit: Optional[str] = None
 
     def add_to_pod_spec(self, pod_spec: dict, container_name: str) -> None:
         self.storage.add_to_pod_spec(pod_spec, container_name)
 
     def parse(self, spec: dict, prefix: str) -> None:
         storage = dget_dict(spec, "storage", prefix)
-        self.storage = StorageSpec(
-            ["ociObjectStorage", "s3", "azure", "persistentVolumeClaim"])
+        # snapshots are written as files by the backup job
+        self.storage = StorageSpec(["persistentVolumeClaim"])
         self.storage.parse(storage, prefix+".storage")
 
+        if "scratchSizeLimit" in spec:
+            self.scratchSizeLimit = dget_str(spec, "scratchSizeLimit", prefix)
+
     def __str__(self) -> str:
-        return f"Object Snapshot: storage={self.storage}"
+        return f"Object Snapshot: storage={self.storage} scratchSizeLimit={self.scratchSizeLimit}"
 
     def __eq__(self, other : 'Snapshot') -> bool:
         assert isinstance(other, Snapshot)
-        return (self.storage == other.storage)
+        return (self.storage == other.storage and \
+                self.scratchSizeLimit == other.scratchSizeLimit)
 
 
 class DumpInstance:
@@ -57,20 +68,49 @@ class DumpInstance:
                 self.storage == other.storage)
 
 
+class BinlogArchive:
+    """
+    Copies the binary logs not archived yet to the storage each time it runs,
+    for point-in-time recovery on top of a full dump.
+    """
+    def __init__(self):
+        self.storage: Optional[StorageSpec] = None
+
+    def add_to_pod_spec(self, pod_spec: dict, container_name: str) -> None:
+        self.storage.add_to_pod_spec(pod_spec, container_name)
+
+    def parse(self, spec: dict, prefix: str) -> None:
+        storage = dget_dict(spec, "storage", prefix)
+        # binlogs are fetched as files by mysqlbinlog, which can't write to
+        # object storage
+        self.storage = StorageSpec(["persistentVolumeClaim"])
+        self.storage.parse(storage, prefix+".storage")
+
+    def __str__(self) -> str:
+        return f"Object BinlogArchive: storage={self.storage}"
+
+    def __eq__(self, other : 'BinlogArchive') -> bool:
+        assert isinstance(other, BinlogArchive)
+        return (self.storage == other.storage)
+
+
 class BackupProfile:
     def __init__(self):
         self.name: str = ""
         self.dumpInstance: Optional[DumpInstance] = None
         self.snapshot: Optional[Snapshot] = None
+        self.binlogArchive: Optional[BinlogArchive] = None
         self.podAnnotations: Optional[dict] = None
         self.podLabels: Optional[dict] = None
 
     def add_to_pod_spec(self, pod_spec: dict, container_name: str) -> None:
-        assert self.snapshot or self.dumpInstance
+        assert self.snapshot or self.dumpInstance or self.binlogArchive
         if self.snapshot:
             return self.snapshot.add_to_pod_spec(pod_spec, container_name)
         if self.dumpInstance:
             return self.dumpInstance.add_to_pod_spec(pod_spec, container_name)
+        if self.binlogArchive:
+            return self.binlogArchive.add_to_pod_spec(pod_spec, container_name)
 
     def parse(self, spec: dict, prefix: str, name_required: bool = True) -> None:
         self.name = dget_str(spec, "name", prefix, default_value= None if name_required else "")
@@ -89,23 +129,29 @@ class BackupProfile:
         if method_spec:
             self.snapshot = Snapshot()
             self.snapshot.parse(method_spec, prefix+".snapshot")
+        method_spec = dget_dict(spec, "binlogArchive", prefix, {})
+        if method_spec:
+            self.binlogArchive = BinlogArchive()
+            self.binlogArchive.parse(method_spec, prefix+".binlogArchive")
 
-        if self.dumpInstance and self.snapshot:
+        methods = [m for m in (self.dumpInstance, self.snapshot, self.binlogArchive) if m]
+        if len(methods) > 1:
             raise ApiSpecError(
-                f"Only one of dumpInstance or snapshot may be set in {prefix}")
+                f"Only one of dumpInstance, snapshot or binlogArchive may be set in {prefix}")
 
-        if not self.dumpInstance and not self.snapshot:
+        if not methods:
             raise ApiSpecError(
-                f"One of dumpInstance or snapshot must be set in a {prefix}")
+                f"One of dumpInstance, snapshot or binlogArchive must be set in a {prefix}")
 
     def __str__(self) -> str:
-        return f"Object BackupProfile name={self.name} dumpInstance={self.dumpInstance} snapshot={self.snapshot} podAnnotations={self.podAnnotations} podLabels={self.podLabels}"
+        return f"Object BackupProfile name={self.name} dumpInstance={self.dumpInstance} snapshot={self.snapshot} binlogArchive={self.binlogArchive} podAnnotations={self.podAnnotations} podLabels={self.podLabels}"
 
     def __eq__(self, other: 'BackupProfile') -> bool:
         assert isinstance(other, BackupProfile)
         return (self.name == other.name and \
                 self.dumpInstance == other.dumpInstance and \
-                self.snapshot == other.snapshot)
+                self.snapshot == other.snapshot and \
+                self.binlogArchive == other.binlogArchive)
 
 class BackupSchedule:
     def __init__(self, cluster_spec):
@@ -184,6 +230,8 @@ class MySQLBackupSpec:
         self.addTimestampToBackupDirectory: bool = True
         self.operator_image: str = ""
         self.operator_image_pull_policy: str = ""
+        self.mysql_image: str = ""
+        self.mysql_image_pull_policy: str = ""
         self.image_pull_secrets: Optional[str] = None
         self.service_account_name: Optional[str] = None
         self.parse(spec)
@@ -213,6 +261,8 @@ class MySQLBackupSpec:
 
         self.operator_image = cluster.parsed_spec.operator_image
         self.operator_image_pull_policy = cluster.parsed_spec.operator_image_pull_policy
+        self.mysql_image = cluster.parsed_spec.mysql_image
+        self.mysql_image_pull_policy = cluster.parsed_spec.mysql_image_pull_policy
         self.image_pull_secrets = cluster.parsed_spec.image_pull_secrets
         self.service_account_name = cluster.parsed_spec.service_account_name
 
@@ -9,7 +9,7 @@ import yaml
 import kopf
 from copy import deepcopy
 from .backup_api import BackupProfile, BackupSchedule, MySQLBackupSpec
-from .. import utils, config, consts
+from .. import utils, config, consts, snapshot
 from .. innodbcluster.cluster_api import InnoDBClusterSpec
 from .. kubeutils import api_cron_job, k8s_cluster_domain
 
@@ -42,6 +42,44 @@ data:
     return yaml.safe_load(tmpl)
 
 
+def add_clone_scratch_to_pod_spec(pod_spec: dict, spec: MySQLBackupSpec, container_name: str) -> None:
+    """
+    Add a MySQL server container to the backup job pod, which snapshot
+    backups clone the source instance into. The backup container writes its
+    my.cnf, with the plugins and settings of the source, and tells it to
+    stop by creating /scratch/done. The data is written to an emptyDir,
+    which must fit a copy of the source instance. If the profile sets
+    scratchSizeLimit, the emptyDir is limited to it and the container
+    requests as much ephemeral storage, so the pod is only scheduled to a
+    node with enough of it.
+    """
+    size_limit = spec.backupProfile.snapshot.scratchSizeLimit
+    container = {
+        "name": "scratch-mysql",
+        "image": spec.mysql_image,
+        "imagePullPolicy": spec.mysql_image_pull_policy,
+        "command": ["bash", "-c", snapshot.clone_recipient_script("/scratch")],
+        "securityContext": {
+            "allowPrivilegeEscalation": False,
+            "privileged": False,
+            "capabilities": {"drop": ["ALL"]}
+        },
+        "volumeMounts": [{"name": "scratch", "mountPath": "/scratch"}]
+    }
+    scratch_volume = {}
+    if size_limit:
+        container["resources"] = {"requests": {"ephemeral-storage": size_limit}}
+        scratch_volume["sizeLimit"] = size_limit
+    utils.merge_patch_object(pod_spec, {"spec": {
+        "containers": [
+            {"name": container_name,
+             "volumeMounts": [{"name": "scratch", "mountPath": "/scratch"}]},
+            container
+        ],
+        "volumes": [{"name": "scratch", "emptyDir": scratch_volume}]
+    }})
+
+
 def prepare_backup_job(jobname: str, spec: MySQLBackupSpec) -> dict:
     cluster_domain = k8s_cluster_domain(None)
 
@@ -117,6 +155,9 @@ spec:
 
     spec.add_to_pod_spec(job["spec"]["template"], "operator-backup-job")
 
+    if spec.backupProfile.snapshot:
+        add_clone_scratch_to_pod_spec(job["spec"]["template"], spec, "operator-backup-job")
+
     return job
 
 
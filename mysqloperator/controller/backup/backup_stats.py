@@ -0,0 +1,99 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from typing import Tuple
+import json
+import logging
+import os
+
+# Written by dump_instance() when the dump completes, has the size of each
+# data chunk file and of the data of each table
+DUMP_DONE_FILE = "@.done.json"
+
+
+def get_dir_size(d) -> Tuple[int, int]:
+    """Returns the total size and number of files in a directory tree"""
+    size = 0
+    count = 0
+    dirs = [d]
+    while dirs:
+        with os.scandir(dirs.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                else:
+                    size += entry.stat(follow_symlinks=False).st_size
+                    count += 1
+    return size, count
+
+
+def get_dump_stats(d, logger: logging.Logger) -> dict:
+    """
+    Returns the size, number of files, data size and per schema data size
+    of a completed dump in a local directory.
+
+    The sizes of the data chunk files, which are most of the files in a dump,
+    come from the dump's own DUMP_DONE_FILE, so only the few metadata files
+    need to be stat'ed. Falls back to stat'ing every file if it can't be read.
+    """
+    try:
+        with open(os.path.join(d, DUMP_DONE_FILE)) as f:
+            done = json.load(f)
+        chunk_sizes = done["chunkFileBytes"]
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not read dump size from {DUMP_DONE_FILE}, will scan {d}: {e}")
+        size, count = get_dir_size(d)
+        return {"size": size, "fileCount": count}
+
+    size = sum(chunk_sizes.values())
+    count = len(chunk_sizes)
+    with os.scandir(d) as it:
+        for entry in it:
+            if entry.name in chunk_sizes:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                dsize, dcount = get_dir_size(entry.path)
+                size += dsize
+                count += dcount
+            else:
+                size += entry.stat(follow_symlinks=False).st_size
+                count += 1
+
+    # uncompressed size of the data dumped from each table
+    schema_sizes = {schema: sum(tables.values())
+                    for schema, tables in done.get("tableDataBytes", {}).items()}
+
+    return {
+        "size": size,
+        "fileCount": count,
+        "dataSize": done.get("dataBytes", sum(schema_sizes.values())),
+        "schemaSizes": schema_sizes
+    }
+
+
+def format_size(size: float) -> str:
+    size = float(size)
+    for unit in ("", "K", "M", "G"):
+        if size < 1024:
+            return f"{size:.2f}{unit}"
+        size /= 1024
+    return f"{size:.2f}T"
+
+
+def dump_stats_info(stats: dict, seconds: float) -> dict:
+    """
+    Returns the sizes and throughput of a dump for the backup status, from
+    its get_dump_stats() and how long it took.
+    """
+    info = {}
+    if "dataSize" in stats:
+        info["dataSize"] = format_size(stats["dataSize"])
+        info["schemaSizes"] = {schema: format_size(size)
+                               for schema, size in stats["schemaSizes"].items()}
+    if seconds > 0:
+        # rate of the data read from the server and of the data written
+        info["throughput"] = format_size(stats.get("dataSize", stats["size"]) / seconds) + "/s"
+        info["writeThroughput"] = format_size(stats["size"] / seconds) + "/s"
+    return info
@@ -0,0 +1,71 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from typing import List, Tuple
+import json
+import os
+from .gtid import GTIDSet
+
+# Index of the binlogs in a binlog archive, see
+# backup_main.execute_binlog_archive()
+BINLOG_ARCHIVE_INDEX = "index.json"
+
+# name, GTIDs executed before and GTIDs contained in a binary log
+Binlog = Tuple[str, GTIDSet, GTIDSet]
+
+
+def read_index(archive_dir: str) -> dict:
+    try:
+        with open(os.path.join(archive_dir, BINLOG_ARCHIVE_INDEX)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"binlogs": []}
+
+
+def write_index(archive_dir: str, index: dict) -> None:
+    path = os.path.join(archive_dir, BINLOG_ARCHIVE_INDEX)
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def archived_gtids(index: dict) -> GTIDSet:
+    archived = GTIDSet()
+    for entry in index["binlogs"]:
+        archived |= GTIDSet.parse(entry["gtidSet"])
+    return archived
+
+
+def start_gtids(index: dict) -> GTIDSet:
+    """GTIDs that must be restored from a full dump before the archive"""
+    return GTIDSet.parse(index.get("startGtidSet", ""))
+
+
+def select_binlogs(index: dict, binlogs: List[Binlog],
+                   server_uuid: str) -> Tuple[List[Binlog], GTIDSet]:
+    """
+    Returns the binlogs with transactions not in the archive yet and the
+    GTIDs purged from the source before they could be archived.
+
+    The start of the archive and the gap, if any, are recorded in the index.
+    """
+    archived = archived_gtids(index)
+    to_archive = [(name, previous, gtids) for name, previous, gtids in binlogs
+                  if gtids and not gtids <= archived]
+
+    gap = GTIDSet()
+    if to_archive:
+        name, previous, _ = to_archive[0]
+        if not index["binlogs"]:
+            # the archive starts here, the transactions before need to be
+            # restored from a full dump
+            index["startGtidSet"] = str(previous)
+        else:
+            gap = previous - (archived | start_gtids(index))
+            if gap:
+                index.setdefault("gaps", []).append(
+                    {"before": f"{server_uuid}-{name}", "gtidSet": str(gap)})
+
+    return to_archive, gap
@@ -17,6 +17,12 @@ if _pull_policy:
 else:
     default_image_pull_policy = ImagePullPolicy.Always
 
+# Number of threads used to monitor group replication view changes
+group_monitor_workers = int(os.getenv("MYSQL_OPERATOR_GROUP_MONITOR_WORKERS", "4"))
+
+# Number of threads processing queued pod events
+pod_event_workers = int(os.getenv("MYSQL_OPERATOR_POD_EVENT_WORKERS", "4"))
+
 
 # Constants
 OPERATOR_VERSION = "2.0.10"
@@ -68,6 +74,8 @@ def log_config_banner(logger) -> None:
     logger.info(f"DEFAULT_VERSION_TAG={DEFAULT_VERSION_TAG}")
     logger.info(f"SIDECAR_VERSION_TAG={DEFAULT_OPERATOR_VERSION_TAG}")
     logger.info(f"DEFAULT_IMAGE_REPOSITORY   ={DEFAULT_IMAGE_REPOSITORY}")
+    logger.info(f"GROUP_MONITOR_WORKERS={group_monitor_workers}")
+    logger.info(f"POD_EVENT_WORKERS={pod_event_workers}")
 
 
 def config_from_env() -> None:
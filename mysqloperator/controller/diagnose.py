@@ -7,18 +7,38 @@ from re import L
 from kubernetes.client.rest import ApiException
 from .innodbcluster.cluster_api import InnoDBCluster, MySQLPod
 import typing
-from typing import Optional, TYPE_CHECKING, Tuple, List, Set, Dict, cast
+from typing import Optional, TYPE_CHECKING, Tuple, List, Set, Dict, FrozenSet, cast
 from . import shellutils, consts, errors
+from .gtid import GTIDSet
 import kopf
 import mysqlsh
 import enum
 import time
+import math
+import copy
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 if TYPE_CHECKING:
     from mysqlsh.mysql import ClassicSession
     from mysqlsh import Dba, Cluster
 
 mysql = mysqlsh.mysql
 
+# Max number of instances probed in parallel while diagnosing a cluster
+k_max_parallel_probes = 9
+# Time a single instance probe may take before its instance is considered
+# UNKNOWN
+k_probe_timeout = 30
+# Connect timeout of the sessions of probes, which also have k_probe_timeout
+# as read timeout, so probes of hung instances finish by themselves
+k_probe_connect_timeout = 10
+# Whether to diagnose instances from performance_schema first and only use
+# cluster.status() when the result is ambiguous
+k_use_sql_probe = True
+# Max time a cached cluster diagnosis can be reused for
+k_cluster_status_cache_ttl = 15
+
 #
 # InnoDB Cluster Instance Diagnostic Statuses
 #
@@ -63,6 +83,89 @@ class InstanceStatus:
     def __repr__(self) -> str:
         return f"InstanceStatus: pod={self.pod} status={self.status} connect_error={self.connect_error} view_id={self.view_id} is_primary={self.is_primary} in_quorum={self.in_quorum} peers={self.peers}"
 
+def diagnose_instance_sql(pod: MySQLPod, dba: 'Dba', status: InstanceStatus, logger) -> bool:
+    """
+    Fill in the status of the instance using a single query against
+    performance_schema and the local copy of the metadata, which is much
+    cheaper than cluster.status() because it doesn't query other members.
+
+    Returns False if the result is ambiguous, in which case the caller should
+    fall back to the AdminAPI. That's the case unless all members are ONLINE,
+    including those in the metadata that aren't in the group, which
+    cluster.status() reports as (MISSING). gtid_executed is filled in if the
+    query works.
+    """
+    try:
+        res = dba.session.run_sql("""SELECT @@gtid_executed,
+            (SELECT count(*) FROM mysql_innodb_cluster_metadata.instances i
+                WHERE i.mysql_server_uuid = @@server_uuid) as managed,
+            (SELECT group_concat(i.address) FROM mysql_innodb_cluster_metadata.instances i)
+                as instances,
+            m.member_id = @@server_uuid as me,
+            concat(m.member_host, ':', m.member_port), m.member_state,
+            m.member_role, s.view_id
+    FROM (SELECT 1) AS r
+        LEFT JOIN performance_schema.replication_group_members m ON TRUE
+        LEFT JOIN performance_schema.replication_group_member_stats s
+        ON m.member_id = s.member_id""")
+        rows = res.fetch_all()
+    except mysqlsh.Error as e:
+        # missing metadata schema or anything else, let the AdminAPI sort it out
+        logger.debug(f"SQL probe failed at {pod.endpoint}: error={e}")
+        return False
+
+    if not rows:
+        return False
+
+    status.gtid_executed = rows[0][0]
+    managed = rows[0][1] > 0
+    if not managed:
+        return False
+
+    mystate = None
+    view_id = None
+    members = {}
+    for _, _, _, me, endpoint, state, role, member_view_id in rows:
+        if state is None:
+            continue
+        if me:
+            mystate = state
+            view_id = member_view_id
+            status.is_primary = state == "ONLINE" and role == "PRIMARY"
+        if endpoint and endpoint != ":":
+            members[endpoint] = state
+
+    if mystate == "OFFLINE" or mystate is None:
+        # Same as get_cluster() failing with SHERR_DBA_BADARG_INSTANCE_NOT_ONLINE
+        status.is_primary = None
+        status.status = InstanceDiagStatus.OFFLINE
+        return True
+
+    if mystate != "ONLINE" or not view_id or pod.endpoint not in members:
+        return False
+
+    for address in (rows[0][2] or "").split(","):
+        if address and address not in members:
+            members[address] = "(MISSING)"
+
+    # RECOVERING, ERROR, UNREACHABLE or MISSING members need the full
+    # picture of cluster.status() for the partition and quorum analysis
+    if any(state != "ONLINE" for state in members.values()):
+        logger.debug(f"""Not all members ONLINE at {pod.endpoint}: topology={";".join([f'{m},{s}' for m, s in members.items()])}""")
+        return False
+
+    status.in_quorum = True
+    status.view_id = view_id
+    status.peers = members
+    status.status = InstanceDiagStatus.ONLINE
+    return True
+
+
+def probe_target(pod: MySQLPod) -> dict:
+    return dict(pod.endpoint_co, **{"connect-timeout": k_probe_connect_timeout * 1000,
+                                    "net-read-timeout": k_probe_timeout * 1000})
+
+
 def diagnose_instance(pod: MySQLPod, logger, dba: 'Dba' = None) -> InstanceStatus:
     """
     Check state of an instance in the given pod.
@@ -77,7 +180,8 @@ def diagnose_instance(pod: MySQLPod, logger, dba: 'Dba' = None) -> InstanceStatu
 
     if not dba:
         try:
-            dba = mysqlsh.connect_dba(pod.endpoint_co)
+            pooled = shellutils.g_dba_pool.connect(
+                f"{pod.namespace}/{pod.cluster_name}", probe_target(pod))
         except mysqlsh.Error as e:
             logger.info(f"Could not connect to {pod.endpoint}: error={e}")
             status.connect_error = e.code
@@ -99,9 +203,16 @@ def diagnose_instance(pod: MySQLPod, logger, dba: 'Dba' = None) -> InstanceStatu
 
             return status
 
+        with pooled as dba:
+            return diagnose_instance(pod, logger, dba)
+
+    if k_use_sql_probe and diagnose_instance_sql(pod, dba, status, logger):
+        return status
+
     cluster = None
     if dba:
-        status.gtid_executed = dba.session.run_sql("select @@gtid_executed").fetch_one()[0]
+        if status.gtid_executed is None:
+            status.gtid_executed = dba.session.run_sql("select @@gtid_executed").fetch_one()[0]
 
         try:
             cluster = dba.get_cluster(None, {"connectToPrimary": False})
@@ -226,10 +337,10 @@ def check_errant_gtids(primary_session: 'ClassicSession', pod: MySQLPod, pod_dba
             raise
 
     if gtid_set:
-        # find primary
-        errants = primary_session.run_sql(
-            "SELECT GTID_SUBTRACT(?, @@globals.GTID_EXECUTED)", [gtid_set]).fetch_one()[0]
-        return errants
+        primary_gtid_set = primary_session.run_sql(
+            "SELECT @@globals.GTID_EXECUTED").fetch_one()[0]
+        errants = GTIDSet.parse(gtid_set) - GTIDSet.parse(primary_gtid_set)
+        return str(errants) if errants else None
     return None
 
 
@@ -368,39 +479,121 @@ class ClusterDiagStatus(enum.Enum):
     PENDING = "PENDING"
 
 
-def find_group_partitions(online_pod_info: Dict[str, InstanceStatus],
-                          pods: Set[MySQLPod], logger) -> Tuple[List[List[InstanceStatus]], List[Set[MySQLPod]]]:
-    # List of group partitions that have quorum and can execute transactions.
-    # If there's more than 1, then there's a split-brain. If there's none, then
-    # we have no availability.
-    active_partitions: List[List[InstanceStatus]] = []
-    # List of group partitions that have no quorum and can't execute transactions.
-    blocked_partitions: List[Set[MySQLPod]] = []
+class GroupPartition:
+    """
+    Set of group members that see each other, identified by their endpoints.
+    Iterating gives the members (InstanceStatus for active partitions,
+    MySQLPod for blocked ones).
+    """
+
+    def __init__(self, endpoints: FrozenSet[str], members: list):
+        self.endpoints = endpoints
+        self.members = members
+
+    @property
+    def id(self) -> str:
+        """Stable ID, the same for the same set of members"""
+        return hashlib.sha1(",".join(sorted(self.endpoints)).encode("utf8")).hexdigest()[:16]
+
+    def __iter__(self):
+        return iter(self.members)
 
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def __contains__(self, endpoint: str) -> bool:
+        return endpoint in self.endpoints
+
+    def __repr__(self) -> str:
+        return f"<GroupPartition {self.id} {sorted(self.endpoints)}>"
+
+
+def group_view(members: list) -> Tuple[Optional[str], Optional[str]]:
+    """
+    view_id and GroupPartition.id of the group as seen by a member, from
+    the rows of shellutils.query_members().
+    """
+    online = [m for m in members if m[2] in ("ONLINE", "RECOVERING")]
+    if not online:
+        return None, None
+    return online[0][3], GroupPartition(frozenset(m[4] for m in online), []).id
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, x: str) -> str:
+        self.parent.setdefault(x, x)
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: str, b: str) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # smallest endpoint as root, so results don't depend on order
+            if rb < ra:
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+
+    def groups(self) -> Dict[str, Set[str]]:
+        groups: Dict[str, Set[str]] = {}
+        for x in self.parent:
+            groups.setdefault(self.find(x), set()).add(x)
+        return groups
+
+
+def find_group_partitions(online_pod_info: Dict[str, InstanceStatus],
+                          pods: Set[MySQLPod], logger) -> Tuple[List[GroupPartition], List[GroupPartition]]:
+    """
+    Find the group partitions from the group views of the ONLINE members,
+    in linear time. Members are grouped by union-find over the peers each
+    of them sees.
+
+    Returns the active partitions, which have quorum and can execute
+    transactions (if there's more than 1, then there's a split-brain, if
+    there's none, then we have no availability), and the blocked partitions,
+    which have no quorum, largest first.
+    """
     all_pods = {}
     for pod in pods:
         all_pods[pod.endpoint] = pod
 
-    no_primary_active_partitions = []
+    active = UnionFind()
+    blocked = UnionFind()
 
     for ep, p in online_pod_info.items():
-        # logger.info(f"{ep}:  {'QUORUM' if p.in_quorum else 'NOQUORUM'} {'PRIM' if p.is_primary else 'SEC'} ONLINE_PODS={online_pod_info.keys()}")
-        # logger.info(f"PEERS OF {ep}={p.peers}")
         if p.in_quorum:
             online_peers = [peer for peer, state in p.peers.items() if state in ("ONLINE", "RECOVERING")] # A: UNMANAGED ?
-            missing = set(online_peers) - set(online_pod_info.keys())
+            missing = set(online_peers) - online_pod_info.keys()
             if missing:
                 logger.info(
                     f"Group view of {ep} has {p.peers.keys()} but these are not ONLINE: {missing}")
                 raise kopf.TemporaryError(
                     "Cluster status results inconsistent", delay=5)
 
-            part = [online_pod_info[peer] for peer,
-                    state in p.peers.items() if state in ("ONLINE", "RECOVERING")] # A: NOT_MANAGED ?
-            if p.is_primary:
-                active_partitions.append(part)
-            else:
-                no_primary_active_partitions.append(part)
+            active.find(ep)
+            for peer in online_peers:
+                active.union(ep, peer)
+        else:
+            blocked.find(ep)
+            for peer, state in p.peers.items():
+                if state not in ("(MISSING)", "UNREACHABLE") and peer in all_pods:
+                    blocked.union(ep, peer)
+
+    active_partitions: List[GroupPartition] = []
+    no_primary_active_partitions: List[GroupPartition] = []
+    for endpoints in active.groups().values():
+        part = GroupPartition(frozenset(endpoints),
+                              [online_pod_info[ep] for ep in sorted(endpoints)])
+        if any(p.is_primary for p in part):
+            active_partitions.append(part)
+        else:
+            no_primary_active_partitions.append(part)
 
     if not active_partitions and no_primary_active_partitions:
         # it's possible for a group with quorum to not have a PRIMARY
@@ -408,38 +601,179 @@ def find_group_partitions(online_pod_info: Dict[str, InstanceStatus],
         raise kopf.TemporaryError(
             "Cluster has quorum but no PRIMARY", delay=10)
 
-    def active_partition_with(pod):
-        for part in active_partitions:
-            if pod.endpoint in part:
-                return part
-        return None
-
-    # print()
-    for ep, p in online_pod_info.items():
-       #     print(ep, p.status, p.in_quorum, p.peers)
-        if not p.in_quorum:
-            part = active_partition_with(p)
-            assert not part, f"Inconsistent group view, {p} not expected to be in {part}"
-
-            part = set([all_pods[peer] for peer, state in p.peers.items()
-                        if state not in ("(MISSING)", "UNREACHABLE")])
-            if part not in blocked_partitions:
-                blocked_partitions.append(part)
-    # print("ACTIVE PARTS", active_partitions)
-    # print("BLOCKED PARTS", blocked_partitions)
-    # print()
+    active_endpoints = set(active.parent.keys())
+    blocked_partitions: List[GroupPartition] = []
+    for endpoints in blocked.groups().values():
+        overlap = endpoints & active_endpoints
+        if overlap:
+            # views from before and after a membership change
+            logger.info(
+                f"Group view without quorum has {overlap}, which are in a partition with quorum")
+            raise kopf.TemporaryError(
+                "Cluster status results inconsistent", delay=5)
+        blocked_partitions.append(GroupPartition(
+            frozenset(endpoints), [all_pods[ep] for ep in sorted(endpoints) if ep in all_pods]))
+
+    active_partitions.sort(key=lambda x: x.id)
     # sort by partition size
-    blocked_partitions.sort(key=lambda x: len(x), reverse=True)
+    blocked_partitions.sort(key=lambda x: (-len(x), x.id))
 
     return active_partitions, blocked_partitions
 
 
+def diagnose_instances(pods: Set[MySQLPod], logger) -> Dict[MySQLPod, InstanceStatus]:
+    """
+    Diagnose all given instances in parallel.
+
+    Probes that don't finish within their deadline are reported as UNKNOWN,
+    same as instances that can't be connected to. Their threads are left to
+    finish in the background, which they do within the connect and read
+    timeouts of their sessions.
+    """
+    if not pods:
+        return {}
+
+    num_threads = min(k_max_parallel_probes, len(pods))
+    # probes beyond num_threads have to wait for a free thread
+    deadline = time.monotonic() + k_probe_timeout * math.ceil(len(pods) / num_threads)
+
+    executor = ThreadPoolExecutor(max_workers=num_threads,
+                                  thread_name_prefix="diagnose")
+    try:
+        futures = {pod: executor.submit(diagnose_instance, pod, logger)
+                   for pod in pods}
+
+        statuses = {}
+        for pod, future in futures.items():
+            try:
+                statuses[pod] = future.result(
+                    timeout=max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                logger.warning(
+                    f"Timeout diagnosing {pod}, considering it unreachable")
+                status = InstanceStatus()
+                status.pod = pod
+                statuses[pod] = status
+        return statuses
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 class ClusterStatus:
     status: ClusterDiagStatus = ClusterDiagStatus.UNKNOWN
     primary: Optional[MySQLPod] = None
     online_members: List[MySQLPod] = []
     quorum_candidates: Optional[list] = None
     gtid_executed: Dict[int,str] = {}
+    view_id: Optional[str] = None
+    # GroupPartition.id of the active partition, if there's exactly one
+    partition_id: Optional[str] = None
+    # whether this diagnosis was taken from the ClusterStatusCache
+    cached: bool = False
+
+
+def pods_fingerprint(pods) -> tuple:
+    """
+    Summary of the pod state that can affect a cluster diagnosis.
+
+    The resourceVersion isn't used because it changes with every membership
+    info update we make ourselves.
+    """
+    return tuple(sorted((pod.name, pod.metadata.uid, pod.phase, pod.deleting,
+                         pod.check_containers_ready(),
+                         pod.get_container_restarts("mysql")) for pod in pods))
+
+
+class ClusterStatusCache:
+    """
+    Last diagnosis of each cluster, keyed by the GR view it was made in, the
+    partition of the members with quorum and the state of its pods.
+
+    Only diagnoses of healthy clusters are cached, since any other state
+    will be acted upon and must be probed again afterwards. Entries expire
+    after a TTL and are dropped when the GroupMonitor sees a new view or
+    partition, a pod is deleted or the operator changes the topology of the
+    cluster. Members becoming UNREACHABLE change the partition but not the
+    view_id, which only changes once they're expelled.
+    """
+
+    cacheable_states = (ClusterDiagStatus.ONLINE,
+                        ClusterDiagStatus.ONLINE_PARTIAL)
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(cluster: InnoDBCluster) -> str:
+        return f"{cluster.namespace}/{cluster.name}"
+
+    def get(self, cluster: InnoDBCluster, pods) -> Optional['ClusterStatus']:
+        """
+        Return a copy of the cached diagnosis that refers to the given pods,
+        which are the current ones, instead of those it was made with.
+
+        The caller must still check that the group is in the view and
+        partition of the diagnosis, since the GroupMonitor may have missed
+        the change.
+        """
+        fingerprint = pods_fingerprint(pods)
+        with self.lock:
+            entry = self.entries.get(self.key(cluster))
+            if not entry:
+                return None
+            timestamp, entry_fingerprint, status = entry
+            if time.monotonic() - timestamp > self.ttl or entry_fingerprint != fingerprint:
+                del self.entries[self.key(cluster)]
+                return None
+
+        pods_by_name = {pod.name: pod for pod in pods}
+        status = copy.copy(status)
+        status.cached = True
+        if status.primary:
+            status.primary = pods_by_name[status.primary.name]
+        status.online_members = [pods_by_name[pod.name]
+                                 for pod in status.online_members]
+        return status
+
+    def put(self, cluster: InnoDBCluster, pods, status: 'ClusterStatus') -> None:
+        with self.lock:
+            if (status.status in self.cacheable_states and status.view_id
+                    and status.partition_id):
+                self.entries[self.key(cluster)] = (
+                    time.monotonic(), pods_fingerprint(pods), status)
+            else:
+                self.entries.pop(self.key(cluster), None)
+
+    def invalidate(self, cluster: InnoDBCluster, view_id: Optional[str] = None,
+                   partition_id: Optional[str] = None) -> None:
+        """
+        Drop the cached diagnosis of the cluster, unless view_id and
+        partition_id are given and they're the ones the diagnosis was made
+        in.
+        """
+        with self.lock:
+            entry = self.entries.get(self.key(cluster))
+            if entry and (entry[2].view_id, entry[2].partition_id) != (view_id, partition_id):
+                del self.entries[self.key(cluster)]
+
+
+g_cluster_status_cache = ClusterStatusCache(k_cluster_status_cache_ttl)
+
+
+def query_group_view(pod: MySQLPod, logger) -> Tuple[Optional[str], Optional[str]]:
+    """
+    view_id and GroupPartition.id of the group as seen by the instance in
+    pod, with a single query, or (None, None) if it can't be queried.
+    """
+    try:
+        with shellutils.g_dba_pool.connect(
+                f"{pod.namespace}/{pod.cluster_name}", probe_target(pod)) as dba:
+            return group_view(shellutils.query_members(dba.session))
+    except mysqlsh.Error as e:
+        logger.info(f"Could not query group view at {pod.endpoint}: error={e}")
+        return None, None
 
 
 def do_diagnose_cluster(cluster: InnoDBCluster, logger) -> ClusterStatus:
@@ -471,12 +805,8 @@ def do_diagnose_cluster(cluster: InnoDBCluster, logger) -> ClusterStatus:
     gtid_executed = {}
 
     online_pod_statuses = {}
-    for pod in all_pods:
-        # Diagnose the instance even if deleting - so we can remove it from the cluster and later re-add it
-#        if pod.deleting:
-#            logger.info(f"instance {pod} is deleting")
-#            continue
-        status = diagnose_instance(pod, logger)
+    # Diagnose the instance even if deleting - so we can remove it from the cluster and later re-add it
+    for pod, status in diagnose_instances(all_pods, logger).items():
         logger.info(
             f"diag instance {pod} --> {status.status} quorum={status.in_quorum} gtid_executed={status.gtid_executed}")
 
@@ -530,11 +860,13 @@ def do_diagnose_cluster(cluster: InnoDBCluster, logger) -> ClusterStatus:
                 cluster_status.status = ClusterDiagStatus.ONLINE_PARTIAL
             else:
                 cluster_status.status = ClusterDiagStatus.ONLINE
+            cluster_status.partition_id = active_partitions[0].id
             cluster_status.online_members = [
                 p.pod for p in active_partitions[0] if p.pod]
             for p in active_partitions[0]:
                 if p.is_primary:
                     cluster_status.primary = p.pod
+                    cluster_status.view_id = p.view_id
                     break
         else:
             # split-brain
@@ -559,10 +891,12 @@ def do_diagnose_cluster(cluster: InnoDBCluster, logger) -> ClusterStatus:
 
     logger.debug(f"Cluster {cluster.name}  status={cluster_status.status}")
 
+    g_cluster_status_cache.put(cluster, all_pods, cluster_status)
+
     return cluster_status
 
 
-def diagnose_cluster(cluster: InnoDBCluster, logger) -> ClusterStatus:
+def diagnose_cluster(cluster: InnoDBCluster, logger, use_cache: bool = False) -> ClusterStatus:
     """
     Diagnose the state of an InnoDB cluster, assuming it was already initialized.
 
@@ -590,6 +924,19 @@ def diagnose_cluster(cluster: InnoDBCluster, logger) -> ClusterStatus:
     - Exceptions that indicate there's something wrong with the deployment are
     bubbled up. For example:
         - auth error on a pod that's already initialized
+    - If use_cache is set, a recent diagnosis made with the same pod states
+    can be returned instead, after checking with a single query to the
+    PRIMARY that the group is still in the same view and partition.
     """
+    if use_cache and not cluster.deleting:
+        cached = g_cluster_status_cache.get(cluster, cluster.get_pods())
+        if cached and cached.primary:
+            view = query_group_view(cached.primary, logger)
+            if view == (cached.view_id, cached.partition_id):
+                logger.debug(
+                    f"Using cached diagnosis of cluster {cluster.name}  status={cached.status}  view_id={cached.view_id}")
+                return cached
+            logger.debug(
+                f"Cached diagnosis of cluster {cluster.name} is outdated  view_id={cached.view_id} current_view_id={view[0]}")
 
     return cast(ClusterStatus, shellutils.RetryLoop(logger).call(do_diagnose_cluster, cluster, logger))
@@ -9,16 +9,51 @@ from typing import Callable, Optional, TYPE_CHECKING, Tuple
 from mysqloperator.controller.innodbcluster.cluster_api import InnoDBCluster
 
 from mysqloperator.controller.shellutils import RetryLoop
-from . import shellutils
+from . import shellutils, config
+from concurrent.futures import ThreadPoolExecutor
 import threading
 import time
-import select
+import heapq
+import itertools
+import selectors
+import socket
+import zlib
 import mysqlsh
 
 mysql = mysqlsh.mysql
 mysqlx = mysqlsh.mysqlx
 
 k_connect_retry_interval = 10
+# threads of each worker connecting clusters, so an unreachable cluster
+# doesn't block the notices of the others
+k_connect_threads = 4
+# TCP keepalive of monitoring sessions, a dead peer is detected after
+# idle + interval * count seconds and the session gets reconnected
+k_keepalive_idle = 60
+k_keepalive_interval = 10
+k_keepalive_count = 3
+# notices waiting longer than this to be handled get logged
+k_notice_wait_warning = 1.0
+# how often workers log how long notices waited, if they got any
+k_stats_log_interval = 10*60
+
+
+class NoticeWaitStats:
+    """How long notices waited to be handled, i.e. how much other clusters delayed them"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, wait: float) -> None:
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
 
 
 class MonitoredCluster:
@@ -29,9 +64,9 @@ class MonitoredCluster:
         self.account = account
 
         self.session = None
+        self.fd = None
         self.target = None
         self.target_not_primary = None
-        self.last_connect_attempt = 0
         self.last_primary_id = None
         self.last_view_id = None
 
@@ -46,12 +81,11 @@ class MonitoredCluster:
         return self.cluster.namespace
 
     def ensure_connected(self) -> Optional['mysqlx.Session']:
-        # TODO run a ping every X seconds
-        if not self.session and (not self.last_connect_attempt or time.time() - self.last_connect_attempt > k_connect_retry_interval):
+        # Retries are scheduled by the GroupMonitor, dead sessions are
+        # detected with TCP keepalives, see GroupMonitorWorker.register()
+        if not self.session:
             print(
                 f"GroupMonitor: Trying to connect to a member of cluster {self.cluster.namespace}/{self.cluster.name}")
-            self.last_connect_attempt = time.time()
-            self.session = None
             self.connect_to_primary()
 
             # force a refresh after we connect so we don't miss anything
@@ -183,55 +217,295 @@ class MonitoredCluster:
                 self.session = None
 
 
-# TODO change this to a per cluster kopf.daemon?
-class GroupMonitor(threading.Thread):
-    def __init__(self):
-        super().__init__(daemon=True, name="group-monitor")
+class GroupMonitorWorker(threading.Thread):
+    """
+    Waits for GR view change notices from a subset of the monitored clusters.
+
+    Sessions stay registered in a selector for as long as they're open, so
+    idle clusters cost nothing. Clusters without a session are kept in a heap
+    ordered by the time of their next connection attempt. The connects run
+    in a small thread pool, which hands the results back to the loop, and a
+    socketpair is used to wake up the loop when clusters are added, removed
+    or connected.
+    """
+
+    def __init__(self, index: int):
+        super().__init__(daemon=True, name=f"group-monitor-{index}")
 
         self.clusters = []
         self.stopped = False
 
+        self.lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+
+        # heap of (due_time, seq, cluster) for clusters that need a session
+        self.reconnect_queue = []
+        self.reconnect_seq = itertools.count()
+        self.removed_clusters = []
+
+        self.connect_executor = ThreadPoolExecutor(
+            max_workers=k_connect_threads, thread_name_prefix=f"group-monitor-{index}-connect")
+        # clusters being connected and those whose connect finished
+        self.connecting = set()
+        self.connected = []
+
+        # notice waits since the worker started and since the last time
+        # they were logged
+        self.notice_waits = NoticeWaitStats()
+        self.logged_notice_waits = NoticeWaitStats()
+        self.stats_time = time.monotonic()
+
+    def find_cluster(self, name: str, namespace: str) -> Optional[MonitoredCluster]:
+        with self.lock:
+            for c in self.clusters:
+                if c.name == name and c.namespace == namespace:
+                    return c
+        return None
+
+    def add_cluster(self, target: MonitoredCluster) -> None:
+        with self.lock:
+            self.clusters.append(target)
+            self.schedule_connect(target, 0)
+        self.wakeup()
+
+    def remove_cluster(self, cluster: InnoDBCluster) -> None:
+        with self.lock:
+            for c in self.clusters:
+                if c.name == cluster.name and c.namespace == cluster.namespace:
+                    self.clusters.remove(c)
+                    self.removed_clusters.append(c)
+                    break
+            else:
+                return
+        self.wakeup()
+
+    def schedule_connect(self, cluster: MonitoredCluster, delay: float) -> None:
+        # must be called with self.lock held
+        heapq.heappush(self.reconnect_queue,
+                       (time.monotonic() + delay, next(self.reconnect_seq), cluster))
+
+    def wakeup(self) -> None:
+        try:
+            self.wakeup_w.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            # the buffer is full, so a wakeup is already pending
+            pass
+
+    def drain_wakeup(self) -> None:
+        try:
+            while self.wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def register(self, cluster: MonitoredCluster) -> None:
+        cluster.fd = cluster.session._get_socket_fd()
+        self.selector.register(cluster.fd, selectors.EVENT_READ, cluster)
+
+        # the socket becomes readable with an error when the peer is found
+        # dead, without pinging from the loop. fromfd() dups the fd
+        try:
+            sock = socket.fromfd(cluster.fd, socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                if hasattr(socket, "TCP_KEEPIDLE"):
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, k_keepalive_idle)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, k_keepalive_interval)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, k_keepalive_count)
+            finally:
+                sock.close()
+        except OSError as e:
+            print(f"GroupMonitor: could not enable keepalive for {cluster.namespace}/{cluster.name}: {e}")
+
+    def unregister(self, cluster: MonitoredCluster) -> None:
+        if cluster.fd is not None:
+            try:
+                self.selector.unregister(cluster.fd)
+            except (KeyError, ValueError):
+                pass
+            cluster.fd = None
+
+    def process_removed(self) -> None:
+        with self.lock:
+            # those being connected are closed by process_connected()
+            removed = [c for c in self.removed_clusters if c not in self.connecting]
+            self.removed_clusters = []
+
+        for cluster in removed:
+            self.unregister(cluster)
+            if cluster.session:
+                cluster.session.close()
+                cluster.session = None
+            print(f"Removed monitor for {cluster.namespace}/{cluster.name}")
+
+    def connect(self, cluster: MonitoredCluster) -> None:
+        # runs in the connect executor
+        try:
+            cluster.ensure_connected()
+        except Exception as e:
+            print(f"GroupMonitor: Error connecting to {cluster.namespace}/{cluster.name}: {e}")
+        with self.lock:
+            self.connected.append(cluster)
+        self.wakeup()
+
+    def connect_due(self) -> Optional[float]:
+        """
+        Start connecting all clusters whose reconnect time has come and
+        return how long to wait until the next one is due (None if there's
+        none).
+        """
+        while True:
+            with self.lock:
+                if not self.reconnect_queue:
+                    return None
+                due, _, cluster = self.reconnect_queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    return wait
+                heapq.heappop(self.reconnect_queue)
+                if cluster not in self.clusters or cluster in self.connecting:
+                    continue
+                self.connecting.add(cluster)
+
+            self.connect_executor.submit(self.connect, cluster)
+
+    def process_connected(self) -> None:
+        with self.lock:
+            connected = self.connected
+            self.connected = []
+
+        for cluster in connected:
+            with self.lock:
+                self.connecting.discard(cluster)
+                removed = cluster not in self.clusters
+                if not removed and not cluster.session:
+                    self.schedule_connect(cluster, k_connect_retry_interval)
+            if removed:
+                if cluster.session:
+                    cluster.session.close()
+                    cluster.session = None
+            elif cluster.session:
+                self.register(cluster)
+
+    def on_readable(self, cluster: MonitoredCluster, ready_time: float) -> None:
+        wait = time.monotonic() - ready_time
+        self.notice_waits.add(wait)
+        self.logged_notice_waits.add(wait)
+        if wait > k_notice_wait_warning:
+            print(
+                f"GroupMonitor: notice for {cluster.namespace}/{cluster.name} waited {wait:.3f}s before being handled")
+
+        cluster.handle_notice()
+        if not cluster.session:
+            # The session was lost or dropped because the PRIMARY changed,
+            # reconnect right away
+            self.unregister(cluster)
+            with self.lock:
+                if cluster in self.clusters:
+                    self.schedule_connect(cluster, 0)
+
+    def stats(self) -> dict:
+        """Notice wait stats since the worker started"""
+        return {
+            "clusters": len(self.clusters),
+            "notices": self.notice_waits.count,
+            "noticeWaitAvg": self.notice_waits.avg,
+            "noticeWaitMax": self.notice_waits.max
+        }
+
+    def log_stats_if_due(self) -> None:
+        now = time.monotonic()
+        if now - self.stats_time < k_stats_log_interval:
+            return
+        waits = self.logged_notice_waits
+        if waits.count:
+            print(f"GroupMonitor: {self.name} handled {waits.count} notices for {len(self.clusters)} clusters in the last {now - self.stats_time:.0f}s, wait avg={waits.avg:.3f}s max={waits.max:.3f}s")
+        self.logged_notice_waits = NoticeWaitStats()
+        self.stats_time = now
+
+    def run(self) -> None:
+        while not self.stopped:
+            self.process_removed()
+            self.process_connected()
+
+            # notices that arrive while connecting wait for the connects too
+            loop_time = time.monotonic()
+            timeout = self.connect_due()
+
+            events = self.selector.select(0)
+            ready_time = loop_time
+            if not events:
+                events = self.selector.select(timeout)
+                ready_time = time.monotonic()
+            for key, _ in events:
+                if key.data is None:
+                    self.drain_wakeup()
+                else:
+                    self.on_readable(key.data, ready_time)
+
+            self.log_stats_if_due()
+
+    def stop(self) -> None:
+        self.stopped = True
+        self.wakeup()
+        self.connect_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# TODO change this to a per cluster kopf.daemon?
+class GroupMonitor:
+    """
+    Pool of GroupMonitorWorkers. Clusters are assigned to workers by a hash
+    of their namespace/name, so that a cluster with unreachable members can
+    only delay notices of the clusters sharing its worker.
+    """
+
+    def __init__(self, num_workers: int = config.group_monitor_workers):
+        self.workers = [GroupMonitorWorker(i) for i in range(max(1, num_workers))]
+
+    def worker_for(self, name: str, namespace: str) -> GroupMonitorWorker:
+        key = f"{namespace}/{name}".encode("utf8")
+        return self.workers[zlib.crc32(key) % len(self.workers)]
+
     def monitor_cluster(self, cluster: InnoDBCluster,
                         handler: Callable[[InnoDBCluster, list, bool], None],
                         logger: Logger) -> None:
-        for c in self.clusters:
-            if c.name == cluster.name and c.namespace == cluster.namespace:
-                return
+        worker = self.worker_for(cluster.name, cluster.namespace)
+        if worker.find_cluster(cluster.name, cluster.namespace):
+            return
 
         # We could get called here before the Secret is ready
         account = RetryLoop(logger).call(cluster.get_admin_account)
 
         target = MonitoredCluster(cluster, account, handler)
-        self.clusters.append(target)
-        print(f"Added monitor for {cluster.namespace}/{cluster.name}")
+        worker.add_cluster(target)
+        print(f"Added monitor for {cluster.namespace}/{cluster.name} to {worker.name}")
 
     def remove_cluster(self, cluster: InnoDBCluster) -> None:
-        for c in self.clusters:
-            if c.name == cluster.name and c.namespace == cluster.namespace:
-                self.clusters.remove(c)
-                break
-
-    def run(self) -> None:
-        last_ping = time.time()
-        while not self.stopped:
-            session_fds_to_cluster = {}
-            for cluster in self.clusters:
-                cluster.ensure_connected()
-                if cluster.session:
-                    session_fds_to_cluster[cluster.session._get_socket_fd()] = cluster
-
-            # wait for 1s at most so that newly added session don't wait much
-            # TODO replace poll_sessions() with something to get the session fd
-            # - do the poll loop in python
-            # - add a socket_pair() to allow interrupting the poll when a new
-            # cluster is added and increase the timeout
-
-            ready, _, _ = select.select(session_fds_to_cluster.keys(), [], [], 1000)
-            for fd in ready:
-                session_fds_to_cluster[fd].handle_notice()
+        self.worker_for(cluster.name, cluster.namespace).remove_cluster(cluster)
+
+    def stats(self) -> dict:
+        """Notice wait stats of all workers since they started"""
+        workers = [w.stats() for w in self.workers]
+        notices = sum(w["notices"] for w in workers)
+        return {
+            "clusters": sum(w["clusters"] for w in workers),
+            "notices": notices,
+            "noticeWaitAvg": sum(w["noticeWaitAvg"] * w["notices"] for w in workers) / notices if notices else 0.0,
+            "noticeWaitMax": max(w["noticeWaitMax"] for w in workers),
+            "workers": workers
+        }
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
 
     def stop(self) -> None:
-        self.stopped = True
+        for worker in self.workers:
+            worker.stop()
 
 
 g_group_monitor = GroupMonitor()
@@ -0,0 +1,187 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Intervals are inclusive (start, end) pairs, sorted and non-adjacent
+Intervals = List[Tuple[int, int]]
+
+
+def _normalize(intervals: Iterable[Tuple[int, int]]) -> Intervals:
+    out: Intervals = []
+    for start, end in sorted(intervals):
+        if out and start <= out[-1][1] + 1:
+            if end > out[-1][1]:
+                out[-1] = (out[-1][0], end)
+        else:
+            out.append((start, end))
+    return out
+
+
+def _union(a: Intervals, b: Intervals) -> Intervals:
+    out: Intervals = []
+    i = j = 0
+    while i < len(a) or j < len(b):
+        if j >= len(b) or (i < len(a) and a[i][0] <= b[j][0]):
+            start, end = a[i]
+            i += 1
+        else:
+            start, end = b[j]
+            j += 1
+        if out and start <= out[-1][1] + 1:
+            if end > out[-1][1]:
+                out[-1] = (out[-1][0], end)
+        else:
+            out.append((start, end))
+    return out
+
+
+def _intersection(a: Intervals, b: Intervals) -> Intervals:
+    out: Intervals = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start <= end:
+            out.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def _subtract(a: Intervals, b: Intervals) -> Intervals:
+    out: Intervals = []
+    j = 0
+    for start, end in a:
+        while j < len(b) and b[j][1] < start:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= end:
+            if b[k][0] > start:
+                out.append((start, b[k][0] - 1))
+            start = max(start, b[k][1] + 1)
+            k += 1
+        if start <= end:
+            out.append((start, end))
+    return out
+
+
+class GTIDSet:
+    """
+    Set of GTIDs, as per-source sorted interval lists.
+
+    Parses the text form used by the server (gtid_executed, gtid_purged...),
+    including tagged GTIDs (uuid:tag:1-10) and sets spanning many UUIDs, and
+    does the set algebra locally instead of through GTID_SUBTRACT() and
+    friends. Immutable.
+    """
+
+    def __init__(self, sets: Dict[str, Intervals] = None):
+        # source (uuid or uuid:tag) -> intervals, never empty
+        self.sets: Dict[str, Intervals] = {k: v for k, v in (sets or {}).items() if v}
+
+    @classmethod
+    def parse(cls, text: str) -> 'GTIDSet':
+        sets: Dict[str, List[Tuple[int, int]]] = {}
+        for part in (text or "").replace("\n", "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            fields = part.split(":")
+            source = fields[0].strip().lower()
+            tag = ""
+            for f in fields[1:]:
+                f = f.strip()
+                begin, _, end = f.partition("-")
+                if not begin.isdigit():
+                    # a tag, applies to the intervals after it
+                    tag = f.lower()
+                    continue
+                key = f"{source}:{tag}" if tag else source
+                sets.setdefault(key, []).append(
+                    (int(begin), int(end) if end else int(begin)))
+        return cls({k: _normalize(v) for k, v in sets.items()})
+
+    def __str__(self) -> str:
+        parts = []
+        for source in sorted(self.sets):
+            ranges = ":".join(f"{s}-{e}" if e != s else f"{s}"
+                              for s, e in self.sets[source])
+            parts.append(f"{source}:{ranges}")
+        return ",".join(parts)
+
+    def __repr__(self) -> str:
+        return f"GTIDSet('{self}')"
+
+    def __bool__(self) -> bool:
+        return bool(self.sets)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GTIDSet):
+            return NotImplemented
+        return self.sets == other.sets
+
+    def __hash__(self) -> int:
+        return hash(tuple((k, tuple(v)) for k, v in sorted(self.sets.items())))
+
+    def count(self) -> int:
+        """Number of transactions in the set"""
+        return sum(e - s + 1 for intervals in self.sets.values() for s, e in intervals)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def union(self, other: 'GTIDSet') -> 'GTIDSet':
+        sets = dict(self.sets)
+        for k, v in other.sets.items():
+            sets[k] = _union(sets[k], v) if k in sets else v
+        return GTIDSet(sets)
+
+    def intersection(self, other: 'GTIDSet') -> 'GTIDSet':
+        return GTIDSet({k: _intersection(v, other.sets[k])
+                        for k, v in self.sets.items() if k in other.sets})
+
+    def subtract(self, other: 'GTIDSet') -> 'GTIDSet':
+        return GTIDSet({k: _subtract(v, other.sets[k]) if k in other.sets else v
+                        for k, v in self.sets.items()})
+
+    def issubset(self, other: 'GTIDSet') -> bool:
+        for k, v in self.sets.items():
+            if k not in other.sets or _subtract(v, other.sets[k]):
+                return False
+        return True
+
+    def issuperset(self, other: 'GTIDSet') -> bool:
+        return other.issubset(self)
+
+    def contains(self, source: str, gno: int) -> bool:
+        for s, e in self.sets.get(source.lower(), []):
+            if s <= gno <= e:
+                return True
+            if s > gno:
+                break
+        return False
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = subtract
+    __le__ = issubset
+    __ge__ = issuperset
+
+
+def maximal_sets(sets: Dict[Any, GTIDSet]) -> List[Any]:
+    """
+    Return the keys of the sets not strictly contained in any other set,
+    i.e. the maximal elements of the subset partial order, in key order.
+    Keys with equal sets are all returned.
+
+    If there's a single distinct maximal set, it's a superset of all others.
+    More than one means the histories diverged.
+    """
+    keys = sorted(sets.keys())
+    return [k for k in keys
+            if not any(sets[k] != sets[o] and sets[k] <= sets[o] for o in keys if o != k)]
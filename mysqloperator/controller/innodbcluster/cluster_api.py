@@ -17,15 +17,23 @@ from ..api_utils import Edition, dget_bool, dget_dict, dget_enum, dget_str, dget
 from ..kubeutils import api_core, api_apps, api_customobj, api_policy, api_rbac, api_batch, api_cron_job
 from ..kubeutils import client as api_client, ApiException
 from ..kubeutils import k8s_cluster_domain
+from ..pod_informer import g_pod_informer
 from logging import Logger
 import json
 import yaml
 import datetime
+import contextlib
+import copy
+import collections
+import threading
 from kubernetes import client
 
 
 MAX_CLUSTER_NAME_LEN = 28
 
+# Max number of parsed InnoDBClusterSpec kept by g_parsed_specs
+k_parsed_spec_cache_size = 256
+
 def escape_value_for_mycnf(value: str) -> str:
     return '"'+value.replace("\\", "\\\\").replace("\"", "\\\"")+'"'
 
@@ -55,9 +63,13 @@ class CloneInitDBSpec:
 
 
 class SnapshotInitDBSpec:
+    # directory of the snapshot in the storage, the output of the backup
+    path: str = ""
     storage: Optional[StorageSpec] = None
 
     def parse(self, spec: dict, prefix: str) -> None:
+        self.path = dget_str(spec, "path", prefix, default_value="")
+
         self.storage = StorageSpec()
         self.storage.parse(
             dget_dict(spec, "storage", prefix), prefix+".storage")
@@ -1050,12 +1062,48 @@ class InnoDBClusterSpec:
 
 
 
+class ParsedSpecCache:
+    """
+    LRU cache of parsed cluster specs, keyed by (uid, generation).
+
+    The generation changes with every change to the spec, so a cached entry
+    is valid for as long as it's used. Specs are copied in and out, since
+    callers may modify the nested objects of the spec they get.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: collections.OrderedDict = collections.OrderedDict()
+
+    def get(self, key: Tuple[str, int]) -> Optional['InnoDBClusterSpec']:
+        with self.lock:
+            spec = self.entries.get(key)
+            if not spec:
+                return None
+            self.entries.move_to_end(key)
+        return copy.deepcopy(spec)
+
+    def put(self, key: Tuple[str, int], spec: 'InnoDBClusterSpec') -> None:
+        spec = copy.deepcopy(spec)
+        with self.lock:
+            self.entries[key] = spec
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+g_parsed_specs = ParsedSpecCache(k_parsed_spec_cache_size)
+
+
 class InnoDBCluster(K8sInterfaceObject):
     def __init__(self, cluster: Body) -> None:
         super().__init__()
 
         self.obj: Body = cluster
         self._parsed_spec: Optional[InnoDBClusterSpec] = None
+        # merge patch of status changes not yet sent, see batch_status_updates()
+        self._pending_status: Optional[dict] = None
 
     def __str__(self):
         return f"{self.namespace}/{self.name}"
@@ -1105,9 +1153,10 @@ class InnoDBCluster(K8sInterfaceObject):
 
     @property
     def status(self) -> dict:
-        if "status" in self.obj:
-            return self.obj["status"]
-        return {}
+        status = self.obj["status"] if "status" in self.obj else {}
+        if self._pending_status:
+            return utils.apply_merge_patch(status, self._pending_status)
+        return status
 
     @property
     def name(self) -> str:
@@ -1147,7 +1196,19 @@ class InnoDBCluster(K8sInterfaceObject):
         return self._parsed_spec
 
     def parse_spec(self) -> None:
-        self._parsed_spec = InnoDBClusterSpec(self.namespace, self.name, self.spec)
+        generation = self.metadata.get("generation")
+        uid = self.metadata.get("uid")
+        if not generation or not uid:
+            self._parsed_spec = InnoDBClusterSpec(self.namespace, self.name, self.spec)
+            return
+
+        key = (uid, generation)
+        spec = g_parsed_specs.get(key)
+        if not spec:
+            # invalid specs raise here and aren't cached
+            spec = InnoDBClusterSpec(self.namespace, self.name, self.spec)
+            g_parsed_specs.put(key, spec)
+        self._parsed_spec = spec
 
     def reload(self) -> None:
         self.obj = self._get(self.namespace, self.name)
@@ -1162,6 +1223,13 @@ class InnoDBCluster(K8sInterfaceObject):
         return MySQLPod(pod)
 
     def get_pods(self) -> typing.List['MySQLPod']:
+        # use the operator's pod index if it's up to date
+        cached = g_pod_informer.get_pods(self.namespace, self.name)
+        if cached is not None:
+            pods = [MySQLPod(o) for o in cached]
+            pods.sort(key=lambda pod: pod.index)
+            return pods
+
         # get all pods that belong to the same container
         objects = cast(api_client.V1PodList, api_core.list_namespaced_pod(
             self.namespace, label_selector="component=mysqld"))
@@ -1196,6 +1264,24 @@ class InnoDBCluster(K8sInterfaceObject):
                 return None
             raise
 
+    def get_snapshot_restore_job(self) -> typing.Optional[api_client.V1Job]:
+        try:
+            return cast(api_client.V1Job,
+                        api_batch.read_namespaced_job(self.name + "-snapshot-restore", self.namespace))
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def get_seed_datadir_pvc(self) -> typing.Optional[api_client.V1PersistentVolumeClaim]:
+        try:
+            return cast(api_client.V1PersistentVolumeClaim,
+                        api_core.read_namespaced_persistent_volume_claim(f"datadir-{self.name}-0", self.namespace))
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+
     def get_stateful_set(self) -> typing.Optional[api_client.V1StatefulSet]:
         try:
             return cast(api_client.V1StatefulSet,
@@ -1381,15 +1467,57 @@ class InnoDBCluster(K8sInterfaceObject):
     def _get_status_field(self, field: str) -> typing.Any:
         return cast(str, self.status.get(field))
 
-    def _set_status_field(self, field: str, value: typing.Any) -> None:
-        obj = self._get(self.namespace, self.name)
-
-        if "status" not in obj:
-            patch = {"status": {}}
+    def _update_status(self, patch: dict) -> None:
+        """
+        Send a merge patch with only the given status fields, no read needed.
+        Inside batch_status_updates() the patch is held back and merged with
+        other updates instead.
+        """
+        if self._pending_status is not None:
+            self._pending_status = utils.combine_merge_patches(
+                self._pending_status, patch, self.obj.get("status"))
         else:
-            patch = {"status": obj["status"]}
-        patch["status"][field] = value
-        self.obj = self._patch_status(self.namespace, self.name, patch)
+            self.obj = self._patch_status(self.namespace, self.name, {"status": patch})
+
+    @contextlib.contextmanager
+    def batch_status_updates(self):
+        """
+        Coalesce all status updates made in the block into a single request,
+        sent when the block exits (also if it raises). Status reads in the
+        block already see the pending values.
+
+        Meant for consecutive status writes only, the updates are invisible
+        to others until the block exits.
+        """
+        if self._pending_status is not None:
+            # nested, the outermost block sends the patch
+            yield
+            return
+
+        self._pending_status = {}
+        try:
+            yield
+        except BaseException:
+            # don't mask the error of the block with the one of the patch
+            patch, self._pending_status = self._pending_status, None
+            if patch:
+                try:
+                    self.obj = self._patch_status(self.namespace, self.name, {"status": patch})
+                except Exception as e:
+                    getLogger().error(f"Error updating status of {self}: {e}")
+            raise
+        patch, self._pending_status = self._pending_status, None
+        if patch:
+            self.obj = self._patch_status(self.namespace, self.name, {"status": patch})
+
+    def _set_status_field(self, field: str, value: typing.Any) -> None:
+        if isinstance(value, dict):
+            # a merge patch merges objects, explicitly drop keys the new
+            # value doesn't have so that the field gets replaced
+            old = self.status.get(field)
+            if isinstance(old, dict):
+                value = {**{k: None for k in old if k not in value}, **value}
+        self._update_status({field: value})
 
     def set_cluster_status(self, cluster_status) -> None:
         self._set_status_field("cluster", cluster_status)
@@ -1401,13 +1529,7 @@ class InnoDBCluster(K8sInterfaceObject):
         return status
 
     def set_status(self, status) -> None:
-        obj = cast(dict, self._get(self.namespace, self.name))
-
-        if "status" not in obj:
-            obj["status"] = status
-        else:
-            obj["status"] = utils.merge_patch_object(obj["status"], status)
-        self.obj = self._patch_status(self.namespace, self.name, obj)
+        self._update_status(status)
 
     def update_cluster_info(self, info: dict) -> None:
         """
@@ -1504,11 +1626,9 @@ class InnoDBCluster(K8sInterfaceObject):
     def set_current_version(self, version: str) -> None:
         v = self.status.get("version")
         if v != version:
-            patch = {"status": {"version": version}}
-
             # TODO store the current server/router version + timestamp
             # store previous versions in a version history log
-            self.obj = self._patch_status(self.namespace, self.name, patch)
+            self._update_status({"version": version})
 
     # TODO store last known majority and use it for diagnostics when there are
     # unconnectable pods
@@ -1762,7 +1882,13 @@ class MySQLPod(K8sInterfaceObject):
     def get_member_readiness_gate(self, gate: str) -> typing.Optional[bool]:
         return self.check_condition(f"mysql.oracle.com/{gate}")
 
-    def update_member_readiness_gate(self, gate: str, value: bool) -> None:
+    def update_member_readiness_gate(self, gate: str, value: bool,
+                                     only_if_changed: bool = False) -> bool:
+        """
+        Set the readiness gate condition, returns whether a patch was sent.
+        If only_if_changed is set, nothing is sent if the condition already
+        has the given value (i.e. lastProbeTime isn't refreshed).
+        """
         now = utils.isotime()
 
         if self.check_condition(f"mysql.oracle.com/{gate}") != value:
@@ -1770,6 +1896,9 @@ class MySQLPod(K8sInterfaceObject):
         else:
             changed = False
 
+        if only_if_changed and not changed:
+            return False
+
         patch = {"status": {
             "conditions": [{
                 "type": f"mysql.oracle.com/{gate}",
@@ -1780,6 +1909,7 @@ class MySQLPod(K8sInterfaceObject):
 
         self.pod = cast(api_client.V1Pod, api_core.patch_namespaced_pod_status(
             self.name, self.namespace, body=patch))
+        return True
 
     # TODO remove field
     def get_membership_info(self, field: str = None) -> typing.Optional[dict]:
@@ -1795,7 +1925,13 @@ class MySQLPod(K8sInterfaceObject):
 
     def update_membership_status(self, member_id: str, role: str, status: str,
                                  view_id: str, version: str,
-                                 joined: bool = False) -> None:
+                                 joined: bool = False,
+                                 only_if_changed: bool = False) -> bool:
+        """
+        Store the membership info in the pod, returns whether a patch was
+        sent. If only_if_changed is set, nothing is sent if the info and the
+        role label already match (i.e. lastProbeTime isn't refreshed).
+        """
         now = utils.isotime()
         last_probe_time = now
 
@@ -1805,6 +1941,12 @@ class MySQLPod(K8sInterfaceObject):
         else:
             last_transition_time = info.get("lastTransitionTime")
 
+        role_label = role if status == "ONLINE" else None
+        if only_if_changed and not joined and last_transition_time != now \
+                and info.get("version") == version \
+                and (self.metadata.labels or {}).get("mysql.oracle.com/cluster-role") == role_label:
+            return False
+
         info.update({
             "memberId": member_id,
             "lastTransitionTime": last_transition_time,
@@ -1820,7 +1962,7 @@ class MySQLPod(K8sInterfaceObject):
         patch = {
             "metadata": {
                 "labels": {
-                    "mysql.oracle.com/cluster-role": role if status == "ONLINE" else None
+                    "mysql.oracle.com/cluster-role": role_label
                 },
                 "annotations": {
                     "mysql.oracle.com/membership-info": json.dumps(info)
@@ -1829,6 +1971,7 @@ class MySQLPod(K8sInterfaceObject):
         }
         self.pod = cast(api_client.V1Pod, api_core.patch_namespaced_pod(
             self.name, self.namespace, patch))
+        return True
 
     def add_member_finalizer(self) -> None:
         self._add_finalizer("mysql.oracle.com/membership")
@@ -7,17 +7,23 @@
 from kopf._cogs.structs.bodies import Body
 from .. import consts, errors, kubeutils, shellutils, utils, config, mysqlutils
 from .. import diagnose
+from .. import gtid
+from ..gtid import GTIDSet
 from ..backup import backup_objects
 from ..shellutils import DbaWrap
-from . import router_objects
+from . import router_objects, recovery
 from .cluster_api import MySQLPod, InnoDBCluster, client
 import typing
-from typing import Optional, TYPE_CHECKING, Dict
+from typing import Optional, TYPE_CHECKING, Dict, List, Tuple
 if TYPE_CHECKING:
     from mysqlsh.mysql import ClassicSession
     from mysqlsh import Dba, Cluster
 import os
 import copy
+import collections
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import mysqlsh
 import kopf
 import datetime
@@ -30,27 +36,162 @@ common_gr_options = {
     "exitStateAction": "ABORT_SERVER"
 }
 
-def select_pod_with_most_gtids(gtids: Dict[int, str]) -> int:
-    pod_indexes = list(gtids.keys())
-    pod_indexes.sort(key = lambda a: mysqlutils.count_gtids(gtids[a]))
-    return pod_indexes[-1]
+class DivergentGTIDSets(Exception):
+    def __init__(self, candidates: Dict[int, GTIDSet]):
+        self.candidates = candidates
+        super().__init__(", ".join(
+            f"pod-{i} has {candidates[i] - candidates[j]} not in pod-{j}"
+            for i in candidates for j in candidates if i != j and not candidates[i] <= candidates[j]))
+
+
+def select_reboot_seed(gtids: Dict[int, str]) -> int:
+    """
+    Return the index of the pod whose gtid_executed contains those of all
+    other pods, which is the only valid seed to reboot the cluster from.
+    Raises DivergentGTIDSets if no pod has such a GTID set.
+    """
+    sets = {i: GTIDSet.parse(g) for i, g in gtids.items()}
+    candidates = gtid.maximal_sets(sets)
+    if len(set(sets[i] for i in candidates)) > 1:
+        raise DivergentGTIDSets({i: sets[i] for i in candidates})
+    # equal sets, prefer the lowest index
+    return candidates[0]
+
+# How long a handler waits for the cluster lock before giving up and letting
+# kopf retry it later
+k_cluster_mutex_wait = 30
+# Retry delay after giving up waiting for the cluster lock
+k_cluster_mutex_retry_delay = 5
+# Max number of scale-out candidates diagnosed in parallel
+k_max_parallel_prepare = 8
+
+
+class ClusterLock:
+    """
+    Readers-writer lock of a cluster, granted in FIFO order.
+
+    Shared holders can run together, an exclusive holder runs alone. A
+    request is granted when everything queued before it has been granted
+    and it's compatible with the current holders, so readers arriving after
+    a waiting writer queue behind it instead of starving it.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.tickets = itertools.count()
+        # ticket -> (owner, context, acquire time, shared)
+        self.holders: Dict[int, Tuple[str, str, datetime.datetime, bool]] = {}
+        # (ticket, shared) in arrival order
+        self.waiters: collections.deque = collections.deque()
+
+    def _grantable(self, ticket: int, shared: bool) -> bool:
+        if shared:
+            if any(not h[3] for h in self.holders.values()):
+                return False
+            for t, s in self.waiters:
+                if t == ticket:
+                    return True
+                if not s:
+                    return False
+            return True
+        return not self.holders and self.waiters[0][0] == ticket
+
+    def acquire(self, owner: str, context: str, shared: bool,
+                timeout: float) -> Optional[int]:
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            ticket = next(self.tickets)
+            self.waiters.append((ticket, shared))
+            while not self._grantable(ticket, shared):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.waiters.remove((ticket, shared))
+                    # whoever was queued behind us may be grantable now
+                    self.cond.notify_all()
+                    return None
+                self.cond.wait(remaining)
+            self.waiters.remove((ticket, shared))
+            self.holders[ticket] = (owner, context, datetime.datetime.now(), shared)
+            # let queued readers behind us in too
+            self.cond.notify_all()
+            return ticket
+
+    def release(self, ticket: int) -> None:
+        with self.cond:
+            del self.holders[ticket]
+            self.cond.notify_all()
+
+    def describe_holders(self) -> str:
+        with self.cond:
+            return ", ".join(f"{owner}({'shared' if shared else 'exclusive'}, context={context}, since={since.isoformat()})"
+                             for owner, context, since, shared in self.holders.values())
+
+
+class ClusterLockManager:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # namespace/name -> (lock, number of users)
+        self.locks: Dict[str, Tuple[ClusterLock, int]] = {}
+
+    def get(self, cluster: InnoDBCluster) -> ClusterLock:
+        key = f"{cluster.namespace}/{cluster.name}"
+        with self.lock:
+            lock, users = self.locks.get(key, (None, 0))
+            if not lock:
+                lock = ClusterLock()
+            self.locks[key] = (lock, users + 1)
+            return lock
+
+    def put(self, cluster: InnoDBCluster) -> None:
+        key = f"{cluster.namespace}/{cluster.name}"
+        with self.lock:
+            lock, users = self.locks[key]
+            if users > 1:
+                self.locks[key] = (lock, users - 1)
+            else:
+                del self.locks[key]
+
+
+g_cluster_locks = ClusterLockManager()
+
 
 class ClusterMutex:
-    def __init__(self, cluster: InnoDBCluster, pod: Optional[MySQLPod] = None, context: str = "n/a"):
+    """
+    Serializes handlers working on the same cluster.
+
+    Handlers changing the cluster topology take it exclusively (default),
+    handlers that only probe can take it shared. Waits up to
+    k_cluster_mutex_wait seconds for the lock and then raises a
+    TemporaryError so that kopf retries later.
+    """
+
+    def __init__(self, cluster: InnoDBCluster, pod: Optional[MySQLPod] = None,
+                 context: str = "n/a", shared: bool = False,
+                 timeout: float = k_cluster_mutex_wait):
         self.cluster = cluster
         self.pod = pod
         self.context = context
+        self.shared = shared
+        self.timeout = timeout
+        self.lock: Optional[ClusterLock] = None
+        self.ticket: Optional[int] = None
 
     def __enter__(self, *args):
-        owner_lock_creation_time: datetime.datetime
-        (owner, owner_context, owner_lock_creation_time) = utils.g_ephemeral_pod_state.testset(
-            self.cluster, "cluster-mutex", self.pod.name if self.pod else self.cluster.name, context=self.context)
-        if owner:
+        owner = self.pod.name if self.pod else self.cluster.name
+        self.lock = g_cluster_locks.get(self.cluster)
+        self.ticket = self.lock.acquire(owner, self.context, self.shared, self.timeout)
+        if self.ticket is None:
+            holders = self.lock.describe_holders()
+            g_cluster_locks.put(self.cluster)
+            self.lock = None
             raise kopf.TemporaryError(
-                f"{self.cluster.name} busy. lock_owner={owner} owner_context={owner_context} lock_created_at={owner_lock_creation_time.isoformat()}", delay=10)
+                f"{self.cluster.name} busy. lock_owners={holders}", delay=k_cluster_mutex_retry_delay)
 
     def __exit__(self, *args):
-        utils.g_ephemeral_pod_state.set(self.cluster, "cluster-mutex", None, context=self.context)
+        if self.lock:
+            self.lock.release(self.ticket)
+            g_cluster_locks.put(self.cluster)
+            self.lock = None
 
 
 class ClusterController:
@@ -58,12 +199,40 @@ class ClusterController:
     This is the controller for a innodbcluster object.
     It's the main controller for a cluster and drives the lifecycle of the
     cluster including creation, scaling and restoring from outages.
+
+    Use it in a with block, which gives its pooled session back on exit.
     """
 
     def __init__(self, cluster: InnoDBCluster):
         self.cluster = cluster
         self.dba: Optional[Dba] = None
         self.dba_cluster: Optional[Cluster] = None
+        # pooled session backing self.dba, given back when replaced or
+        # when leaving the with block
+        self.dba_wrap: Optional[shellutils.PooledDbaWrap] = None
+
+    def __enter__(self) -> 'ClusterController':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # a failed handler may have left the session in any state
+        self.release_dba(discard=exc_value is not None)
+
+    @property
+    def pool_key(self) -> str:
+        return f"{self.cluster.namespace}/{self.cluster.name}"
+
+    def use_dba(self, dba_wrap: shellutils.PooledDbaWrap) -> None:
+        self.release_dba()
+        self.dba_wrap = dba_wrap
+        self.dba = dba_wrap.entry.dba
+
+    def release_dba(self, discard: bool = False) -> None:
+        if self.dba_wrap:
+            self.dba_cluster = None
+            self.dba = None
+            self.dba_wrap.release(discard)
+            self.dba_wrap = None
 
     @property
     def dba_cluster_name(self) -> str:
@@ -84,9 +253,9 @@ class ClusterController:
         }
         self.cluster.set_cluster_status(cluster_status)
 
-    def probe_status(self, logger) -> diagnose.ClusterStatus:
-        diag = diagnose.diagnose_cluster(self.cluster, logger)
-        if not self.cluster.deleting:
+    def probe_status(self, logger, use_cache: bool = False) -> diagnose.ClusterStatus:
+        diag = diagnose.diagnose_cluster(self.cluster, logger, use_cache=use_cache)
+        if not self.cluster.deleting and not diag.cached:
             self.publish_status(diag)
         logger.info(
             f"cluster probe: status={diag.status} online={diag.online_members}")
@@ -103,7 +272,7 @@ class ClusterController:
                               diagnose.ClusterDiagStatus.NO_QUORUM_UNCERTAIN,
                               diagnose.ClusterDiagStatus.SPLIT_BRAIN_UNCERTAIN)
         if cluster_probe_time and member_transition_time and cluster_probe_time < member_transition_time or last_status in unreachable_states:
-            return self.probe_status(logger).status
+            return self.probe_status(logger, use_cache=True).status
         else:
             return last_status
 
@@ -125,8 +294,8 @@ class ClusterController:
 
     def connect_to_primary(self, primary_pod: MySQLPod, logger) -> 'Cluster':
         if primary_pod:
-            self.dba = shellutils.connect_dba(
-                primary_pod.endpoint_co, logger, max_tries=2)
+            self.use_dba(shellutils.connect_dba_pooled(
+                self.pool_key, primary_pod.endpoint_co, logger, max_tries=2))
             self.dba_cluster = self.dba.get_cluster()
         else:
             # - check if we should consider pod marker for whether the instance joined
@@ -145,7 +314,8 @@ class ClusterController:
                     continue
 
                 try:
-                    self.dba = mysqlsh.connect_dba(pod.endpoint_co)
+                    self.use_dba(shellutils.g_dba_pool.connect(
+                        self.pool_key, pod.endpoint_co))
                 except Exception as e:
                     logger.debug(f"connect_dba: target={pod.name} error={e}")
                     # Try another pod if we can't connect to it
@@ -166,10 +336,12 @@ class ClusterController:
                         # This member is not ONLINE, so there's no chance of
                         # getting a cluster handle from it
                         offline_pods.append(pod.name)
+                    self.release_dba(discard=True)
 
                 except Exception as e:
                     logger.info(
                         f"get_cluster() from {pod.name} failed: {e}")
+                    self.release_dba(discard=True)
 
             # If all pods are connectable but OFFLINE, then we have complete outage and need a reboot
             if len(offline_pods) == len(all_pods):
@@ -200,6 +372,7 @@ class ClusterController:
 
     def create_cluster(self, seed_pod: MySQLPod, logger) -> None:
         logger.info("Creating cluster at %s" % seed_pod.name)
+        diagnose.g_cluster_status_cache.invalidate(self.cluster)
 
         assume_gtid_set_complete = False
         if self.cluster.parsed_spec.initDB:
@@ -229,6 +402,10 @@ class ClusterController:
                     # A : How to import from a dump?
                 else:
                     assert 0, "Unknown Dump storage mechanism"
+            elif self.cluster.parsed_spec.initDB.snapshot:
+                self.cluster.update_cluster_info({
+                    "initialDataSource": f"snapshot={self.cluster.parsed_spec.initDB.snapshot.path}",
+                })
             else:
                 assert 0, "Unknown initDB source"
         else:
@@ -336,8 +513,10 @@ class ClusterController:
         seed_pod = pods[seed_pod_index]
 
         logger.info(f"Rebooting cluster {self.cluster.name} from pod {seed_pod}...")
+        diagnose.g_cluster_status_cache.invalidate(self.cluster)
 
-        self.dba = shellutils.connect_dba(seed_pod.endpoint_co, logger)
+        self.use_dba(shellutils.connect_dba_pooled(
+            self.pool_key, seed_pod.endpoint_co, logger))
 
         self.log_mysql_info(seed_pod, self.dba.session, logger)
 
@@ -362,6 +541,7 @@ class ClusterController:
     def force_quorum(self, seed_pod, logger) -> None:
         logger.info(
             f"Forcing quorum of cluster {self.cluster.name} using {seed_pod.name}...")
+        diagnose.g_cluster_status_cache.invalidate(self.cluster)
 
         self.connect_to_primary(seed_pod, logger)
 
@@ -392,7 +572,7 @@ class ClusterController:
         last_pod.remove_member_finalizer()
 
     def reconcile_pod(self, primary_pod: MySQLPod, pod: MySQLPod, logger) -> None:
-        with DbaWrap(shellutils.connect_dba(pod.endpoint_co, logger)) as pod_dba_session:
+        with shellutils.connect_dba_pooled(self.pool_key, pod.endpoint_co, logger) as pod_dba_session:
             cluster = self.connect_to_primary(primary_pod, logger)
 
             status = diagnose.diagnose_cluster_candidate(
@@ -403,48 +583,168 @@ class ClusterController:
             if pod.deleting or self.cluster.deleting:
                 return
 
-            # TODO check case where a member pod was deleted and then rejoins with the same address but different uuid
+            self.apply_candidate_status(pod, status, pod_dba_session, logger)
 
-            if status.status == diagnose.CandidateDiagStatus.JOINABLE:
-                self.cluster.info(action="ReconcilePod", reason="Join",
-                                  message=f"Joining {pod.name} to cluster")
-                self.join_instance(pod, pod_dba_session, logger)
+    def apply_candidate_status(self, pod: MySQLPod, status: diagnose.CandidateStatus,
+                               pod_dba_session: 'Dba', logger,
+                               recovery_method: Optional[str] = None) -> None:
+        # TODO check case where a member pod was deleted and then rejoins with the same address but different uuid
 
-            elif status.status == diagnose.CandidateDiagStatus.REJOINABLE:
-                self.cluster.info(action="ReconcilePod", reason="Rejoin",
-                                  message=f"Rejoining {pod.name} to cluster")
-                self.rejoin_instance(pod, pod_dba_session.session, logger)
+        if status.status == diagnose.CandidateDiagStatus.JOINABLE:
+            self.cluster.info(action="ReconcilePod", reason="Join",
+                              message=f"Joining {pod.name} to cluster")
+            self.join_instance(pod, pod_dba_session, logger, recovery_method)
 
-            elif status.status == diagnose.CandidateDiagStatus.MEMBER:
-                logger.info(f"{pod.endpoint} already a member")
+        elif status.status == diagnose.CandidateDiagStatus.REJOINABLE:
+            self.cluster.info(action="ReconcilePod", reason="Rejoin",
+                              message=f"Rejoining {pod.name} to cluster")
+            self.rejoin_instance(pod, pod_dba_session.session, logger)
 
-                self.probe_member_status(pod, pod_dba_session.session, False, logger)
+        elif status.status == diagnose.CandidateDiagStatus.MEMBER:
+            logger.info(f"{pod.endpoint} already a member")
 
-            elif status.status == diagnose.CandidateDiagStatus.UNREACHABLE:
-                # TODO check if we should throw a tmp error or do nothing
-                logger.error(f"{pod.endpoint} is unreachable")
+            self.probe_member_status(pod, pod_dba_session.session, False, logger)
 
-                self.probe_member_status(pod, pod_dba_session.session, False, logger)
-            else:
-                # TODO check if we can repair broken instances
-                # It would be possible to auto-repair an instance with errant
-                # transactions by cloning over it, but that would mean these
-                # errants are lost.
-                logger.error(f"{pod.endpoint} is in state {status.status}")
+        elif status.status == diagnose.CandidateDiagStatus.UNREACHABLE:
+            # TODO check if we should throw a tmp error or do nothing
+            logger.error(f"{pod.endpoint} is unreachable")
 
-                self.probe_member_status(pod, pod_dba_session.session, False, logger)
+            self.probe_member_status(pod, pod_dba_session.session, False, logger)
+        else:
+            # TODO check if we can repair broken instances
+            # It would be possible to auto-repair an instance with errant
+            # transactions by cloning over it, but that would mean these
+            # errants are lost.
+            logger.error(f"{pod.endpoint} is in state {status.status}")
+
+            self.probe_member_status(pod, pod_dba_session.session, False, logger)
+
+    def pending_join_pods(self, pod: MySQLPod) -> List[MySQLPod]:
+        """
+        Return pod plus all other pods of the cluster that are up and
+        configured but never joined, i.e. the rest of a scale-out.
+        """
+        pods = [pod]
+        for p in self.cluster.get_pods():
+            if p.name == pod.name or p.deleting:
+                continue
+            if p.get_member_readiness_gate("configured") and p.check_containers_ready() \
+                    and not p.get_membership_info("joinTime"):
+                pods.append(p)
+        return sorted(pods, key=lambda p: p.index)
+
+    def scale_out(self, primary_pod: Optional[MySQLPod], pods: List[MySQLPod], logger) -> None:
+        """
+        Add several new pods to the cluster.
+
+        The candidates are prepared in parallel, each with its own sessions:
+        diagnosis, the configuration check add_instance() would do and the
+        recovery method estimate. Joins are then sequential since the group
+        only takes one joining member at a time (add_instance() waits for
+        the distributed recovery to finish), and each candidate is diagnosed
+        again right before its join, against the group as earlier joins
+        left it.
+        """
+        peer_pod = primary_pod or self.connect_to_cluster(logger)
+
+        def prepare(pod: MySQLPod) -> Tuple[diagnose.CandidateStatus, Optional[str]]:
+            with shellutils.connect_dba_pooled(self.pool_key, pod.endpoint_co, logger) as pod_dba, \
+                    shellutils.connect_dba_pooled(self.pool_key, peer_pod.endpoint_co, logger) as peer_dba:
+                status = diagnose.diagnose_cluster_candidate(
+                    peer_dba.session, peer_dba.get_cluster(), pod, pod_dba, logger)
+                if status.status != diagnose.CandidateDiagStatus.JOINABLE:
+                    return status, None
+
+                check = pod_dba.check_instance_configuration()
+                if check["status"] != "ok":
+                    raise RuntimeError(f"{pod.name} is not configured for InnoDB Cluster: {check}")
+
+                return status, self.select_recovery_method(
+                    pod_dba.session, peer_dba.session, logger)
+
+        logger.info(f"Scale-out: preparing {', '.join(p.name for p in pods)}")
+        with ThreadPoolExecutor(max_workers=min(len(pods), k_max_parallel_prepare)) as executor:
+            futures = [(pod, executor.submit(prepare, pod)) for pod in pods]
+
+        first_error = None
+        for pod, future in futures:
+            if self.cluster.deleting:
+                return
+            try:
+                status, recovery_method = future.result()
 
-    def join_instance(self, pod: MySQLPod, pod_dba_session: 'Dba', logger) -> None:
+                with shellutils.connect_dba_pooled(self.pool_key, pod.endpoint_co, logger) as pod_dba:
+                    if status.status in (diagnose.CandidateDiagStatus.JOINABLE,
+                                         diagnose.CandidateDiagStatus.REJOINABLE):
+                        cluster = self.connect_to_primary(primary_pod, logger)
+                        status = diagnose.diagnose_cluster_candidate(
+                            self.dba.session, cluster, pod, pod_dba, logger)
+
+                    logger.info(
+                        f"Reconciling {pod}: state={status.status}  deleting={pod.deleting} cluster_deleting={self.cluster.deleting}")
+                    self.apply_candidate_status(pod, status, pod_dba, logger,
+                                                recovery_method)
+            except Exception as e:
+                # keep going with the others, the failed ones are retried
+                logger.error(f"Scale-out: could not add {pod.name}: {e}")
+                self.cluster.warn(action="ReconcilePod", reason="ScaleOutFailed",
+                                  message=f"Could not add {pod.name} to the cluster: {e}")
+                first_error = first_error or e
+
+        if first_error:
+            raise first_error
+
+    def select_recovery_method(self, pod_session: 'ClassicSession',
+                               donor_session: 'ClassicSession', logger) -> str:
+        """
+        Return the cheaper recoveryMethod for a joining instance, see
+        recovery.select_recovery_method().
+
+        The actual donor is picked by Group Replication among the ONLINE
+        members when the instance joins, so the estimate is based on
+        donor_session, the member the cluster handle is connected to. ONLINE
+        members have the same gtid_executed, their binlogs and dataset size
+        can differ somewhat. If incremental recovery fails because the
+        chosen donor purged more, join_instance() retries with clone.
+        """
+        try:
+            pod_gtids = pod_session.run_sql("SELECT @@globals.gtid_executed").fetch_one()[0]
+
+            row = donor_session.run_sql("""SELECT @@globals.gtid_executed, @@globals.gtid_purged,
+                    (SELECT COALESCE(SUM(data_length + index_length), 0)
+                        FROM information_schema.tables
+                        WHERE table_schema NOT IN ('mysql', 'sys', 'information_schema', 'performance_schema'))""").fetch_one()
+            donor_gtids, donor_purged, data_size = GTIDSet.parse(row[0]), GTIDSet.parse(row[1]), int(row[2])
+
+            binlog_size = 0
+            res = donor_session.run_sql("SHOW BINARY LOGS")
+            r = res.fetch_one()
+            while r:
+                binlog_size += int(r[1])
+                r = res.fetch_one()
+        except mysqlsh.Error as e:
+            logger.warning(f"Could not estimate recovery cost, using incremental: {e}")
+            return "incremental"
+
+        method, reason = recovery.select_recovery_method(
+            GTIDSet.parse(pod_gtids), donor_gtids, donor_purged, binlog_size, data_size)
+        logger.info(f"Recovery cost: {reason} -> {method}")
+        return method
+
+    def join_instance(self, pod: MySQLPod, pod_dba_session: 'Dba', logger,
+                      recovery_method: Optional[str] = None) -> None:
         logger.info(f"Adding {pod.endpoint} to cluster")
+        diagnose.g_cluster_status_cache.invalidate(self.cluster)
 
         peer_pod = self.connect_to_cluster(logger)
 
         self.log_mysql_info(pod, pod_dba_session.session, logger)
 
-        # TODO - always use clone when dataset is big
-        # With Shell Bug #33900165 fixed we should use "auto" by default
-        # and remove the retry logic below
-        recovery_method = "incremental"
+        # With Shell Bug #33900165 fixed we could use "auto" and remove the
+        # retry logic below, but "auto" doesn't consider the dataset size
+        if not recovery_method:
+            recovery_method = self.select_recovery_method(
+                pod_dba_session.session, self.dba.session, logger)
 
         add_options = {
             "recoveryMethod": recovery_method,
@@ -462,6 +762,8 @@ class ClusterController:
             logger.debug("add_instance OK")
         except  (mysqlsh.Error, RuntimeError) as e:
             logger.warning(f"add_instance failed: error={e}")
+            if recovery_method == "clone":
+                raise
 
             # Incremetnal may fail if transactions are missing from binlog
             # retry using clone
@@ -484,6 +786,7 @@ class ClusterController:
 
     def rejoin_instance(self, pod: MySQLPod, pod_session, logger) -> None:
         logger.info(f"Rejoining {pod.endpoint} to cluster")
+        diagnose.g_cluster_status_cache.invalidate(self.cluster)
 
         if not self.dba_cluster:
             self.connect_to_cluster(logger)
@@ -518,6 +821,7 @@ class ClusterController:
 
     def __remove_instance_aux(self, pod: MySQLPod, logger, force: bool = False) -> None:
         logger.info(f"Removing {pod.endpoint} from cluster")
+        diagnose.g_cluster_status_cache.invalidate(self.cluster)
 
         # TODO improve this check
         if len(self.cluster.get_pods()) > 1:
@@ -606,7 +910,22 @@ class ClusterController:
         elif diagnostic.status == diagnose.ClusterDiagStatus.OFFLINE:
             # Reboot cluster if all pods are reachable
             if len([g for g in diagnostic.gtid_executed.values() if g is not None]) == len(self.cluster.get_pods()):
-                seed_pod = select_pod_with_most_gtids(diagnostic.gtid_executed)
+                try:
+                    seed_pod = select_reboot_seed(diagnostic.gtid_executed)
+                except DivergentGTIDSets as e:
+                    # rebooting from any of them would lose transactions
+                    # or fail, it needs a human to decide. Keep checking
+                    # until they do, but only report each divergence once.
+                    message = f"Cannot reboot OFFLINE cluster, no pod has the transactions of all others: {e}"
+                    if utils.g_ephemeral_cluster_state.get(self.cluster, "divergent-gtid-sets") != message:
+                        self.cluster.error(action="RestoreCluster", reason="DivergentGTIDSets",
+                                           message=message)
+                        utils.g_ephemeral_cluster_state.set(self.cluster, "divergent-gtid-sets",
+                                                            message, context="repair_cluster")
+                    raise kopf.TemporaryError(
+                        f"Cluster cannot be restored because members have divergent GTID sets: {e}", delay=60)
+                utils.g_ephemeral_cluster_state.set(self.cluster, "divergent-gtid-sets",
+                                                    None, context="repair_cluster")
 
                 self.cluster.info(action="RestoreCluster", reason="Rebooting",
                                     message=f"Restoring OFFLINE cluster through pod {seed_pod}")
@@ -684,7 +1003,7 @@ class ClusterController:
         pass
 
     def on_pod_created(self, pod: MySQLPod, logger) -> None:
-        diag = self.probe_status(logger)
+        diag = self.probe_status(logger, use_cache=True)
 
         logger.debug(
             f"on_pod_created: pod={pod.name} primary={diag.primary} cluster_state={diag.status}")
@@ -698,16 +1017,30 @@ class ClusterController:
 
                 shellutils.RetryLoop(logger).call(self.create_cluster, pod, logger)
 
-                # Mark the cluster object as already created
-                self.cluster.set_create_time(datetime.datetime.now())
+                # Mark the cluster object as already created, and publish
+                # its status with it (the seed is its only member for now)
+                # in a single request
+                diag = diagnose.ClusterStatus()
+                diag.status = diagnose.ClusterDiagStatus.ONLINE
+                diag.primary = pod
+                diag.online_members = [pod]
+                with self.cluster.batch_status_updates():
+                    self.cluster.set_create_time(datetime.datetime.now())
+                    self.publish_status(diag)
             else:
                 # Other pods must wait for the cluster to be ready
                 raise kopf.TemporaryError("Cluster is not yet ready", delay=15)
 
         elif diag.status in (diagnose.ClusterDiagStatus.ONLINE, diagnose.ClusterDiagStatus.ONLINE_PARTIAL, diagnose.ClusterDiagStatus.ONLINE_UNCERTAIN):
-            # Cluster exists and is healthy, join the pod to it
-            shellutils.RetryLoop(logger).call(
-                self.reconcile_pod, diag.primary, pod, logger)
+            # Cluster exists and is healthy, join the pod to it, together
+            # with any other pod of the same scale-out that's ready too
+            pods = self.pending_join_pods(pod)
+            if len(pods) > 1:
+                shellutils.RetryLoop(logger).call(
+                    self.scale_out, diag.primary, pods, logger)
+            else:
+                shellutils.RetryLoop(logger).call(
+                    self.reconcile_pod, diag.primary, pod, logger)
         else:
             self.repair_cluster(pod, diag, logger)
 
@@ -716,7 +1049,7 @@ class ClusterController:
                 f"Cluster repair from state {diag.status} attempted", delay=3)
 
     def on_pod_restarted(self, pod: MySQLPod, logger) -> None:
-        diag = self.probe_status(logger)
+        diag = self.probe_status(logger, use_cache=True)
         logger.debug(
             f"on_pod_restarted: pod={pod.name}  primary={diag.primary}  cluster_state={diag.status}")
 
@@ -759,6 +1092,19 @@ class ClusterController:
         This is for monitoring only and should not trigger any changes other
         than in informational k8s fields.
         """
+        # A diagnosis made in another view or partition is outdated
+        view_id, partition_id = diagnose.group_view(members)
+        diagnose.g_cluster_status_cache.invalidate(
+            self.cluster, view_id, partition_id)
+
+        by_member_id = {}
+        by_endpoint = {}
+        for member in members:
+            by_member_id[member[0]] = member
+            by_endpoint[member[4]] = member
+
+        # Pods whose membership info and readiness didn't change are left
+        # alone, so a view change only patches the pods it affected
         for pod in self.cluster.get_pods():
             info = pod.get_membership_info()
             if info:
@@ -766,20 +1112,14 @@ class ClusterController:
             else:
                 pod_member_id = None
 
-            for member_id, role, status, view_id, endpoint, version in members:
-                if pod_member_id and member_id == pod_member_id:
-                    pass
-                elif endpoint == pod.endpoint:
-                    pass
-                else:
-                    continue
-                pod.update_membership_status(
-                    member_id, role, status, view_id, version)
-                if status == "ONLINE":
-                    pod.update_member_readiness_gate("ready", True)
-                else:
-                    pod.update_member_readiness_gate("ready", False)
-                break
+            member = (pod_member_id and by_member_id.get(pod_member_id)) or by_endpoint.get(pod.endpoint)
+            if not member:
+                continue
+
+            member_id, role, status, view_id, endpoint, version = member
+            pod.update_membership_status(
+                member_id, role, status, view_id, version, only_if_changed=True)
+            pod.update_member_readiness_gate("ready", status == "ONLINE", only_if_changed=True)
 
     def on_server_image_change(self, version: str) -> None:
         return self.on_upgrade(version = version)
@@ -4,10 +4,12 @@
 #
 
 from logging import Logger, getLogger
-from typing import List, Dict
+from typing import List, Dict, Optional
 from ..kubeutils import client as api_client, ApiException
-from .. import utils, config, consts
+from .. import utils, config, consts, kubeutils, manifests
 from .cluster_api import InnoDBCluster, InnoDBClusterSpec
+from ..snapshot import SNAPSHOT_MOUNT_PATH
+import os
 import yaml
 from ..kubeutils import api_core, api_apps, k8s_cluster_domain
 import base64
@@ -472,7 +474,7 @@ spec:
           storage: 2Gi
 """
 
-    statefulset = yaml.safe_load(tmpl.replace("\n\n", "\n"))
+    statefulset = manifests.load_manifest(tmpl.replace("\n\n", "\n"))
 
     metadata = {}
     if spec.podAnnotations:
@@ -497,6 +499,96 @@ spec:
 
     return statefulset
 
+
+def prepare_seed_datadir_pvc(spec: InnoDBClusterSpec, logger: Logger) -> dict:
+    """
+    The datadir PVC of the first pod, created ahead of the StatefulSet when
+    initializing from a snapshot, so the snapshot can be restored into it.
+    The StatefulSet uses it as is, because it has the name it would give to
+    the PVC of the pod.
+    """
+    sts = prepare_cluster_stateful_set(spec, logger)
+    template = sts["spec"]["volumeClaimTemplates"][0]
+    return {
+        "apiVersion": "v1",
+        "kind": "PersistentVolumeClaim",
+        "metadata": {
+            "name": f"{template['metadata']['name']}-{spec.name}-0",
+            "labels": sts["spec"]["selector"]["matchLabels"]
+        },
+        "spec": template["spec"]
+    }
+
+
+def prepare_snapshot_restore_job(spec: InnoDBClusterSpec) -> dict:
+    """
+    One-off Job restoring spec.initDB.snapshot into the datadir PVC of the
+    first pod, before the StatefulSet is created. The PVC with the snapshot
+    is only mounted by this Job, so it's released as soon as it completes.
+    """
+    tmpl = f"""
+apiVersion: batch/v1
+kind: Job
+metadata:
+  name: {spec.name}-snapshot-restore
+  labels:
+    tier: mysql
+    mysql.oracle.com/cluster: {spec.name}
+    app.kubernetes.io/name: mysql-innodbcluster-snapshot-restore
+    app.kubernetes.io/instance: idc-{spec.name}
+    app.kubernetes.io/managed-by: mysql-operator
+    app.kubernetes.io/created-by: mysql-operator
+spec:
+  backoffLimit: 3
+  template:
+    spec:
+{utils.indent(spec.image_pull_secrets, 6)}
+      securityContext:
+        runAsUser: 27
+        runAsGroup: 27
+        fsGroup: 27
+      restartPolicy: Never
+      containers:
+      - name: restore
+        image: {spec.operator_image}
+        imagePullPolicy: {spec.sidecar_image_pull_policy}
+        command: ["mysqlsh", "--log-level=@INFO", "--pym", "mysqloperator", "init",
+                  "--restore-snapshot", "{os.path.join(SNAPSHOT_MOUNT_PATH, spec.initDB.snapshot.path)}",
+                  "--datadir", "/var/lib/mysql"
+        ]
+        securityContext:
+          allowPrivilegeEscalation: false
+          privileged: false
+          readOnlyRootFilesystem: true
+          capabilities:
+            drop:
+            - ALL
+        env:
+        - name: MYSQLSH_USER_CONFIG_HOME
+          value: /tmp
+        volumeMounts:
+        - name: datadir
+          mountPath: /var/lib/mysql
+        - name: snapshot
+          mountPath: {SNAPSHOT_MOUNT_PATH}
+          readOnly: true
+        - name: tmp
+          mountPath: /tmp
+      volumes:
+      - name: datadir
+        persistentVolumeClaim:
+          claimName: datadir-{spec.name}-0
+      - name: tmp
+        emptyDir: {{}}
+"""
+    job = yaml.safe_load(tmpl.replace("\n\n", "\n"))
+
+    pvc = dict(spec.initDB.snapshot.storage.persistentVolumeClaim.raw_data, readOnly=True)
+    job["spec"]["template"]["spec"]["volumes"].append({"name": "snapshot", "persistentVolumeClaim": pvc})
+
+    return job
+
+
 def prepare_service_account(spec: InnoDBClusterSpec) -> dict:
     if not spec.serviceAccountName is None:
         return None
@@ -722,21 +814,45 @@ data:
     return cm
 
 
+def patch_stateful_set(name: str, namespace: str, patch: dict, logger: Logger,
+                       live: Optional[api_client.V1StatefulSet] = None) -> bool:
+    """
+    Patch the StatefulSet unless the patch wouldn't change it, so that no-op
+    patches don't bump its generation. Returns whether it was patched.
+
+    live is the current object, read from the API server if not given.
+    """
+    if live is None:
+        live = kubeutils.catch_404(
+            lambda: api_apps.read_namespaced_stateful_set(name, namespace))
+
+    if live is not None:
+        changes = manifests.diff_patch(
+            kubeutils.api_client.sanitize_for_serialization(live), patch)
+        if not changes:
+            logger.debug(f"StatefulSet {namespace}/{name} is up to date")
+            return False
+        manifests.log_changes(f"StatefulSet {namespace}/{name}", changes, logger)
+
+    api_apps.patch_namespaced_stateful_set(name, namespace, body=patch)
+    return True
+
+
 def reconcile_stateful_set_from_spec(spec: InnoDBClusterSpec, logger: Logger) -> None:
     logger.info("reconcile_stateful_set")
     patch = prepare_cluster_stateful_set(spec, logger)
 
-    logger.info(f"reconcile_stateful_set: patch={patch}")
-    api_apps.patch_namespaced_stateful_set(
-        spec.name, spec.namespace, body=patch)
+    logger.debug(f"reconcile_stateful_set: patch={patch}")
+    patch_stateful_set(spec.name, spec.namespace, patch, logger)
 
 def reconcile_stateful_set(cluster: InnoDBCluster, logger: Logger) -> None:
     reconcile_stateful_set_from_spec(cluster.parsed_spec, logger)
 
 
-def update_stateful_set_spec(sts : api_client.V1StatefulSet, patch: dict) -> None:
-    api_apps.patch_namespaced_stateful_set(
-        sts.metadata.name, sts.metadata.namespace, body=patch)
+def update_stateful_set_spec(sts : api_client.V1StatefulSet, patch: dict,
+                             logger: Optional[Logger] = None) -> None:
+    patch_stateful_set(sts.metadata.name, sts.metadata.namespace, patch,
+                       logger or getLogger(), live=sts)
 
 
 def update_mysql_image(sts: api_client.V1StatefulSet, spec: InnoDBClusterSpec, logger: Logger) -> None:
@@ -775,11 +891,11 @@ def update_pull_policy(sts: api_client.V1StatefulSet, spec: InnoDBClusterSpec, l
                                {"name": "mysql", "imagePullPolicy": spec.mysql_image_pull_policy}
                           ]}
                        }}}
-    update_stateful_set_spec(sts, patch)
+    update_stateful_set_spec(sts, patch, logger)
 
 def update_template_property(sts: api_client.V1StatefulSet, property_name: str, property_value: str, logger: Logger) -> None:
     patch = {"spec": {"template": {"spec": { property_name: property_value }}}}
-    update_stateful_set_spec(sts, patch)
+    update_stateful_set_spec(sts, patch, logger)
 
 
 def on_first_cluster_pod_created(cluster: InnoDBCluster, logger: Logger) -> None:
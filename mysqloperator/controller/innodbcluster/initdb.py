@@ -6,18 +6,64 @@
 from typing import TYPE_CHECKING, cast
 from .cluster_api import DumpInitDBSpec, MySQLPod, InitDB, CloneInitDBSpec, InnoDBCluster
 from ..shellutils import SessionWrap
-from .. import mysqlutils, utils
+from .. import mysqlutils, utils, snapshot
 from ..kubeutils import api_core, api_apps, api_customobj
 from ..kubeutils import client as api_client, ApiException
 from abc import ABC, abstractmethod
 import mysqlsh
 import time
 import os
+import shutil
 from logging import Logger
 if TYPE_CHECKING:
     from mysqlsh.mysql import ClassicSession
 
 
+def is_snapshot_seed(pod: MySQLPod, cluster: InnoDBCluster) -> bool:
+    """
+    Whether the pod is the seed of a cluster initialized from a snapshot,
+    whose datadir was restored by the snapshot restore Job.
+    """
+    return (pod.index == 0 and cluster.get_create_time() is None and
+            cluster.parsed_spec.initDB is not None and
+            cluster.parsed_spec.initDB.snapshot is not None)
+
+
+def restore_snapshot(path: str, datadir: str, logger: Logger) -> None:
+    """
+    Restore the snapshot in path into datadir, for the snapshot restore Job
+    """
+    # removed once the restore completes, so an interrupted one is redone
+    marker = os.path.join(datadir, ".snapshot-restore")
+    if os.path.exists(marker):
+        logger.info(f"Removing the files of an interrupted restore from {datadir}")
+        for entry in os.scandir(datadir):
+            if entry.path == marker or entry.name == "lost+found":
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+    elif os.path.isdir(os.path.join(datadir, "mysql")):
+        logger.info(f"{datadir} already initialized, not restoring snapshot")
+        return
+
+    logger.info(f"Restoring snapshot {path} into {datadir}")
+
+    open(marker, "w").close()
+    start = time.monotonic()
+    manifest = snapshot.restore_snapshot(path, datadir, snapshot.default_threads())
+    elapsed = time.monotonic() - start
+
+    # the entrypoint of the mysql container initializes the datadir unless
+    # this exists
+    os.makedirs(os.path.join(datadir, "mysql"), exist_ok=True)
+    os.remove(marker)
+
+    stats = manifest["stats"]
+    logger.info(f"Restored {stats['fileCount']} files, {stats['dataSize']} bytes in {elapsed:.1f}s from snapshot of {manifest.get('source')} gtidExecuted={manifest.get('gtidExecuted')}")
+
+
 def start_clone_seed_pod(session: 'ClassicSession',
                          cluster: InnoDBCluster,
                          seed_pod: MySQLPod, clone_spec: CloneInitDBSpec,
@@ -13,19 +13,24 @@ from .. import consts, kubeutils, config, utils, errors, diagnose
 from .. import shellutils
 from ..group_monitor import g_group_monitor
 from ..utils import g_ephemeral_pod_state
-from ..kubeutils import api_core, api_apps, api_policy, api_rbac, api_cron_job, k8s_version
+from ..kubeutils import api_core, api_apps, api_batch, api_policy, api_rbac, api_cron_job, k8s_version
 from ..backup import backup_objects
 from ..config import DEFAULT_OPERATOR_VERSION_TAG
 from .cluster_controller import ClusterController, ClusterMutex
 from . import cluster_objects, router_objects, cluster_api
 from .cluster_api import InnoDBCluster, InnoDBClusterSpec, MySQLPod, get_all_clusters
+from ..workqueue import WorkQueue
 import kopf
 from logging import Logger
-import time
 
 
 # TODO check whether we should store versions in status to make upgrade easier
 
+# Retry delay for pod events if the handler didn't give one
+k_pod_event_retry_delay = 15
+# How long pod event processing waits for the cluster lock
+k_pod_event_lock_wait = 5
+
 
 def on_group_view_change(cluster: InnoDBCluster, members: list, view_id_changed: bool) -> None:
     """
@@ -35,8 +40,8 @@ def on_group_view_change(cluster: InnoDBCluster, members: list, view_id_changed:
     It also updates cluster status in the pods and cluster objects.
     """
 
-    c = ClusterController(cluster)
-    c.on_group_view_change(members, view_id_changed)
+    with ClusterController(cluster) as c:
+        c.on_group_view_change(members, view_id_changed)
 
 
 def monitor_existing_clusters(logger: Logger) -> None:
@@ -159,6 +164,10 @@ def on_innodbcluster_create(name: str, namespace: Optional[str], body: Body,
                 kopf.adopt(rb)
                 api_rbac.create_namespaced_role_binding(namespace=namespace, body=rb)
 
+            if icspec.initDB and icspec.initDB.snapshot and not ignore_404(cluster.get_stateful_set):
+                print("6a. Snapshot restore")
+                wait_snapshot_restore(cluster, icspec, logger)
+
             print("7. Cluster StatefulSet")
             if not ignore_404(cluster.get_stateful_set):
                 print("\tPreparing...")
@@ -207,6 +216,8 @@ def on_innodbcluster_create(name: str, namespace: Optional[str], body: Body,
                 kopf.adopt(secret)
                 api_core.create_namespaced_secret(namespace=namespace, body=secret)
 
+        except (kopf.TemporaryError, kopf.PermanentError):
+            raise
         except Exception as exc:
             cluster.warn(action="CreateCluster", reason="CreateResourceFailed", message=f"{exc}")
             raise
@@ -223,6 +234,41 @@ def on_innodbcluster_create(name: str, namespace: Optional[str], body: Body,
             }})
 
 
+def wait_snapshot_restore(cluster: InnoDBCluster, icspec: InnoDBClusterSpec, logger: Logger) -> None:
+    """
+    Restore spec.initDB.snapshot into the datadir PVC of the seed with a
+    one-off Job, and retry until it completes. The StatefulSet is only
+    created afterwards, so no pod mounts the PVC of the snapshot and the
+    seed starts with the restored datadir.
+    """
+    if not icspec.initDB.snapshot.storage.persistentVolumeClaim:
+        raise kopf.PermanentError("spec.initDB.snapshot is only supported from persistentVolumeClaim storage")
+
+    if not cluster.get_seed_datadir_pvc():
+        pvc = cluster_objects.prepare_seed_datadir_pvc(icspec, logger)
+        print(f"\tCreating...{pvc}")
+        api_core.create_namespaced_persistent_volume_claim(cluster.namespace, pvc)
+
+    job = cluster.get_snapshot_restore_job()
+    if not job:
+        job = cluster_objects.prepare_snapshot_restore_job(icspec)
+        print(f"\tCreating...{job}")
+        kopf.adopt(job)
+        api_batch.create_namespaced_job(cluster.namespace, job)
+        raise kopf.TemporaryError("Waiting for the snapshot to be restored", delay=15)
+
+    for cond in job.status.conditions or []:
+        if cond.type == "Complete" and cond.status == "True":
+            logger.info(f"Snapshot {icspec.initDB.snapshot.path} restored")
+            return
+        if cond.type == "Failed" and cond.status == "True":
+            cluster.error(action="CreateCluster", reason="SnapshotRestoreFailed",
+                          message=f"Job {job.metadata.name} failed: {cond.message}")
+            raise kopf.PermanentError(f"Snapshot restore failed: {cond.message}")
+
+    raise kopf.TemporaryError("Waiting for the snapshot to be restored", delay=15)
+
+
 @kopf.on.delete(consts.GROUP, consts.VERSION,
                 consts.INNODBCLUSTER_PLURAL)  # type: ignore
 def on_innodbcluster_delete(name: str, namespace: str, body: Body,
@@ -232,6 +278,7 @@ def on_innodbcluster_delete(name: str, namespace: str, body: Body,
     logger.info(f"Deleting cluster {name}")
 
     g_group_monitor.remove_cluster(cluster)
+    shellutils.g_dba_pool.close_cluster(f"{namespace}/{name}")
 
     # Scale down routers to 0
     logger.info(f"Updating Router Deployment.replicas to 0")
@@ -270,116 +317,6 @@ def on_innodbcluster_field_instances(old, new, body: Body,
             sts, {"spec": {"replicas": new}})
 
 
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.version")  # type: ignore
-def on_innodbcluster_field_version(old, new, body: Body,
-                                   logger: Logger, **kwargs):
-    cluster = InnoDBCluster(body)
-
-    # ignore spec changes if the cluster is still being initialized
-    if not cluster.ready:
-        logger.debug(f"Ignoring spec.version change for unready cluster")
-        return
-
-    # TODO - identify what cluster statuses should allow this change
-
-    sts = cluster.get_stateful_set()
-    if sts and old != new:
-        logger.info(
-            f"Propagating spec.version={new} for {cluster.namespace}/{cluster.name} (was {old})")
-
-        cluster.parse_spec()
-        cluster_ctl = ClusterController(cluster)
-        try:
-            cluster_ctl.on_server_version_change(new)
-        except:
-            # revert version in the spec
-            raise
-        cluster_objects.update_mysql_image(sts, cluster.parsed_spec, logger)
-        router_deploy = cluster.get_router_deployment()
-        if router_deploy:
-            router_objects.update_router_image(router_deploy, cluster.parsed_spec, logger)
-
-
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.imageRepository")  # type: ignore
-def on_innodbcluster_field_image_repository(old, new, body: Body,
-                                            logger: Logger, **kwargs):
-    cluster = InnoDBCluster(body)
-
-    # ignore spec changes if the cluster is still being initialized
-    if not cluster.ready:
-        logger.debug(f"Ignoring spec.imageRepository change for unready cluster")
-        return
-
-    sts = cluster.get_stateful_set()
-    if sts and old != new:
-        logger.info(
-            f"Propagating spec.imageRepository={new} for {cluster.namespace}/{cluster.name} (was {old})")
-
-        cluster.parse_spec()
-
-        cluster_objects.update_mysql_image(sts, cluster.parsed_spec, logger)
-        cluster_objects.update_operator_image(sts, cluster.parsed_spec)
-        router_deploy = cluster.get_router_deployment()
-        if router_deploy:
-            router_objects.update_router_image(router_deploy, cluster.parsed_spec, logger)
-
-
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.imagePullPolicy")  # type: ignore
-def on_innodbcluster_field_image_pull_policy(old, new, body: Body,
-                                            logger: Logger, **kwargs):
-    cluster = InnoDBCluster(body)
-
-    # ignore spec changes if the cluster is still being initialized
-    if not cluster.ready:
-        logger.debug(f"Ignoring spec.imagePullPolicy change for unready cluster")
-        return
-
-    sts = cluster.get_stateful_set()
-    if sts and old != new:
-        logger.info(
-            f"Propagating spec.imagePullPolicy={new} for {cluster.namespace}/{cluster.name} (was {old})")
-
-        cluster.parse_spec()
-
-        cluster_objects.update_pull_policy(sts, cluster.parsed_spec, logger)
-        router_deploy = cluster.get_router_deployment()
-        if router_deploy:
-            router_objects.update_pull_policy(router_deploy, cluster.parsed_spec, logger)
-
-
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.image")  # type: ignore
-def on_innodbcluster_field_image(old, new, body: Body,
-                                 logger: Logger, **kwargs):
-    cluster = InnoDBCluster(body)
-
-    # ignore spec changes if the cluster is still being initialized
-    if not cluster.ready:
-        logger.debug(f"Ignoring spec.image change for unready cluster")
-        return
-
-    # TODO - identify what cluster statuses should allow this change
-
-    sts = cluster.get_stateful_set()
-    if sts and old != new:
-        logger.info(
-            f"Updating MySQL image for InnoDB Cluster StatefulSet pod template from {old} to {new}")
-        cluster.parsed_spec.validate(logger)
-
-        cluster_ctl = ClusterController(cluster)
-
-        try:
-            cluster_ctl.on_server_image_change(new)
-        except:
-            # revert version in the spec
-            raise
-
-        cluster_objects.update_mysql_image(sts, cluster.parsed_spec, logger)
-
-
 @kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
                field="spec.router.instances")  # type: ignore
 def on_innodbcluster_field_router_instances(old: int, new: int, body: Body,
@@ -399,29 +336,6 @@ def on_innodbcluster_field_router_instances(old: int, new: int, body: Body,
         router_objects.update_size(cluster, new, logger)
 
 
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.router.version")  # type: ignore
-def on_innodbcluster_field_router_version(old: str, new: str, body: Body,
-                                          logger: Logger, **kwargs):
-    if old == new:
-        return
-
-    cluster = InnoDBCluster(body)
-
-    # ignore spec changes if the cluster is still being initialized
-    if not cluster.get_create_time():
-        logger.debug(
-            f"Ignoring spec.router.version change for unready cluster")
-        return
-
-    cluster.parsed_spec.validate(logger)
-    with ClusterMutex(cluster):
-        router_deploy = cluster.get_router_deployment()
-        if router_deploy:
-            router_objects.update_router_image(router_deploy, cluster.parsed_spec, logger)
-
-
-
 @kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
                field="spec.backupSchedules")  # type: ignore
 def on_innodbcluster_field_backup_schedules(old: str, new: str, body: Body,
@@ -453,49 +367,83 @@ def on_innodbcluster_field_backup_schedules(old: str, new: str, body: Body,
         backup_objects.update_schedules(cluster.parsed_spec, old, new, logger)
 
 
-def update_tls_field(body: Body, field: str, logger: Logger) -> None:
-    cluster = InnoDBCluster(body)
-
-    if not cluster.get_create_time():
-        logger.debug(
-            f"Ignoring {field} change for unready cluster")
-        return
-
-    cluster.parsed_spec.validate(logger)
+# Spec fields that end up in the pod templates of the StatefulSet or the
+# router Deployment, see on_innodbcluster_update()
+k_pod_template_fields = [
+    "spec.version",
+    "spec.image",
+    "spec.imageRepository",
+    "spec.imagePullPolicy",
+    "spec.router.version",
+    "spec.tlsUseSelfSigned",
+    "spec.tlsSecretName",
+    "spec.router.tlsSecretName",
+    "spec.tlsCASecretName"
+]
 
-    cluster_objects.reconcile_stateful_set(cluster, logger)
 
+def get_field(obj, field: str) -> Any:
+    for key in field.split("."):
+        obj = (obj or {}).get(key)
+    return obj
 
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.tlsUseSelfSigned")  # type: ignore
-def on_innodbcluster_field_tls_use_self_signed(body: Body,
-                                               logger: Logger, **kwargs):
-    logger.info("on_innodbcluster_field_tls_use_self_signed")
-    update_tls_field(body, "spec.tlsUseSelfSigned", logger)
 
+@kopf.on.update(consts.GROUP, consts.VERSION,
+                consts.INNODBCLUSTER_PLURAL)  # type: ignore
+def on_innodbcluster_update(old, new, body: Body, logger: Logger, **kwargs):
+    """
+    Apply the changes of k_pod_template_fields. All fields changed in one
+    update are handled together, with a single patch of the StatefulSet and
+    of the router Deployment, so that pods roll only once.
+    """
+    changed = {field: (get_field(old, field), get_field(new, field))
+               for field in k_pod_template_fields
+               if get_field(old, field) != get_field(new, field)}
+    if not changed:
+        return
 
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.tlsSecretName")  # type: ignore
-def on_innodbcluster_field_tls_secret_name(body: Body,
-                                          logger: Logger, **kwargs):
-    logger.info("on_innodbcluster_field_tls_secret_name")
-    update_tls_field(body, "spec.tlsSecretName", logger)
+    cluster = InnoDBCluster(body)
 
+    # ignore spec changes if the cluster is still being initialized
+    if not cluster.ready:
+        logger.debug(
+            f"Ignoring {', '.join(changed)} change for unready cluster")
+        return
 
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.router.tlsSecretName")  # type: ignore
-def on_innodbcluster_field_router_tls_secret_name(body: Body,
-                                                  logger: Logger, **kwargs):
-    logger.info("on_innodbcluster_field_router_tls_secret_name")
-    update_tls_field(body, "spec.router.tlsSecretName", logger)
+    for field, (old_value, new_value) in changed.items():
+        logger.info(
+            f"Propagating {field}={new_value} for {cluster.namespace}/{cluster.name} (was {old_value})")
 
+    cluster.parsed_spec.validate(logger)
 
-@kopf.on.field(consts.GROUP, consts.VERSION, consts.INNODBCLUSTER_PLURAL,
-               field="spec.tlsCASecretName")  # type: ignore
-def on_innodbcluster_field_tls_ca_secret_name(body: Body,
-                                              logger: Logger, **kwargs):
-    logger.info("on_innodbcluster_field_tls_ca_secret_name")
-    update_tls_field(body, "spec.tlsCASecretName", logger)
+    with ClusterMutex(cluster):
+        # TODO - identify what cluster statuses should allow this change
+        if "spec.version" in changed or "spec.image" in changed:
+            with ClusterController(cluster) as cluster_ctl:
+                if "spec.version" in changed:
+                    cluster_ctl.on_server_version_change(changed["spec.version"][1])
+                if "spec.image" in changed:
+                    cluster_ctl.on_server_image_change(changed["spec.image"][1])
+
+        router = {}
+        if changed.keys() & {"spec.version", "spec.imageRepository", "spec.router.version"}:
+            router["image"] = cluster.parsed_spec.router_image
+        if "spec.imagePullPolicy" in changed:
+            # spec.mysql_image_pull_policy for the router too, see
+            # router_objects.update_pull_policy()
+            router["imagePullPolicy"] = cluster.parsed_spec.mysql_image_pull_policy
+
+        # the StatefulSet update includes the sidecar (operator) image
+        if changed.keys() - {"spec.router.version"} and cluster.get_stateful_set():
+            logger.info(f"Updating StatefulSet of {cluster.namespace}/{cluster.name}")
+            cluster_objects.reconcile_stateful_set(cluster, logger)
+
+        if router:
+            router_deploy = cluster.get_router_deployment()
+            if router_deploy:
+                logger.info(f"Updating router Deployment of {cluster.namespace}/{cluster.name}: {router}")
+                router_objects.update_router_container_template_properties(
+                    router_deploy, router, logger)
 
 
 @kopf.on.create("", "v1", "pods",
@@ -537,74 +485,85 @@ def on_pod_create(body: Body, logger: Logger, **kwargs):
             g_group_monitor.monitor_cluster(
                 cluster, on_group_view_change, logger)
 
-        cluster_ctl = ClusterController(cluster)
-
-        cluster_ctl.on_pod_created(pod, logger)
+        with ClusterController(cluster) as cluster_ctl:
+            cluster_ctl.on_pod_created(pod, logger)
 
         # Remember how many restarts happened as of now
         g_ephemeral_pod_state.set(pod, "mysql-restarts", pod.get_container_restarts("mysql"), context="on_pod_create")
 
 
-@kopf.on.event("", "v1", "pods",
-               labels={"component": "mysqld"})  # type: ignore
-def on_pod_event(event, body: Body, logger: Logger, **kwargs):
+def process_pod_event(key: str, item) -> Optional[float]:
     """
-    Handle low-level MySQL server pod events. The events we're interested in are:
-    - when a container restarts in a Pod (e.g. because of mysqld crash)
+    Handle the latest event of a pod, queued by on_pod_event().
+    Returns the delay after which it should be processed again, if needed.
     """
-    # TODO ensure that the pod is owned by us
-
-    while True:
-        try:
-            pod = MySQLPod.from_json(body)
-
-            member_info = pod.get_membership_info()
-            ready = pod.check_containers_ready()
-            if pod.phase != "Running" or pod.deleting or not member_info:
-                logger.debug(
-                    f"ignored pod event: pod={pod.name} containers_ready={ready} deleting={pod.deleting} phase={pod.phase} member_info={member_info}")
-                return
-
-            mysql_restarts = pod.get_container_restarts("mysql")
-
-            event = ""
-            if g_ephemeral_pod_state.get(pod, "mysql-restarts") != mysql_restarts:
-                event = "mysql-restarted"
-
-            containers = [
-                f"{c.name}={'ready' if c.ready else 'not-ready'}" for c in pod.status.container_statuses]
-            conditions = [
-                f"{c.type}={c.status}" for c in pod.status.conditions]
-            logger.debug(f"POD EVENT {event}: pod={pod.name} containers_ready={ready} deleting={pod.deleting} phase={pod.phase} member_info={member_info} restarts={mysql_restarts} containers={containers} conditions={conditions}")
-
-            cluster = pod.get_cluster()
-            if not cluster:
-                logger.info(
-                    f"Ignoring event for pod {pod.name} belonging to a deleted cluster")
-                return
-            with ClusterMutex(cluster, pod):
-                cluster_ctl = ClusterController(cluster)
-
+    pod, logger = item
+    try:
+        member_info = pod.get_membership_info()
+        ready = pod.check_containers_ready()
+        if pod.phase != "Running" or pod.deleting or not member_info:
+            logger.debug(
+                f"ignored pod event: pod={pod.name} containers_ready={ready} deleting={pod.deleting} phase={pod.phase} member_info={member_info}")
+            return None
+
+        mysql_restarts = pod.get_container_restarts("mysql")
+
+        event = ""
+        if g_ephemeral_pod_state.get(pod, "mysql-restarts") != mysql_restarts:
+            event = "mysql-restarted"
+
+        containers = [
+            f"{c.name}={'ready' if c.ready else 'not-ready'}" for c in pod.status.container_statuses]
+        conditions = [
+            f"{c.type}={c.status}" for c in pod.status.conditions]
+        logger.debug(f"POD EVENT {event}: pod={pod.name} containers_ready={ready} deleting={pod.deleting} phase={pod.phase} member_info={member_info} restarts={mysql_restarts} containers={containers} conditions={conditions}")
+
+        cluster = pod.get_cluster()
+        if not cluster:
+            logger.info(
+                f"Ignoring event for pod {pod.name} belonging to a deleted cluster")
+            return None
+        restarted = ready and event == "mysql-restarted"
+        # Only probing can run alongside other handlers, rejoining can't.
+        # Don't wait long, the event is requeued if the cluster is busy.
+        with ClusterMutex(cluster, pod, shared=not restarted, timeout=k_pod_event_lock_wait):
+            with ClusterController(cluster) as cluster_ctl:
                 # Check if a container in the pod restarted
-                if ready and event == "mysql-restarted":
+                if restarted:
                     cluster_ctl.on_pod_restarted(pod, logger)
 
                     g_ephemeral_pod_state.set(pod, "mysql-restarts", mysql_restarts, context="on_pod_event")
 
                 # Check if we should refresh the cluster status
                 status = cluster_ctl.probe_status_if_needed(pod, logger)
-                if status == diagnose.ClusterDiagStatus.UNKNOWN:
-                    raise kopf.TemporaryError(
-                        f"Cluster has unreachable members. status={status}", delay=15)
-                break
-        except kopf.TemporaryError as e:
-            # TODO review this
-            # Manually handle retries, the event handler isn't getting called again
-            # by kopf (maybe a bug or maybe we're using it wrong)
-            logger.info(f"{e}: retrying after {e.delay} seconds")
-            if e.delay:
-                time.sleep(e.delay)
-            continue
+            if status == diagnose.ClusterDiagStatus.UNKNOWN:
+                raise kopf.TemporaryError(
+                    f"Cluster has unreachable members. status={status}", delay=15)
+    except kopf.TemporaryError as e:
+        # kopf doesn't retry event handlers, so we requeue ourselves
+        logger.info(f"{e}: retrying after {e.delay} seconds")
+        return e.delay or k_pod_event_retry_delay
+    return None
+
+
+# Events of the same pod are coalesced, only the latest one is processed
+g_pod_event_queue = WorkQueue("pod-events", process_pod_event,
+                              workers=config.pod_event_workers)
+
+
+@kopf.on.event("", "v1", "pods",
+               labels={"component": "mysqld"})  # type: ignore
+def on_pod_event(event, body: Body, logger: Logger, **kwargs):
+    """
+    Handle low-level MySQL server pod events. The events we're interested in are:
+    - when a container restarts in a Pod (e.g. because of mysqld crash)
+
+    The actual handling happens in process_pod_event(), from a work queue,
+    so that waiting for the cluster doesn't block kopf.
+    """
+    # TODO ensure that the pod is owned by us
+    pod = MySQLPod.from_json(body)
+    g_pod_event_queue.add(f"{pod.namespace}/{pod.name}", (pod, logger))
 
 
 @kopf.on.delete("", "v1", "pods",
@@ -626,10 +585,11 @@ def on_pod_delete(body: Body, logger: Logger, **kwargs):
     cluster = pod.get_cluster()
 
     if cluster:
-        with ClusterMutex(cluster, pod):
-            cluster_ctl = ClusterController(cluster)
+        diagnose.g_cluster_status_cache.invalidate(cluster)
 
-            cluster_ctl.on_pod_deleted(pod, body, logger)
+        with ClusterMutex(cluster, pod):
+            with ClusterController(cluster) as cluster_ctl:
+                cluster_ctl.on_pod_deleted(pod, body, logger)
 
             if pod.index == 0 and cluster.deleting:
                 cluster_objects.on_last_cluster_pod_removed(cluster, logger)
@@ -0,0 +1,40 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from typing import Tuple
+from ..gtid import GTIDSet
+
+# Cost model for picking the recovery method of a joining instance, in bytes
+# transferred. Applying binlog events costs about this many times more than
+# copying the same amount of data pages with clone
+k_incremental_apply_cost_factor = 3
+# Fixed cost of a clone (restart of the joining server, recovery), as bytes
+k_clone_fixed_cost = 512*1024*1024
+
+
+def select_recovery_method(pod_gtids: GTIDSet, donor_gtids: GTIDSet,
+                           donor_purged: GTIDSet, binlog_size: int,
+                           data_size: int) -> Tuple[str, str]:
+    """
+    Estimate the cost of incremental recovery and clone for a joining
+    instance and return the cheaper recoveryMethod, with the reason.
+
+    Incremental needs all transactions missing from the instance to still be
+    in the donor binlogs, and its cost is the size of those transactions
+    (from the average binlog bytes per transaction). Clone costs the size of
+    the dataset.
+    """
+    missing_purged = donor_purged - pod_gtids
+    if missing_purged:
+        return "clone", f"transactions missing from the instance were purged from the donor binlogs: purged={missing_purged}"
+
+    missing_count = (donor_gtids - pod_gtids).count()
+    binlog_trx = (donor_gtids - donor_purged).count()
+    bytes_per_trx = binlog_size / binlog_trx if binlog_trx else 0
+    incremental_cost = missing_count * bytes_per_trx * k_incremental_apply_cost_factor
+    clone_cost = data_size + k_clone_fixed_cost
+
+    method = "clone" if incremental_cost > clone_cost else "incremental"
+    return method, f"missing_trx={missing_count} bytes_per_trx={bytes_per_trx:.0f} incremental={incremental_cost:.0f} dataset={data_size} clone={clone_cost}"
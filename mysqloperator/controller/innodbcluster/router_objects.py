@@ -5,11 +5,11 @@
 
 from .cluster_api import InnoDBCluster, InnoDBClusterSpec
 from ..kubeutils import client as api_client, ApiException
-from .. import config, utils
+from .. import config, utils, kubeutils, manifests
 import yaml
 from ..kubeutils import api_apps, k8s_cluster_domain
 import kopf
-from logging import Logger
+from logging import Logger, getLogger
 from typing import Optional
 
 
@@ -216,7 +216,7 @@ spec:
         emptyDir: {{}}
 {utils.indent(spec.extra_router_volumes if router_tls_exists else spec.extra_router_volumes_no_cert, 6)}
 """
-    deployment = yaml.safe_load(tmpl)
+    deployment = manifests.load_manifest(tmpl)
 
     metadata = {}
     if spec.router.podAnnotations:
@@ -290,7 +290,22 @@ def update_size(cluster: InnoDBCluster, size: int, logger: Logger) -> None:
                 namespace=cluster.namespace, body=router_deployment)
 
 
-def update_deployment_spec(dpl: api_client.V1Deployment, patch: dict) -> None:
+def update_deployment_spec(dpl: api_client.V1Deployment, patch: dict,
+                           logger: Optional[Logger] = None) -> None:
+    """
+    Patch the Deployment unless the patch wouldn't change it, so that no-op
+    patches don't bump its generation.
+    """
+    logger = logger or getLogger()
+    what = f"Deployment {dpl.metadata.namespace}/{dpl.metadata.name}"
+
+    changes = manifests.diff_patch(
+        kubeutils.api_client.sanitize_for_serialization(dpl), patch)
+    if not changes:
+        logger.debug(f"{what} is up to date")
+        return
+    manifests.log_changes(what, changes, logger)
+
     api_apps.patch_namespaced_deployment(
         dpl.metadata.name, dpl.metadata.namespace, body=patch)
 
@@ -298,16 +313,21 @@ def update_deployment_spec(dpl: api_client.V1Deployment, patch: dict) -> None:
 def update_router_container_template_property(dpl: api_client.V1Deployment,
                                               property_name: str, property_value: str,
                                               logger: Logger) -> None:
+    update_router_container_template_properties(dpl, {property_name: property_value}, logger)
+
+
+def update_router_container_template_properties(dpl: api_client.V1Deployment,
+                                                properties: dict, logger: Logger) -> None:
     patch = {"spec": {"template":
                       {"spec": {
                           "containers": [
-                               {"name": "router", property_name: property_value}
+                               {"name": "router", **properties}
                           ]
                         }
                       }
                     }
             }
-    update_deployment_spec(dpl, patch)
+    update_deployment_spec(dpl, patch, logger)
 
 
 def propagate_router_field_change_to_sts(cluster: InnoDBCluster, field: str, logger: Logger) -> None:
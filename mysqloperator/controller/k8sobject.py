@@ -2,21 +2,39 @@
 #
 # Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
 
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
+import collections
 import datetime
-from .kubeutils import api_core
+import threading
+import time
+from .kubeutils import api_core, ApiException
 
 g_component = None
 g_host = None
 
+# Max number of distinct events waiting to be posted, further ones are dropped
+k_event_queue_size = 1000
+# Events allowed in a burst for a single object and the rate at which
+# that allowance refills (same defaults as the kubelet's event spam filter)
+k_event_burst = 25
+k_event_refill_interval = 5*60
+# Prefix of the message of the single event that replaces the events of an
+# object over its rate, like the kubelet's event aggregator does
+k_event_aggregate_prefix = "(combined from similar events): "
+# Repeats of an event within this window update the posted event's count
+# and series instead of creating a new Event object
+k_event_series_window = 10*60
+# How long to wait for pending events to be posted on shutdown
+k_event_flush_timeout = 10
 
-def post_event(namespace: str, object_ref: dict, type: str, action: str,
-               reason: str, message: str) -> None:
+
+def make_event(namespace: str, object_ref: dict, type: str, action: str,
+               reason: str, message: str) -> dict:
     if len(message) > 1024:
         message = message[:1024]
 
-    body = {
+    return {
         # What action was taken/failed regarding to the regarding object.
         'action': action,
 
@@ -44,7 +62,220 @@ def post_event(namespace: str, object_ref: dict, type: str, action: str,
 
         'type': type
     }
-    api_core.create_namespaced_event(namespace, body)
+
+
+def event_key(body: dict) -> tuple:
+    obj = body['involvedObject']
+    return (body['metadata']['namespace'], obj.get('kind'), obj.get('name'),
+            obj.get('uid'), obj.get('fieldPath'), body['type'], body['reason'],
+            body['message'])
+
+
+def aggregate_key(key: tuple) -> tuple:
+    # one per object, whatever the type, reason or message
+    return key[:5] + (None, None, None)
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, refill_interval: float):
+        self.capacity = capacity
+        self.refill_interval = refill_interval
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last) / self.refill_interval)
+        self.last = now
+
+    def take(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def next_token_in(self, now: float) -> float:
+        self.refill(now)
+        return max(0.0, (1 - self.tokens) * self.refill_interval)
+
+
+class PendingEvent:
+    def __init__(self, body: dict, needs_token: bool = False):
+        self.body = body
+        self.count = 1
+        self.last_seen = body['eventTime']
+        # whether it may only be posted once the object gets a token, false
+        # for events that took one when queued
+        self.needs_token = needs_token
+
+
+class PostedEvent:
+    def __init__(self, name: str, count: int):
+        self.name = name
+        self.count = count
+        self.time = time.monotonic()
+
+
+class EventPublisher(threading.Thread):
+    """
+    Posts Kubernetes Events in the background so that handlers don't wait on
+    the API server.
+
+    Repeats of the same (object, type, reason, message) are coalesced: while
+    waiting they are just counted, once posted they bump the count and series
+    of the existing Event instead of creating a new one. Each object gets a
+    token bucket, events over the rate are folded into a single aggregate
+    event for the object, which waits for the next token. So a noisy object
+    takes at most one entry of the queue over its rate, and can't delay the
+    events of other objects. Pending events are flushed on stop().
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True, name="event-publisher")
+
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.pending: Dict[tuple, PendingEvent] = collections.OrderedDict()
+        self.buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self.posted: Dict[tuple, PostedEvent] = {}
+        self.dropped = 0
+
+    def enqueue(self, body: dict) -> None:
+        key = event_key(body)
+        with self.cond:
+            ev = self.pending.get(key)
+            if ev:
+                ev.count += 1
+                ev.last_seen = body['eventTime']
+                return
+
+            needs_token = not self.bucket(key).take(time.monotonic())
+            if needs_token:
+                key = aggregate_key(key)
+                ev = self.pending.get(key)
+                if ev:
+                    # keep the last message, a warning is never hidden
+                    # behind a normal event
+                    ev.count += 1
+                    ev.last_seen = body['eventTime']
+                    ev.body['message'] = (k_event_aggregate_prefix + body['message'])[:1024]
+                    ev.body['reason'] = body['reason']
+                    ev.body['action'] = body['action']
+                    if body['type'] != "Normal":
+                        ev.body['type'] = body['type']
+                    return
+                body['message'] = (k_event_aggregate_prefix + body['message'])[:1024]
+
+            if len(self.pending) >= k_event_queue_size:
+                self.dropped += 1
+                if self.dropped % 100 == 1:
+                    print(f"EventPublisher: queue full, {self.dropped} events dropped")
+                return
+            self.pending[key] = PendingEvent(body, needs_token)
+            self.cond.notify()
+
+    def bucket(self, key: tuple) -> TokenBucket:
+        obj_key = key[:3]
+        b = self.buckets.get(obj_key)
+        if not b:
+            b = self.buckets[obj_key] = TokenBucket(k_event_burst, k_event_refill_interval)
+        return b
+
+    def take_ready(self) -> Tuple[List[Tuple[tuple, PendingEvent]], Optional[float]]:
+        # called with the lock held
+        now = time.monotonic()
+        ready = []
+        wait = None
+        for key, ev in list(self.pending.items()):
+            bucket = self.bucket(key)
+            if self.stopped or not ev.needs_token or bucket.take(now):
+                ready.append((key, self.pending.pop(key)))
+            else:
+                delay = bucket.next_token_in(now)
+                wait = delay if wait is None else min(wait, delay)
+        return ready, wait
+
+    def expire(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, p in self.posted.items() if now - p.time > k_event_series_window]:
+            del self.posted[key]
+        with self.cond:
+            # buckets untouched for this long would be full again anyway
+            for key in [k for k, b in self.buckets.items()
+                        if now - b.last > k_event_burst * k_event_refill_interval]:
+                del self.buckets[key]
+
+    def post(self, key: tuple, ev: PendingEvent) -> None:
+        namespace = key[0]
+        prev = self.posted.get(key)
+        if prev and time.monotonic() - prev.time <= k_event_series_window:
+            count = prev.count + ev.count
+            patch = {
+                'count': count,
+                # aggregate events keep the last message
+                'message': ev.body['message'],
+                'lastTimestamp': ev.last_seen,
+                'series': {
+                    'count': count,
+                    'lastObservedTime': ev.last_seen
+                }
+            }
+            try:
+                api_core.patch_namespaced_event(prev.name, namespace, patch)
+                prev.count = count
+                prev.time = time.monotonic()
+                return
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+                # the event expired in the meantime, create a new one
+
+        body = ev.body
+        body['count'] = ev.count
+        body['firstTimestamp'] = body['eventTime']
+        body['lastTimestamp'] = ev.last_seen
+        created = api_core.create_namespaced_event(namespace, body)
+        self.posted[key] = PostedEvent(created.metadata.name, ev.count)
+
+    def run(self) -> None:
+        while True:
+            with self.cond:
+                ready, wait = self.take_ready()
+                if not ready:
+                    if self.stopped:
+                        break
+                    self.cond.wait(wait)
+                    continue
+
+            for key, ev in ready:
+                try:
+                    self.post(key, ev)
+                except Exception as e:
+                    print(f"EventPublisher: error posting event {key}: {e}")
+
+            self.expire()
+
+    def stop(self) -> None:
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        if self.is_alive():
+            self.join(k_event_flush_timeout)
+
+
+# Only started by the operator, other processes post events synchronously
+g_event_publisher = EventPublisher()
+
+
+def post_event(namespace: str, object_ref: dict, type: str, action: str,
+               reason: str, message: str) -> None:
+    body = make_event(namespace, object_ref, type=type, action=action,
+                      reason=reason, message=message)
+    if g_event_publisher.is_alive() and not g_event_publisher.stopped:
+        g_event_publisher.enqueue(body)
+    else:
+        api_core.create_namespaced_event(namespace, body)
 
 
 class K8sInterfaceObject:
@@ -0,0 +1,165 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from typing import Any, List
+import collections
+import copy
+import re
+import threading
+import yaml
+
+# Max number of parsed manifests kept by load_manifest()
+k_manifest_cache_size = 64
+
+# Changes to fields under these paths roll the pods of a StatefulSet/Deployment
+k_rollout_paths = ("spec.template",)
+
+# Fields the server sets to these values when they're not given, so their
+# absence from an item of a replaced list isn't a change. Keyed by path in
+# the StatefulSet/Deployment, with [] for any list item
+k_server_defaults = {
+    "spec.template.spec.containers[].ports[].protocol": "TCP",
+    "spec.template.spec.initContainers[].ports[].protocol": "TCP",
+    "spec.template.spec.tolerations[].operator": "Equal",
+    "spec.volumeClaimTemplates[].apiVersion": "v1",
+    "spec.volumeClaimTemplates[].kind": "PersistentVolumeClaim",
+    "spec.volumeClaimTemplates[].spec.volumeMode": "Filesystem",
+    "spec.volumeClaimTemplates[].status": {"phase": "Pending"}
+}
+
+
+class ManifestCache:
+    """
+    LRU cache of YAML documents parsed by their rendered text.
+
+    The objects prepared for a cluster are rendered from a spec that only
+    changes when the cluster is edited, so the same text is parsed over and
+    over by the reconcile loops. Parsing it is by far the most expensive
+    part of preparing a manifest.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: collections.OrderedDict = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, text: str) -> Any:
+        with self.lock:
+            doc = self.entries.get(text)
+            if doc is not None:
+                self.entries.move_to_end(text)
+                self.hits += 1
+                # callers modify the returned objects
+                return copy.deepcopy(doc)
+            self.misses += 1
+
+        doc = yaml.safe_load(text)
+
+        with self.lock:
+            self.entries[text] = doc
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return copy.deepcopy(doc)
+
+
+g_manifest_cache = ManifestCache(k_manifest_cache_size)
+
+
+def load_manifest(text: str) -> Any:
+    """Same as yaml.safe_load(), cached by the text"""
+    return g_manifest_cache.load(text)
+
+
+def _named_items(items: list) -> bool:
+    return all(isinstance(item, dict) and "name" in item for item in items)
+
+
+def _server_default(path: str) -> Any:
+    return k_server_defaults.get(re.sub(r"\[[^\]]*\]", "[]", path))
+
+
+def _diff(live: Any, patch: Any, path: str, changes: List[str],
+          replaced: bool = False) -> None:
+    # replaced is set inside the items of a list replaced by the patch,
+    # where fields missing from the patch are removed
+    if isinstance(patch, dict):
+        if not isinstance(live, dict):
+            changes.append(path)
+            return
+        for key, value in patch.items():
+            subpath = f"{path}.{key}" if path else key
+            if value is None:
+                # merge patch deletion
+                if live.get(key) is not None:
+                    changes.append(subpath)
+                continue
+            _diff(live.get(key), value, subpath, changes, replaced)
+        if replaced:
+            for key, value in live.items():
+                subpath = f"{path}.{key}" if path else key
+                defaulted = value is None or _server_default(subpath) == value
+                if key not in patch and not defaulted:
+                    changes.append(subpath)
+    elif isinstance(patch, list):
+        if not isinstance(live, list):
+            changes.append(path)
+        elif patch and _named_items(patch) and _named_items(live):
+            # strategic merge of named items (containers, volumes, env...),
+            # live items missing from the patch are kept, unless the whole
+            # list is being replaced
+            by_name = {item["name"]: item for item in live}
+            for item in patch:
+                _diff(by_name.get(item["name"]), item, f"{path}[{item['name']}]", changes, replaced)
+            if replaced:
+                names = set(item["name"] for item in patch)
+                changes += [f"{path}[{item['name']}]" for item in live if item["name"] not in names]
+        elif len(live) != len(patch):
+            changes.append(path)
+        else:
+            # the list is replaced, fields defaulted by the server in live
+            # items are defaulted again but others missing from the patch
+            # are removed
+            sub: List[str] = []
+            for i, (l, p) in enumerate(zip(live, patch)):
+                _diff(l, p, f"{path}[{i}]", sub, replaced=True)
+            if sub:
+                changes.append(path)
+    elif live != patch:
+        changes.append(path)
+
+
+def diff_patch(live: dict, patch: dict) -> List[str]:
+    """
+    Return the paths of the fields a patch would change in a live object,
+    both given as dicts in the API format (camelCase), e.g.
+    ["spec.replicas", "spec.template.spec.containers[mysql].image"].
+
+    Fields set by the server but not in the patch aren't changes. Lists of
+    named items are matched by name, like a strategic merge patch does.
+    Other lists are replaced, so their items are compared in full, except
+    for the fields in k_server_defaults.
+    """
+    changes: List[str] = []
+    _diff(live, patch, "", changes)
+    return changes
+
+
+def rollout_changes(changes: List[str]) -> List[str]:
+    """Return the changes that cause pods to be recreated"""
+    return [c for c in changes
+            if any(c == p or c.startswith(p + ".") or c.startswith(p + "[")
+                   for p in k_rollout_paths)]
+
+
+def log_changes(what: str, changes: List[str], logger) -> None:
+    rollout = rollout_changes(changes)
+    if rollout:
+        logger.info(f"{what}: pods will be restarted for changes to {', '.join(rollout)}")
+    other = [c for c in changes if c not in rollout]
+    if other:
+        logger.info(f"{what}: updating {', '.join(other)}")
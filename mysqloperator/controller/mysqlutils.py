@@ -4,6 +4,7 @@
 #
 
 import mysqlsh
+from .gtid import GTIDSet
 
 
 def is_client_error(code):
@@ -100,16 +101,6 @@ def setup_backup_account(session, user, password):
 
 def count_gtids(gtid_set: str) -> int:
     """Return number of transactions in the GTID set"""
-    def count_range(r):
-        begin, _, end = r.partition("-")
-        if not end:
-            return 1
-        else:
-            return int(end)-int(begin)+1
-    n = 0
-    for g in gtid_set.replace("\n", "").split(","):
-        for r in g.split(":")[1:]:
-            n += count_range(r)
-    return n
+    return GTIDSet.parse(gtid_set).count()
 
 
@@ -10,6 +10,8 @@ from .innodbcluster import operator_cluster
 from .backup import operator_backup
 from . import config, utils
 from .group_monitor import g_group_monitor
+from .pod_informer import g_pod_informer
+from .k8sobject import g_event_publisher
 import kopf
 import logging
 
@@ -35,13 +37,29 @@ def on_startup(settings: kopf.OperatorSettings, logger: Logger, *args, **_):
     #     name='operator.mysql.oracle.com/last-handled-configuration'
     # )
 
+    g_event_publisher.start()
+    g_pod_informer.start()
+
     operator_cluster.monitor_existing_clusters(logger)
 
     g_group_monitor.start()
 
+    operator_cluster.g_pod_event_queue.start()
+
     Path('/tmp/mysql-operator-ready').touch()
 
 
+@kopf.on.probe(id="groupMonitor")  # type: ignore
+def probe_group_monitor(**kwargs) -> dict:
+    # served by the liveness endpoint, when the operator is run with one
+    return g_group_monitor.stats()
+
+
 @kopf.on.cleanup()  # type: ignore
 def on_shutdown(logger: Logger, *args, **kwargs):
+    operator_cluster.g_pod_event_queue.stop()
     g_group_monitor.stop()
+    logger.info(f"GroupMonitor stats: {g_group_monitor.stats()}")
+    g_pod_informer.stop()
+    # post what's still queued
+    g_event_publisher.stop()
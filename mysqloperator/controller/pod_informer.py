@@ -0,0 +1,137 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from typing import Dict, List, Optional, Tuple, cast
+from kubernetes import watch
+from .kubeutils import api_core, ApiException
+from .kubeutils import client as api_client
+import threading
+import time
+
+# Full relist interval, to recover from any event that could have been missed
+k_resync_interval = 5*60
+# How long the index can go without hearing from the API server before
+# readers stop trusting it and fall back to listing pods themselves
+k_max_staleness = 2*60
+# Server side timeout of each watch request
+k_watch_timeout = 60
+# Wait before retrying after a failed list or watch
+k_retry_delay = 5
+
+
+class PodInformer(threading.Thread):
+    """
+    Watch backed in-memory index of MySQL server pods, by namespace and
+    owning StatefulSet (i.e. cluster).
+
+    Lets the operator get the pods of a cluster without listing all mysqld
+    pods of the namespace from the API server every time. Readers get None
+    if the index is not synced or is stale and should then query the API
+    server directly.
+    """
+
+    def __init__(self, label_selector: str = "component=mysqld"):
+        super().__init__(daemon=True, name="pod-informer")
+
+        self.label_selector = label_selector
+        self.stopped = False
+
+        self.lock = threading.Lock()
+        # (namespace, statefulset name) -> {pod name: V1Pod}
+        self.index: Dict[Tuple[str, str], Dict[str, api_client.V1Pod]] = {}
+        self.resource_version: Optional[str] = None
+        self.synced = False
+        self.last_contact = 0.0
+        self.last_list = 0.0
+
+    @staticmethod
+    def owner_key(pod: api_client.V1Pod) -> Optional[Tuple[str, str]]:
+        for owner in pod.metadata.owner_references or []:
+            if owner.api_version == "apps/v1" and owner.kind == "StatefulSet":
+                return (pod.metadata.namespace, owner.name)
+        return None
+
+    def get_pods(self, namespace: str, cluster_name: str) -> Optional[List[api_client.V1Pod]]:
+        with self.lock:
+            if not self.synced or time.monotonic() - self.last_contact > k_max_staleness:
+                return None
+            return list(self.index.get((namespace, cluster_name), {}).values())
+
+    def relist(self) -> None:
+        objects = cast(api_client.V1PodList, api_core.list_pod_for_all_namespaces(
+            label_selector=self.label_selector))
+
+        index: Dict[Tuple[str, str], Dict[str, api_client.V1Pod]] = {}
+        for pod in objects.items:
+            key = self.owner_key(pod)
+            if key:
+                index.setdefault(key, {})[pod.metadata.name] = pod
+
+        with self.lock:
+            self.index = index
+            self.resource_version = objects.metadata.resource_version
+            self.synced = True
+            self.last_contact = self.last_list = time.monotonic()
+
+    def apply_event(self, event_type: str, pod: api_client.V1Pod) -> None:
+        key = self.owner_key(pod)
+        with self.lock:
+            self.resource_version = pod.metadata.resource_version
+            self.last_contact = time.monotonic()
+            if not key:
+                return
+            if event_type == "DELETED":
+                pods = self.index.get(key)
+                if pods:
+                    pods.pop(pod.metadata.name, None)
+                    if not pods:
+                        del self.index[key]
+            else:
+                self.index.setdefault(key, {})[pod.metadata.name] = pod
+
+    def watch(self) -> None:
+        w = watch.Watch()
+        for event in w.stream(api_core.list_pod_for_all_namespaces,
+                              label_selector=self.label_selector,
+                              resource_version=self.resource_version,
+                              timeout_seconds=k_watch_timeout):
+            if self.stopped:
+                w.stop()
+                break
+            if event["type"] == "ERROR":
+                # typically 410 Gone, our resourceVersion is too old
+                print(f"PodInformer: watch error {event['raw_object']}")
+                self.resource_version = None
+                w.stop()
+                break
+            self.apply_event(event["type"], event["object"])
+
+        with self.lock:
+            # an empty watch still means the API server is there
+            self.last_contact = time.monotonic()
+
+    def run(self) -> None:
+        while not self.stopped:
+            try:
+                if not self.resource_version or time.monotonic() - self.last_list > k_resync_interval:
+                    self.relist()
+                self.watch()
+            except ApiException as e:
+                print(f"PodInformer: error watching pods: {e}")
+                if e.status == 410:
+                    self.resource_version = None
+                else:
+                    time.sleep(k_retry_delay)
+            except Exception as e:
+                print(f"PodInformer: unexpected error watching pods: {e}")
+                self.resource_version = None
+                time.sleep(k_retry_delay)
+
+    def stop(self) -> None:
+        self.stopped = True
+
+
+# Only started by the operator, other processes always query the API server
+g_pod_informer = PodInformer()
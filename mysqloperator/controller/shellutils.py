@@ -7,10 +7,12 @@ from logging import Logger
 
 from .innodbcluster.cluster_api import MySQLPod
 import typing
-from typing import Any, Optional, Callable, TYPE_CHECKING, Union
+from typing import Any, Dict, List, Optional, Callable, Tuple, TYPE_CHECKING, Union
 import mysqlsh
 import kopf
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 if TYPE_CHECKING:
     from mysqlsh.mysql import ClassicSession
     from mysqlsh import Dba, Cluster
@@ -174,6 +176,194 @@ def connect_dba(target: dict, logger: Logger, **kwargs) -> 'Dba':
     return RetryLoop(logger, **kwargs).call(mysqlsh.connect_dba, target)
 
 
+class PooledDba:
+    def __init__(self, dba: 'Dba'):
+        self.dba = dba
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+
+class DbaPool:
+    """
+    Pool of AdminAPI (Dba) sessions by cluster and endpoint, so that
+    handlers reuse connections to the cluster members instead of doing a
+    full connect + TLS + auth handshake every time.
+
+    Sessions are pinged before being handed out, unless they were used in
+    the last ping_skip seconds, and closed once idle for max_idle seconds
+    or older than max_age seconds. A session is only ever
+    used by whoever checked it out, and is only returned to the pool if
+    its user didn't hit any error, so its state is known to be clean.
+    """
+
+    def __init__(self, max_idle: int = 60, max_age: int = 10*60,
+                 max_idle_per_endpoint: int = 2, ping_timeout: float = 5,
+                 ping_skip: float = 5, ping_workers: int = 2):
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.max_idle_per_endpoint = max_idle_per_endpoint
+        self.ping_timeout = ping_timeout
+        self.ping_skip = ping_skip
+        self.ping_executor = ThreadPoolExecutor(max_workers=ping_workers,
+                                                thread_name_prefix="dba-pool-ping")
+        self.lock = threading.Lock()
+        self.idle: Dict[Tuple[str, str, str, int, int], List[PooledDba]] = {}
+
+    @staticmethod
+    def make_key(cluster_key: str, target: dict) -> Tuple[str, str, str, int, int]:
+        # sessions with a read timeout are only handed to who asks for it
+        return (cluster_key, target.get("user", ""), target.get("host", ""),
+                int(target.get("port", 3306)), int(target.get("net-read-timeout", 0)))
+
+    def expired(self, entry: PooledDba, now: float) -> bool:
+        return (now - entry.last_used > self.max_idle or
+                now - entry.created > self.max_age)
+
+    @staticmethod
+    def close(entry: PooledDba) -> None:
+        try:
+            entry.dba.session.close()
+        except Exception:
+            pass
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        evicted = []
+        with self.lock:
+            for key in list(self.idle.keys()):
+                entries = self.idle[key]
+                evicted += [e for e in entries if self.expired(e, now)]
+                entries[:] = [e for e in entries if not self.expired(e, now)]
+                if not entries:
+                    del self.idle[key]
+        for e in evicted:
+            self.close(e)
+
+    def ping(self, entry: PooledDba) -> bool:
+        """
+        Check that the session still works, closing it if it doesn't.
+
+        Sessions have no read timeout, so the query runs in ping_executor
+        and a session that doesn't answer within ping_timeout is abandoned
+        to it. It's closed once the query returns, if ever. Hung sessions
+        can only take the few threads of the executor, pings queued behind
+        them time out and their sessions are closed without being used.
+        """
+        if time.monotonic() - entry.last_used < self.ping_skip:
+            return True
+
+        lock = threading.Lock()
+        state = {"ok": False, "done": False, "abandoned": False}
+
+        def run():
+            ok = False
+            with lock:
+                abandoned = state["abandoned"]
+            if not abandoned:
+                try:
+                    entry.dba.session.run_sql("SELECT 1")
+                    ok = True
+                except mysqlsh.Error:
+                    # server restarted or connection dropped
+                    pass
+            with lock:
+                state["ok"] = ok
+                state["done"] = True
+                close = state["abandoned"] or not ok
+            if close:
+                self.close(entry)
+
+        future = self.ping_executor.submit(run)
+        try:
+            future.result(self.ping_timeout)
+        except FutureTimeoutError:
+            pass
+        with lock:
+            if not state["done"]:
+                state["abandoned"] = True
+            return state["ok"]
+
+    def checkout(self, cluster_key: str, target: dict) -> PooledDba:
+        key = self.make_key(cluster_key, target)
+        self.evict_idle()
+        while True:
+            with self.lock:
+                entries = self.idle.get(key)
+                entry = entries.pop() if entries else None
+            if not entry:
+                break
+            if self.ping(entry):
+                return entry
+
+        return PooledDba(mysqlsh.connect_dba(target))
+
+    def connect(self, cluster_key: str, target: dict) -> 'PooledDbaWrap':
+        return PooledDbaWrap(self, cluster_key, target,
+                             self.checkout(cluster_key, target))
+
+    def checkin(self, cluster_key: str, target: dict, entry: PooledDba,
+                discard: bool = False) -> None:
+        now = time.monotonic()
+        if not discard and not self.expired(entry, now):
+            entry.last_used = now
+            key = self.make_key(cluster_key, target)
+            with self.lock:
+                entries = self.idle.setdefault(key, [])
+                if len(entries) < self.max_idle_per_endpoint:
+                    entries.append(entry)
+                    return
+        self.close(entry)
+
+    def close_cluster(self, cluster_key: str) -> None:
+        with self.lock:
+            keys = [k for k in self.idle.keys() if k[0] == cluster_key]
+            closed = [e for k in keys for e in self.idle.pop(k)]
+        for e in closed:
+            self.close(e)
+
+
+class PooledDbaWrap:
+    """
+    Like DbaWrap, but returns the session to its pool instead of closing it.
+    The session is discarded if the block failed, whatever the error, as it
+    may have been left with a transaction open or session variables like
+    sql_log_bin changed.
+    """
+
+    def __init__(self, pool: DbaPool, cluster_key: str, target: dict,
+                 entry: PooledDba):
+        self.pool = pool
+        self.cluster_key = cluster_key
+        self.target = target
+        self.entry = entry
+
+    def __enter__(self):
+        return self.entry.dba
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release(discard=exc_value is not None)
+
+    def release(self, discard: bool = False) -> None:
+        if self.entry:
+            self.pool.checkin(self.cluster_key, self.target, self.entry, discard)
+            self.entry = None
+
+    def __getattr__(self, name):
+        return getattr(self.entry.dba, name)
+
+
+g_dba_pool = DbaPool()
+
+
+def connect_dba_pooled(cluster_key: str, target: dict, logger: Logger,
+                       **kwargs) -> PooledDbaWrap:
+    """
+    Get a Dba session for target from g_dba_pool, connecting if needed.
+    cluster_key is the namespace/name of the cluster the target belongs to.
+    """
+    return RetryLoop(logger, **kwargs).call(g_dba_pool.connect, cluster_key, target)
+
+
 def connect_to_pod(pod: MySQLPod, logger: Logger, **kwargs):
     def connect(target):
         session = mysqlsh.mysql.get_session(target)
@@ -220,42 +410,6 @@ def jump_to_primary(session, account):
     return None
 
 
-def get_valid_cluster_handle(cluster, logger):
-    """
-    Try to get a cluster handle from any ONLINE pod.
-    """
-    ignore_pods = []
-
-    def try_once():
-        last_err = None
-        for pod in cluster.get_pods():
-            if pod.name not in ignore_pods:
-                try:
-                    dba = mysqlsh.connect_dba(pod.endpoint_co)
-                except Exception as e:
-                    logger.warning(
-                        f"Could not connect: target={pod.endpoint} error={e}")
-                    last_err = e
-                    continue
-
-                try:
-                    return pod, dba, dba.get_cluster()
-                except Exception as e:
-                    logger.warning(
-                        f"get_cluster: target={pod.endpoint} error={e}")
-                    last_err = e
-                    continue
-
-        # If failed because of exception, then throw exception which will
-        # cause a retry
-        if last_err:
-            raise last_err
-        # If failed because no pods, then just return None
-        return None, None, None
-
-    return RetryLoop(logger).call(try_once)
-
-
 def query_membership_info(session):
     row = session.run_sql("""SELECT m.member_id, m.member_role, m.member_state, s.view_id, m.member_version,
             (SELECT count(*) FROM performance_schema.replication_group_members) as member_count,
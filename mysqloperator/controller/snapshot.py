@@ -0,0 +1,261 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import json
+import math
+import os
+import time
+import zlib
+
+# Written last when a snapshot is complete, lists the files and their chunks
+SNAPSHOT_MANIFEST = "@.snapshot.json"
+# Subdirectory of a snapshot with the compressed chunks
+SNAPSHOT_CHUNKS_DIR = "chunks"
+
+# Where the storage of a snapshot initDB is mounted in the initconf container
+SNAPSHOT_MOUNT_PATH = "/mnt/snapshot"
+
+# Size of the chunks the files of a snapshot are split in, each chunk is
+# compressed and written by one thread
+k_chunk_size = 16*1024*1024
+# zlib compression level, favouring speed, InnoDB pages compress well anyway
+k_compress_level = 1
+# Max number of threads copying chunks, each one holds a chunk and its
+# compressed copy in memory
+k_max_threads = 8
+
+# Files in the scratch directory shared by the backup container and the
+# clone recipient instance of a snapshot backup job
+CLONE_RECIPIENT_CNF = "my.cnf"
+CLONE_RECIPIENT_DONE = "done"
+# How long the clone recipient instance may run, in seconds, in case the
+# backup container never tells it to stop
+k_clone_recipient_lifetime = 24*60*60
+
+# Server settings of the clone donor the recipient must have too, either
+# for CLONE INSTANCE to accept it or for the cloned data dictionary
+k_clone_recipient_variables = ("character_set_server", "collation_server",
+                               "innodb_page_size", "innodb_data_file_path",
+                               "lower_case_table_names")
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs the process may use, taking into account the CPU limit
+    of the container, which os.cpu_count() doesn't.
+    """
+    cpus = len(os.sched_getaffinity(0))
+    for path, unlimited in (("/sys/fs/cgroup/cpu.max", "max"),
+                            ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "-1")):
+        try:
+            with open(path) as f:
+                quota = f.read().split()
+            if len(quota) < 2:
+                # cgroup v1 has the period in a separate file
+                with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                    quota.append(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if quota[0] != unlimited:
+            cpus = min(cpus, max(1, math.ceil(int(quota[0]) / int(quota[1]))))
+        break
+    return cpus
+
+
+def default_threads() -> int:
+    """Number of threads to copy snapshots with"""
+    return max(1, min(available_cpus(), k_max_threads))
+
+
+def _write_chunk(src: str, offset: int, size: int, dest: str) -> dict:
+    with open(src, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    # zlib releases the GIL, so chunks are compressed in parallel
+    compressed = zlib.compress(data, k_compress_level)
+    with open(dest, "wb") as f:
+        f.write(compressed)
+    return {"offset": offset, "size": len(data),
+            "compressedSize": len(compressed), "crc32": zlib.crc32(data)}
+
+
+def write_snapshot(src_dir: str, out_dir: str, threads: int,
+                   info: Optional[dict] = None) -> dict:
+    """
+    Copy the files in src_dir to out_dir as zlib compressed chunks, using
+    the given number of threads, and write the manifest. info is added to
+    the manifest.
+
+    Returns the manifest, with the totals of the snapshot in "stats".
+    """
+    start = time.monotonic()
+    os.makedirs(os.path.join(out_dir, SNAPSHOT_CHUNKS_DIR), exist_ok=True)
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        rel_dir = os.path.relpath(dirpath, src_dir)
+        for d in dirnames:
+            files.append({"path": os.path.normpath(os.path.join(rel_dir, d)),
+                          "directory": True})
+        for f in filenames:
+            path = os.path.join(dirpath, f)
+            files.append({"path": os.path.normpath(os.path.join(rel_dir, f)),
+                          "size": os.path.getsize(path)})
+
+    with ThreadPoolExecutor(max_workers=threads,
+                            thread_name_prefix="snapshot") as executor:
+        futures: List[list] = []
+        for i, file in enumerate(files):
+            chunks = []
+            if not file.get("directory"):
+                src = os.path.join(src_dir, file["path"])
+                for n, offset in enumerate(range(0, file["size"], k_chunk_size)):
+                    name = f"{i}.{n}.zz"
+                    dest = os.path.join(out_dir, SNAPSHOT_CHUNKS_DIR, name)
+                    chunks.append((name, executor.submit(
+                        _write_chunk, src, offset, k_chunk_size, dest)))
+            futures.append(chunks)
+
+        for file, chunks in zip(files, futures):
+            if not file.get("directory"):
+                file["chunks"] = [dict(name=name, **future.result())
+                                  for name, future in chunks]
+
+    elapsed = time.monotonic() - start
+    data_size = sum(c["size"] for f in files for c in f.get("chunks", []))
+    size = sum(c["compressedSize"] for f in files for c in f.get("chunks", []))
+
+    manifest = dict(info or {})
+    manifest["files"] = files
+    manifest["stats"] = {
+        "dataSize": data_size,
+        "size": size,
+        "fileCount": sum(1 for f in files if not f.get("directory")),
+        "chunkCount": sum(len(f.get("chunks", [])) for f in files),
+        "seconds": elapsed
+    }
+
+    path = os.path.join(out_dir, SNAPSHOT_MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+    return manifest
+
+
+def _restore_chunk(src: str, dest: str, chunk: dict) -> None:
+    with open(src, "rb") as f:
+        data = zlib.decompress(f.read())
+    if len(data) != chunk["size"] or zlib.crc32(data) != chunk["crc32"]:
+        raise Exception(f"Snapshot chunk {src} is corrupted")
+    fd = os.open(dest, os.O_WRONLY)
+    try:
+        os.pwrite(fd, data, chunk["offset"])
+    finally:
+        os.close(fd)
+
+
+def read_manifest(snapshot_dir: str) -> dict:
+    with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)) as f:
+        return json.load(f)
+
+
+def restore_snapshot(snapshot_dir: str, dest_dir: str, threads: int) -> dict:
+    """
+    Restore the files of a snapshot written by write_snapshot() into
+    dest_dir, decompressing the chunks in parallel with the given number of
+    threads. Existing files are overwritten.
+
+    Returns the manifest of the snapshot.
+    """
+    manifest = read_manifest(snapshot_dir)
+
+    # create all files first, so chunks can be written in any order
+    for file in manifest["files"]:
+        path = os.path.join(dest_dir, file["path"])
+        if file.get("directory"):
+            os.makedirs(path, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.truncate(file["size"])
+
+    with ThreadPoolExecutor(max_workers=threads,
+                            thread_name_prefix="snapshot") as executor:
+        futures = [executor.submit(_restore_chunk,
+                                   os.path.join(snapshot_dir, SNAPSHOT_CHUNKS_DIR, chunk["name"]),
+                                   os.path.join(dest_dir, file["path"]), chunk)
+                   for file in manifest["files"] for chunk in file.get("chunks", [])]
+        for future in futures:
+            future.result()
+
+    return manifest
+
+
+def clone_recipient_config(scratch_dir: str, plugins: Dict[str, str],
+                           variables: Dict[str, str]) -> str:
+    """
+    Return the my.cnf of the clone recipient instance of a snapshot backup.
+
+    CLONE INSTANCE requires the plugins active in the donor to be active in
+    the recipient, and some settings to be the same. plugins maps the name
+    of the active plugins of the donor to their library and variables has
+    the donor values of k_clone_recipient_variables.
+    """
+    lines = ["[mysqld]",
+             f"datadir={scratch_dir}/datadir",
+             f"socket={scratch_dir}/mysqld.sock",
+             f"pid-file={scratch_dir}/mysqld.pid",
+             f"tmpdir={scratch_dir}",
+             "skip-networking",
+             "mysqlx=OFF",
+             "secure-file-priv=NULL",
+             "plugin-load-add=mysql_clone.so"]
+
+    for name, library in sorted(plugins.items()):
+        if library == "mysql_clone.so":
+            continue
+        if name.startswith("keyring"):
+            # keyrings must be loaded before InnoDB, the keys are in the
+            # keyring of the donor and are sent along with the data
+            lines.append(f"early-plugin-load={library}")
+            lines.append(f"loose-keyring_file_data={scratch_dir}/keyring")
+        else:
+            lines.append(f"plugin-load-add={library}")
+        if name == "group_replication":
+            # the recipient is not a member of anything
+            lines.append("loose-group_replication_start_on_boot=OFF")
+
+    for name in k_clone_recipient_variables:
+        if variables.get(name) is not None:
+            lines.append(f"{name}={variables[name]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def clone_recipient_script(scratch_dir: str,
+                           lifetime: int = k_clone_recipient_lifetime) -> str:
+    """
+    Return the bash script of the clone recipient container of a snapshot
+    backup job. It waits for the backup container to write its my.cnf,
+    starts mysqld and stops it when the backup container is done, or when
+    lifetime seconds have passed, so the Job always completes.
+    """
+    cnf = f"{scratch_dir}/{CLONE_RECIPIENT_CNF}"
+    done = f"{scratch_dir}/{CLONE_RECIPIENT_DONE}"
+    return f"""set -e
+deadline=$((SECONDS + {lifetime}))
+while [ ! -f {cnf} ]; do
+  if [ -f {done} ]; then exit 0; fi
+  if [ $SECONDS -ge $deadline ]; then echo "Timed out waiting for {cnf}"; exit 1; fi
+  sleep 1
+done
+mysqld --defaults-file={cnf} --initialize-insecure
+mysqld --defaults-file={cnf} &
+while [ ! -f {done} ] && [ $SECONDS -lt $deadline ]; do sleep 1; done
+kill $! && wait $! || true
+"""
@@ -279,7 +279,7 @@ class StorageSpec:
                 f"Only one of {', '.join(storage_keys)} must be set in {prefix}")
         elif len(storage_keys) == 0:
             raise ApiSpecError(
-                f"One of {', '.join(storage_keys)} must be set in {prefix}")
+                f"One of {', '.join(self._allowed_types.keys())} must be set in {prefix}")
 
         storage = storage_class()
         storage.parse(storage_spec, prefix + "." + storage_keys[0])
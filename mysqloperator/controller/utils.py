@@ -60,6 +60,7 @@ class EphemeralState:
 
 
 g_ephemeral_pod_state = EphemeralState()
+g_ephemeral_cluster_state = EphemeralState()
 
 
 def isotime() -> str:
@@ -72,6 +73,58 @@ def timestamp(dash: bool = True, four_digit_year: bool = True) -> str:
     return datetime.datetime.utcnow().replace(microsecond=0).strftime(f"{year_str}%m%d{dash_str}%H%M%S")
 
 
+def apply_merge_patch(target, patch):
+    """
+    Apply a JSON merge patch (RFC 7386) to target, returning the result.
+    target is not modified.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for k, v in patch.items():
+        if v is None:
+            result.pop(k, None)
+        else:
+            result[k] = apply_merge_patch(result.get(k), v)
+    return result
+
+
+def replacement_merge_patch(target, value):
+    """
+    Return a JSON merge patch that replaces target with value, instead of
+    merging value into it.
+    """
+    if not isinstance(value, dict):
+        return value
+    patch = {k: None for k in target if k not in value} if isinstance(target, dict) else {}
+    for k, v in value.items():
+        if v is not None:
+            patch[k] = replacement_merge_patch(
+                target.get(k) if isinstance(target, dict) else None, v)
+    return patch
+
+
+def combine_merge_patches(first: dict, second: dict, target=None) -> dict:
+    """
+    Combine two JSON merge patches into one with the same effect as applying
+    first and then second. Deletions (None) are kept.
+
+    A merge patch can't replace an object, only merge into it, so when first
+    deletes a key that second sets to an object, the combined patch deletes
+    the keys target (the object the patch will be applied to) has for it.
+    """
+    target = target if isinstance(target, dict) else {}
+    result = dict(first)
+    for k, v in second.items():
+        if isinstance(v, dict) and isinstance(result.get(k), dict):
+            result[k] = combine_merge_patches(result[k], v, target.get(k))
+        elif isinstance(v, dict) and k in result and result[k] is None:
+            result[k] = replacement_merge_patch(target.get(k), v)
+        else:
+            result[k] = v
+    return result
+
+
 def merge_patch_object(base: dict, patch: dict, prefix: str = "", key: str = "") -> None:
     assert not key, "not implemented"  # TODO support key
 
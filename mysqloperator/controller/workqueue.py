@@ -0,0 +1,117 @@
+# Copyright (c) 2023, Oracle and/or its affiliates.
+#
+# Licensed under the Universal Permissive License v 1.0 as shown at https://oss.oracle.com/licenses/upl/
+#
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import heapq
+import itertools
+import threading
+import time
+
+
+class WorkQueue:
+    """
+    Deduplicating work queue with delayed requeue, processed by a fixed
+    number of worker threads.
+
+    Work is identified by a key and only the latest item added for a key is
+    kept, so a burst of events for the same object is handled once. A key is
+    never processed by two workers at the same time; items added while it
+    is being processed are handled right after.
+
+    The handler returns None when done or a delay in seconds after which the
+    key should be processed again. Keys waiting for their retry don't hold
+    a thread and new items for them just replace the pending one, keeping
+    the retry time.
+    """
+
+    def __init__(self, name: str, handler: Callable[[str, Any], Optional[float]],
+                 workers: int = 1):
+        self.name = name
+        self.handler = handler
+        self.num_workers = workers
+        self.threads: List[threading.Thread] = []
+
+        self.cond = threading.Condition()
+        self.stopped = False
+        # key -> latest item not yet processed
+        self.items: Dict[str, Any] = {}
+        # key -> time it's due, for keys in the heap
+        self.due: Dict[str, float] = {}
+        # (due, seq, key), may contain stale entries not matching self.due
+        self.heap: List[Tuple[float, int, str]] = []
+        self.processing: Set[str] = set()
+        self.seq = itertools.count()
+
+    def __len__(self) -> int:
+        with self.cond:
+            return len(self.items)
+
+    def _schedule(self, key: str, delay: float) -> None:
+        # called with the lock held
+        due = time.monotonic() + delay
+        self.due[key] = due
+        heapq.heappush(self.heap, (due, next(self.seq), key))
+        self.cond.notify()
+
+    def add(self, key: str, item: Any, delay: float = 0) -> None:
+        with self.cond:
+            self.items[key] = item
+            if key in self.processing or key in self.due:
+                return
+            self._schedule(key, delay)
+
+    def _next(self) -> Optional[Tuple[str, Any]]:
+        with self.cond:
+            while not self.stopped:
+                now = time.monotonic()
+                while self.heap:
+                    due, _, key = self.heap[0]
+                    if self.due.get(key) != due:
+                        heapq.heappop(self.heap)
+                        continue
+                    if due > now:
+                        break
+                    heapq.heappop(self.heap)
+                    del self.due[key]
+                    self.processing.add(key)
+                    return key, self.items.pop(key)
+
+                self.cond.wait(self.heap[0][0] - now if self.heap else None)
+        return None
+
+    def _done(self, key: str, item: Any, retry: Optional[float]) -> None:
+        with self.cond:
+            self.processing.discard(key)
+            if retry is not None:
+                # retry with the newest item, if one arrived meanwhile
+                self.items.setdefault(key, item)
+                self._schedule(key, retry)
+            elif key in self.items:
+                self._schedule(key, 0)
+
+    def worker(self) -> None:
+        while True:
+            work = self._next()
+            if not work:
+                break
+            key, item = work
+            try:
+                retry = self.handler(key, item)
+            except Exception as e:
+                print(f"{self.name}: unhandled error processing {key}: {e}")
+                retry = None
+            self._done(key, item, retry)
+
+    def start(self) -> None:
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self.worker, daemon=True,
+                                 name=f"{self.name}-{i}")
+            t.start()
+            self.threads.append(t)
+
+    def stop(self) -> None:
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
@@ -13,6 +13,7 @@ from typing import cast
 import mysqlsh
 from .controller import utils, k8sobject
 from .controller.innodbcluster.cluster_api import MySQLPod
+from .controller.innodbcluster import initdb
 from .controller.kubeutils import k8s_cluster_domain
 
 k8sobject.g_component = "initconf"
@@ -75,6 +76,7 @@ def main(argv):
     parser.add_argument('--pod-name', type = str, nargs=1, default=None, help = "Pod Name")
     parser.add_argument('--pod-namespace', type = str, nargs=1, default=None, help = "Pod Namespace")
     parser.add_argument('--datadir', type = str, default = "/var/lib/mysql", help = "Path do data directory")
+    parser.add_argument('--restore-snapshot', type = str, default = None, help = "Path of a snapshot to restore into the data directory")
     args = parser.parse_args(argv)
 
     datadir = args.datadir
@@ -85,6 +87,16 @@ def main(argv):
                         datefmt="%Y-%m-%dT%H:%M:%S")
     logger = logging.getLogger("initmysql")
 
+    if args.restore_snapshot:
+        try:
+            initdb.restore_snapshot(args.restore_snapshot, datadir, logger)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            logger.critical(f"Unhandled exception while restoring snapshot: {e}")
+            return 1
+        return 0
+
     name = args.pod_name[0] # nargs returns a list
     namespace = args.pod_namespace[0] # nargs returns a list
 
@@ -110,6 +122,6 @@ def main(argv):
         # TODO post event to the Pod and the Cluster object if this is the seed
         return 1
 
-    # TODO support for restoring from clone snapshot or MEB goes in here
+    # TODO support for restoring from MEB goes in here
 
     return 0
@@ -125,6 +125,15 @@ def configure_for_innodb_cluster(dba, logger):
 
 
 def wipe_old_innodb_cluster(session, logger):
+    # this is about the data we started from, not a change of the new cluster
+    session.run_sql("SET sql_log_bin=0")
+    try:
+        _wipe_old_innodb_cluster(session, logger)
+    finally:
+        session.run_sql("SET sql_log_bin=1")
+
+
+def _wipe_old_innodb_cluster(session, logger):
     # drop innodb cluster accounts
     try:
         rows = session.run_sql(
@@ -213,6 +222,21 @@ def populate_with_dump(datadir: str, session: 'ClassicSession', cluster: InnoDBC
     return session
 
 
+def populate_with_snapshot(datadir: str, session: 'ClassicSession', cluster: InnoDBCluster, pod: MySQLPod, logger: Logger):
+    """
+    The datadir was restored from a snapshot before mysqld started and what
+    belonged to the cluster the snapshot was taken from was wiped by
+    initialize(), before configuring the instance.
+    root credentials are supposed to match the ones in the snapshot.
+    """
+    logger.info(f"Initialized mysql from a snapshot")
+
+    # create local accounts again in case the source didn't have them
+    create_local_accounts(session, logger)
+
+    return session
+
+
 def populate_db(datadir, session, cluster, pod, logger: Logger) -> 'ClassicSession':
     """
     Populate DB from source specified in the cluster spec.
@@ -227,6 +251,9 @@ def populate_db(datadir, session, cluster, pod, logger: Logger) -> 'ClassicSessi
         elif cluster.parsed_spec.initDB.dump:
             logger.info("Populate with dump")
             return populate_with_dump(datadir, session, cluster, cluster.parsed_spec.initDB.dump, pod, logger)
+        elif cluster.parsed_spec.initDB.snapshot:
+            logger.info("Populate with snapshot")
+            return populate_with_snapshot(datadir, session, cluster, pod, logger)
         else:
             logger.warning(
                 "spec.initDB ignored because no supported initialization parameters found")
@@ -298,6 +325,9 @@ def create_admin_account(session, cluster, logger):
     # which would cause diverging GTID sets
     session.run_sql(
         "CREATE USER IF NOT EXISTS ?@? IDENTIFIED BY ?", [user, host, password])
+    # the account may come from a restored snapshot, with the password of
+    # the cluster the snapshot was taken from
+    session.run_sql("ALTER USER ?@? IDENTIFIED BY ?", [user, host, password])
     session.run_sql("GRANT ALL ON *.* TO ?@? WITH GRANT OPTION", [user, host])
     session.run_sql(
         "GRANT PROXY ON ''@'' TO ?@? WITH GRANT OPTION", [user, host])
@@ -332,6 +362,11 @@ def connect(user: str, password: str, logger: Logger, timeout: Optional[int] = 6
 
 
 def initialize(session, datadir: str, pod: MySQLPod, cluster: InnoDBCluster, logger: Logger) -> None:
+    if initdb.is_snapshot_seed(pod, cluster):
+        # the recovery accounts and metadata of the source must be gone
+        # before configure_instance() looks at the instance
+        wipe_old_innodb_cluster(session, logger)
+
     session.run_sql("SET sql_log_bin=0")
     create_root_account(session, pod, cluster, logger)
     create_admin_account(session, cluster, logger)
@@ -413,7 +448,8 @@ def bootstrap(pod: MySQLPod, datadir: str, logger: Logger) -> int:
     session = connect("localroot", "", logger, timeout=None)
 
     mdver = metadata_schema_version(session, logger)
-    if mdver:
+    # a restored snapshot has the metadata of the cluster it was taken from
+    if mdver and not initdb.is_snapshot_seed(pod, pod.get_cluster()):
         logger.info(
             f"InnoDB Cluster metadata (version={mdver}) found, skipping configuration...")
         pod.update_member_readiness_gate("configured", True)
@@ -0,0 +1,91 @@
+import json
+import logging
+from .controller.backup import backup_stats
+from .controller.backup.backup_stats import format_size, get_dump_stats, dump_stats_info
+
+logger = logging.getLogger("test")
+
+
+def write(path, size: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+
+
+def make_dump(d, done: bool = True) -> None:
+    write(d / "@.json", 100)
+    write(d / "@.sql", 50)
+    write(d / "sakila.json", 10)
+    # chunk files, sized from @.done.json when it's there
+    write(d / "sakila@actor@@0.tsv.zst", 1000)
+    write(d / "sakila@film@@0.tsv.zst", 2000)
+    if done:
+        (d / backup_stats.DUMP_DONE_FILE).write_text(json.dumps({
+            "chunkFileBytes": {"sakila@actor@@0.tsv.zst": 1000,
+                               "sakila@film@@0.tsv.zst": 2000},
+            "tableDataBytes": {"sakila": {"actor": 7000, "film": 13000},
+                               "world": {"city": 4000}},
+            "dataBytes": 24000
+        }))
+
+
+def test_format_size() -> None:
+    assert format_size(0) == "0.00"
+    assert format_size(1000) == "1000.00"
+    assert format_size(1023) == "1023.00"
+    assert format_size(1024) == "1.00K"
+    assert format_size(1023 * 1024) == "1023.00K"
+    assert format_size(1.5 * 1024 * 1024) == "1.50M"
+    assert format_size(1000 * 1024**3) == "1000.00G"
+    assert format_size(2 * 1024**4) == "2.00T"
+
+
+def test_get_dump_stats(tmp_path) -> None:
+    make_dump(tmp_path)
+    done_size = (tmp_path / backup_stats.DUMP_DONE_FILE).stat().st_size
+
+    stats = get_dump_stats(str(tmp_path), logger)
+    assert stats == {
+        "size": 100 + 50 + 10 + 1000 + 2000 + done_size,
+        "fileCount": 6,
+        "dataSize": 24000,
+        "schemaSizes": {"sakila": 20000, "world": 4000}
+    }
+
+
+def test_get_dump_stats_uses_done_file(tmp_path) -> None:
+    make_dump(tmp_path)
+    # chunk files aren't stat'ed, their size comes from the done file
+    write(tmp_path / "sakila@actor@@0.tsv.zst", 1)
+
+    stats = get_dump_stats(str(tmp_path), logger)
+    assert stats["size"] - (tmp_path / backup_stats.DUMP_DONE_FILE).stat().st_size == 3160
+
+
+def test_get_dump_stats_scan(tmp_path) -> None:
+    make_dump(tmp_path, done=False)
+    write(tmp_path / "sub" / "file", 5)
+
+    assert get_dump_stats(str(tmp_path), logger) == {"size": 3165, "fileCount": 6}
+
+    # unreadable done file
+    (tmp_path / backup_stats.DUMP_DONE_FILE).write_text("{")
+    assert get_dump_stats(str(tmp_path), logger) == {"size": 3166, "fileCount": 7}
+
+
+def test_dump_stats_info() -> None:
+    stats = {"size": 10 * 1024**2, "fileCount": 6,
+             "dataSize": 40 * 1024**2, "schemaSizes": {"sakila": 1000, "world": 2048}}
+    assert dump_stats_info(stats, 4) == {
+        "dataSize": "40.00M",
+        "schemaSizes": {"sakila": "1000.00", "world": "2.00K"},
+        "throughput": "10.00M/s",
+        "writeThroughput": "2.50M/s"
+    }
+
+    # no done file: only the written size is known
+    assert dump_stats_info({"size": 3 * 1024, "fileCount": 2}, 2) == {
+        "throughput": "1.50K/s",
+        "writeThroughput": "1.50K/s"
+    }
+
+    assert dump_stats_info({"size": 3 * 1024, "fileCount": 2}, 0) == {}
@@ -0,0 +1,94 @@
+from .controller import binlog_archive
+from .controller.gtid import GTIDSet
+
+A = "3e11fa47-71ca-11e1-9e33-c80aa9429562"
+B = "4d8f6e3b-71ca-11e1-9e33-c80aa9429562"
+
+
+def binlog(name: str, previous: str, gtids: str) -> binlog_archive.Binlog:
+    return (name, GTIDSet.parse(previous), GTIDSet.parse(gtids))
+
+
+def archive(index: dict, binlogs: list) -> None:
+    for name, _, gtids in binlogs:
+        index["binlogs"].append({"file": f"{A}-{name}", "gtidSet": str(gtids)})
+
+
+def test_index(tmp_path) -> None:
+    assert binlog_archive.read_index(str(tmp_path)) == {"binlogs": []}
+
+    index = {"startGtidSet": f"{A}:1-10",
+             "binlogs": [{"file": "x", "gtidSet": f"{A}:11-20"},
+                         {"file": "y", "gtidSet": f"{A}:21-30,{B}:1-5"}]}
+    binlog_archive.write_index(str(tmp_path), index)
+    assert binlog_archive.read_index(str(tmp_path)) == index
+    assert not (tmp_path / (binlog_archive.BINLOG_ARCHIVE_INDEX + ".tmp")).exists()
+
+    assert str(binlog_archive.archived_gtids(index)) == f"{A}:11-30,{B}:1-5"
+    assert str(binlog_archive.start_gtids(index)) == f"{A}:1-10"
+    assert not binlog_archive.start_gtids({"binlogs": []})
+
+
+def test_select_first_run() -> None:
+    index = {"binlogs": []}
+    binlogs = [binlog("binlog.000003", f"{A}:1-10", f"{A}:11-20"),
+               binlog("binlog.000004", f"{A}:1-20", ""),
+               binlog("binlog.000005", f"{A}:1-20", f"{A}:21-25")]
+
+    to_archive, gap = binlog_archive.select_binlogs(index, binlogs, A)
+    # binlogs without transactions are skipped
+    assert [b[0] for b in to_archive] == ["binlog.000003", "binlog.000005"]
+    assert not gap
+    # the transactions before the first binlog come from a full dump
+    assert index["startGtidSet"] == f"{A}:1-10"
+    assert "gaps" not in index
+
+
+def test_select_already_archived() -> None:
+    index = {"binlogs": []}
+    first = [binlog("binlog.000003", f"{A}:1-10", f"{A}:11-20")]
+    binlog_archive.select_binlogs(index, first, A)
+    archive(index, first)
+
+    binlogs = first + [binlog("binlog.000004", f"{A}:1-20", f"{A}:21-30")]
+    to_archive, gap = binlog_archive.select_binlogs(index, binlogs, A)
+    assert [b[0] for b in to_archive] == ["binlog.000004"]
+    assert not gap
+    assert index["startGtidSet"] == f"{A}:1-10"
+
+    archive(index, to_archive)
+    to_archive, gap = binlog_archive.select_binlogs(index, binlogs, A)
+    assert not to_archive
+    assert not gap
+
+
+def test_select_other_source() -> None:
+    # another member has the same transactions in differently named binlogs
+    index = {"binlogs": []}
+    first = [binlog("binlog.000003", f"{A}:1-10", f"{A}:11-20")]
+    binlog_archive.select_binlogs(index, first, A)
+    archive(index, first)
+
+    binlogs = [binlog("binlog.000001", f"{A}:1-5", f"{A}:6-20"),
+               binlog("binlog.000002", f"{A}:1-20", f"{A}:21-30")]
+    to_archive, gap = binlog_archive.select_binlogs(index, binlogs, B)
+    # 6-10 of the first one are only in the full dump, so it's archived too
+    assert [b[0] for b in to_archive] == ["binlog.000001", "binlog.000002"]
+    assert not gap
+
+
+def test_select_gap() -> None:
+    index = {"binlogs": []}
+    first = [binlog("binlog.000003", f"{A}:1-10", f"{A}:11-20")]
+    binlog_archive.select_binlogs(index, first, A)
+    archive(index, first)
+
+    # 21-30 were purged before the next run
+    binlogs = [binlog("binlog.000005", f"{A}:1-30", f"{A}:31-40")]
+    to_archive, gap = binlog_archive.select_binlogs(index, binlogs, A)
+    assert [b[0] for b in to_archive] == ["binlog.000005"]
+    assert str(gap) == f"{A}:21-30"
+    assert index["gaps"] == [{"before": f"{A}-binlog.000005",
+                              "gtidSet": f"{A}:21-30"}]
+    # the start of the archive stays the same
+    assert index["startGtidSet"] == f"{A}:1-10"
@@ -0,0 +1,114 @@
+import datetime
+import pytest
+from .controller.innodbcluster import cluster_api
+from .controller.innodbcluster.cluster_api import InnoDBCluster
+
+
+def make_cluster(status: dict = None) -> InnoDBCluster:
+    body = {"metadata": {"name": "mycluster", "namespace": "ns", "uid": "1", "generation": 1},
+            "spec": {"instances": 3, "secretName": "mypwds"}}
+    if status is not None:
+        body["status"] = status
+    return InnoDBCluster(body)
+
+
+@pytest.fixture
+def patches(monkeypatch) -> list:
+    sent = []
+
+    def patch_status(ns: str, name: str, patch: dict) -> dict:
+        sent.append(patch)
+        return {"metadata": {"name": name, "namespace": ns}, "status": patch["status"]}
+
+    monkeypatch.setattr(InnoDBCluster, "_patch_status", staticmethod(patch_status))
+    return sent
+
+
+def test_status_updates(patches) -> None:
+    cluster = make_cluster({"cluster": {"status": "PENDING"}})
+    cluster.set_cluster_status({"status": "ONLINE", "onlineInstances": 1})
+    cluster.set_create_time(datetime.datetime(2023, 1, 1))
+    assert len(patches) == 2
+
+
+def test_batch_status_updates(patches) -> None:
+    cluster = make_cluster({"cluster": {"status": "PENDING", "lastProbeTime": "x"}})
+    with cluster.batch_status_updates():
+        cluster.set_create_time(datetime.datetime(2023, 1, 1))
+        cluster.set_cluster_status({"status": "ONLINE", "onlineInstances": 1})
+        # reads see the pending values
+        assert cluster.get_cluster_status("status") == "ONLINE"
+        cluster.set_cluster_status({"status": "ONLINE", "onlineInstances": 2})
+        assert patches == []
+
+    assert patches == [{"status": {
+        "createTime": "2023-01-01T00:00:00Z",
+        "cluster": {"status": "ONLINE", "onlineInstances": 2, "lastProbeTime": None}
+    }}]
+    assert cluster.get_create_time() == datetime.datetime(2023, 1, 1)
+
+
+def test_batch_status_updates_nested(patches) -> None:
+    cluster = make_cluster()
+    with cluster.batch_status_updates():
+        cluster.set_status({"a": 1})
+        with cluster.batch_status_updates():
+            cluster.set_status({"b": 2})
+        assert patches == []
+    assert patches == [{"status": {"a": 1, "b": 2}}]
+
+
+def test_batch_status_updates_error(patches) -> None:
+    cluster = make_cluster()
+    with pytest.raises(RuntimeError):
+        with cluster.batch_status_updates():
+            cluster.set_status({"a": 1})
+            raise RuntimeError("failed")
+    # what was set before the error is still sent
+    assert patches == [{"status": {"a": 1}}]
+
+
+def test_parsed_spec_cache(monkeypatch) -> None:
+    cache = cluster_api.ParsedSpecCache(cluster_api.k_parsed_spec_cache_size)
+    monkeypatch.setattr(cluster_api, "g_parsed_specs", cache)
+
+    spec = make_cluster().parsed_spec
+    assert spec.instances == 3
+    assert cache.get(("1", 1)).instances == 3
+
+    # a new generation is parsed again
+    body = {"metadata": {"name": "mycluster", "namespace": "ns", "uid": "1", "generation": 2},
+            "spec": {"instances": 5, "secretName": "mypwds"}}
+    assert InnoDBCluster(body).parsed_spec.instances == 5
+    assert make_cluster().parsed_spec.instances == 3
+
+    # changes to nested objects don't leak into the cache
+    body = {"metadata": {"name": "mycluster", "namespace": "ns", "uid": "2", "generation": 1},
+            "spec": {"instances": 3, "secretName": "mypwds",
+                     "podSpec": {"terminationGracePeriodSeconds": 60},
+                     "router": {"instances": 2, "podSpec": {"nodeName": "a"}}}}
+    spec = InnoDBCluster(body).parsed_spec
+    spec.podSpec["terminationGracePeriodSeconds"] = 0
+    spec.router.podSpec["nodeName"] = "b"
+    spec.router.instances = 0
+    spec.backupSchedules.append("x")
+    spec = InnoDBCluster(body).parsed_spec
+    assert spec.podSpec == {"terminationGracePeriodSeconds": 60}
+    assert spec.router.podSpec == {"nodeName": "a"}
+    assert spec.router.instances == 2
+    assert spec.backupSchedules == []
+
+
+def test_parsed_spec_cache_eviction() -> None:
+    size = cluster_api.k_parsed_spec_cache_size
+    assert size == 256
+    cache = cluster_api.ParsedSpecCache(size)
+    for i in range(size):
+        cache.put((str(i), 1), make_cluster().parsed_spec)
+    # the oldest entry is evicted unless it was used
+    assert cache.get(("0", 1))
+    cache.put(("new", 1), make_cluster().parsed_spec)
+    assert len(cache.entries) == size
+    assert cache.get(("0", 1))
+    assert cache.get(("1", 1)) is None
+    assert cache.get(("2", 1))
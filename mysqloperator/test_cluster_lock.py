@@ -0,0 +1,183 @@
+import threading
+import time
+import kopf
+import pytest
+from .controller.innodbcluster import cluster_controller
+from .controller.innodbcluster.cluster_controller import ClusterLock, ClusterLockManager, ClusterMutex
+
+
+class Cluster:
+    def __init__(self, name: str = "mycluster"):
+        self.namespace = "ns"
+        self.name = name
+
+
+def wait_for(cond, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class Holder(threading.Thread):
+    """Takes the lock, records when it got it and holds it until released"""
+
+    def __init__(self, lock: ClusterLock, name: str, shared: bool, granted: list,
+                 timeout: float = 5):
+        super().__init__(daemon=True)
+        self.lock = lock
+        self.owner = name
+        self.shared = shared
+        self.granted = granted
+        self.timeout = timeout
+        self.ticket = None
+        self.release = threading.Event()
+
+    def run(self) -> None:
+        self.ticket = self.lock.acquire(self.owner, "test", self.shared, self.timeout)
+        if self.ticket is None:
+            self.granted.append(f"{self.owner} timeout")
+            return
+        self.granted.append(self.owner)
+        self.release.wait(5)
+        self.lock.release(self.ticket)
+
+
+def start(lock: ClusterLock, name: str, shared: bool, granted: list,
+          timeout: float = 5) -> Holder:
+    waiting = len(lock.waiters) + len(lock.holders)
+    h = Holder(lock, name, shared, granted, timeout)
+    h.start()
+    # wait until it's queued, so arrival order is known
+    wait_for(lambda: len(lock.waiters) + len(lock.holders) > waiting or h.ticket is not None
+             or not h.is_alive())
+    return h
+
+
+def test_shared() -> None:
+    lock = ClusterLock()
+    granted = []
+    r1 = start(lock, "r1", True, granted)
+    r2 = start(lock, "r2", True, granted)
+    wait_for(lambda: len(granted) == 2)
+    assert "r1(shared" in lock.describe_holders()
+    r1.release.set()
+    r2.release.set()
+    r1.join()
+    r2.join()
+    assert lock.holders == {} and not lock.waiters
+
+
+def test_fifo() -> None:
+    lock = ClusterLock()
+    granted = []
+    r1 = start(lock, "r1", True, granted)
+    wait_for(lambda: granted == ["r1"])
+    # the writer waits for r1, the reader arriving after it waits too
+    w1 = start(lock, "w1", False, granted)
+    r2 = start(lock, "r2", True, granted)
+    w2 = start(lock, "w2", False, granted)
+    r3 = start(lock, "r3", True, granted)
+    r4 = start(lock, "r4", True, granted)
+    time.sleep(0.1)
+    assert granted == ["r1"]
+
+    r1.release.set()
+    wait_for(lambda: len(granted) == 2)
+    time.sleep(0.1)
+    assert granted == ["r1", "w1"]
+
+    w1.release.set()
+    wait_for(lambda: len(granted) == 3)
+    time.sleep(0.1)
+    assert granted == ["r1", "w1", "r2"]
+
+    r2.release.set()
+    wait_for(lambda: len(granted) == 4)
+    time.sleep(0.1)
+    assert granted == ["r1", "w1", "r2", "w2"]
+
+    # readers queued together are let in together
+    w2.release.set()
+    wait_for(lambda: len(granted) == 6)
+    assert sorted(granted[4:]) == ["r3", "r4"]
+    r3.release.set()
+    r4.release.set()
+    for h in (r1, w1, r2, w2, r3, r4):
+        h.join()
+    assert lock.holders == {} and not lock.waiters
+
+
+def test_timeout() -> None:
+    lock = ClusterLock()
+    granted = []
+    w1 = start(lock, "w1", False, granted)
+    wait_for(lambda: granted == ["w1"])
+
+    # a writer that gives up doesn't keep the readers behind it waiting
+    r1 = start(lock, "r1", True, granted, timeout=5)
+    w2 = start(lock, "w2", False, granted, timeout=0.2)
+    r2 = start(lock, "r2", True, granted, timeout=5)
+    w2.join()
+    assert granted == ["w1", "w2 timeout"]
+    assert len(lock.waiters) == 2
+
+    w1.release.set()
+    wait_for(lambda: len(granted) == 4)
+    assert sorted(granted[2:]) == ["r1", "r2"]
+    r1.release.set()
+    r2.release.set()
+    for h in (w1, r1, r2):
+        h.join()
+    assert lock.holders == {} and not lock.waiters
+
+    start_time = time.monotonic()
+    assert lock.acquire("w3", "test", False, 1) is not None
+    assert lock.acquire("r3", "test", True, 0.1) is None
+    assert 0.1 <= time.monotonic() - start_time < 1
+
+
+def test_lock_manager() -> None:
+    manager = ClusterLockManager()
+    a = manager.get(Cluster("a"))
+    assert manager.get(Cluster("a")) is a
+    b = manager.get(Cluster("b"))
+    assert b is not a
+
+    manager.put(Cluster("a"))
+    assert manager.locks["ns/a"] == (a, 1)
+    manager.put(Cluster("a"))
+    manager.put(Cluster("b"))
+    assert manager.locks == {}
+
+    # a new lock once nobody uses the old one
+    assert manager.get(Cluster("a")) is not a
+
+
+def test_cluster_mutex(monkeypatch) -> None:
+    manager = ClusterLockManager()
+    monkeypatch.setattr(cluster_controller, "g_cluster_locks", manager)
+    cluster = Cluster()
+
+    with ClusterMutex(cluster, context="first"):
+        with pytest.raises(kopf.TemporaryError) as e:
+            with ClusterMutex(cluster, context="second", timeout=0.1):
+                pass
+        assert "first" in str(e.value)
+        assert manager.locks["ns/mycluster"][1] == 1
+
+        with pytest.raises(kopf.TemporaryError):
+            with ClusterMutex(cluster, shared=True, timeout=0.1):
+                pass
+    assert manager.locks == {}
+
+    # released on errors
+    with pytest.raises(RuntimeError):
+        with ClusterMutex(cluster):
+            raise RuntimeError("failed")
+    assert manager.locks == {}
+
+    with ClusterMutex(cluster, shared=True):
+        with ClusterMutex(cluster, shared=True, timeout=0.1):
+            assert manager.locks["ns/mycluster"][1] == 2
+    assert manager.locks == {}
@@ -0,0 +1,280 @@
+import logging
+import kopf
+import pytest
+from .controller import diagnose
+from .controller.diagnose import GroupPartition, InstanceDiagStatus, InstanceStatus
+
+logger = logging.getLogger("test")
+
+
+class Pod:
+    def __init__(self, name: str):
+        self.name = name
+        self.endpoint = f"{name}:3306"
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+def instance(pod: Pod, in_quorum: bool, peers: dict, primary: bool = False) -> InstanceStatus:
+    status = InstanceStatus()
+    status.pod = pod
+    status.status = InstanceDiagStatus.ONLINE
+    status.in_quorum = in_quorum
+    status.is_primary = primary
+    status.view_id = "1:1"
+    status.peers = {f"{k}:3306": v for k, v in peers.items()}
+    return status
+
+
+def views(pods: dict, *groups) -> dict:
+    """
+    Group views from (members, in_quorum, primary), where every member sees
+    the other members of its group ONLINE and everyone else UNREACHABLE
+    """
+    info = {}
+    for members, in_quorum, primary in groups:
+        for name in members:
+            peers = {other: "ONLINE" if other in members else "UNREACHABLE"
+                     for other in pods}
+            info[pods[name].endpoint] = instance(
+                pods[name], in_quorum, peers, name == primary)
+    return info
+
+
+def names(partitions: list) -> list:
+    return [sorted(ep.split(":")[0] for ep in p.endpoints) for p in partitions]
+
+
+@pytest.fixture
+def pods() -> dict:
+    return {name: Pod(name) for name in "abcde"}
+
+
+def test_single_partition(pods) -> None:
+    info = views(pods, ("abcde", True, "a"))
+    active, blocked = diagnose.find_group_partitions(info, set(pods.values()), logger)
+    assert names(active) == [["a", "b", "c", "d", "e"]]
+    assert blocked == []
+    assert [p.pod for p in active[0]] == [pods[n] for n in "abcde"]
+
+
+def test_blocked_minority(pods) -> None:
+    info = views(pods, ("abc", True, "a"), ("de", False, None))
+    active, blocked = diagnose.find_group_partitions(info, set(pods.values()), logger)
+    assert names(active) == [["a", "b", "c"]]
+    assert names(blocked) == [["d", "e"]]
+    # blocked partitions list the pods
+    assert list(blocked[0]) == [pods["d"], pods["e"]]
+    assert "d:3306" in blocked[0] and "a:3306" not in blocked[0]
+
+
+def test_split_brain(pods) -> None:
+    info = views(pods, ("ab", True, "a"), ("cd", True, "c"), ("e", False, None))
+    active, blocked = diagnose.find_group_partitions(info, set(pods.values()), logger)
+    assert sorted(names(active)) == [["a", "b"], ["c", "d"]]
+    assert names(blocked) == [["e"]]
+
+    # largest blocked partition first
+    info = views(pods, ("a", False, None), ("bc", False, None), ("de", True, "d"))
+    active, blocked = diagnose.find_group_partitions(info, set(pods.values()), logger)
+    assert names(active) == [["d", "e"]]
+    assert names(blocked) == [["b", "c"], ["a"]]
+
+
+def test_overlapping_views(pods) -> None:
+    # views without quorum that overlap are merged
+    info = views(pods, ("abc", True, "a"))
+    info[pods["d"].endpoint] = instance(pods["d"], False, {"d": "ONLINE", "e": "ONLINE"})
+    info[pods["e"].endpoint] = instance(pods["e"], False, {"e": "ONLINE"})
+    active, blocked = diagnose.find_group_partitions(info, set(pods.values()), logger)
+    assert names(blocked) == [["d", "e"]]
+
+    # a view with quorum with a member that isn't ONLINE itself
+    info = views(pods, ("abc", True, "a"))
+    info[pods["a"].endpoint].peers["d:3306"] = "ONLINE"
+    with pytest.raises(kopf.TemporaryError):
+        diagnose.find_group_partitions(info, set(pods.values()), logger)
+
+    # a view without quorum with a member of the partition with quorum
+    info = views(pods, ("abc", True, "a"))
+    info[pods["d"].endpoint] = instance(pods["d"], False, {"c": "ONLINE", "d": "ONLINE"})
+    with pytest.raises(kopf.TemporaryError):
+        diagnose.find_group_partitions(info, set(pods.values()), logger)
+
+
+def test_no_primary(pods) -> None:
+    info = views(pods, ("abc", True, None))
+    with pytest.raises(kopf.TemporaryError):
+        diagnose.find_group_partitions(info, set(pods.values()), logger)
+
+
+def test_stable_id(pods) -> None:
+    groups = [("ab", True, "a"), ("cd", True, "c"), ("e", False, None)]
+    info = views(pods, *groups)
+    active, blocked = diagnose.find_group_partitions(info, set(pods.values()), logger)
+
+    # same partitions in another order give the same IDs
+    info2 = dict(reversed(list(views(pods, *reversed(groups)).items())))
+    active2, blocked2 = diagnose.find_group_partitions(info2, set(pods.values()), logger)
+    assert [p.id for p in active] == [p.id for p in active2]
+    assert [p.id for p in blocked] == [p.id for p in blocked2]
+
+    assert len({p.id for p in active + blocked}) == 3
+    assert GroupPartition(frozenset(["a:3306", "b:3306"]), []).id == \
+        GroupPartition(frozenset(["b:3306", "a:3306"]), []).id
+
+
+def test_group_view() -> None:
+    members = [("1", "PRIMARY", "ONLINE", "1:5", "a:3306", "8.0.33"),
+               ("2", "SECONDARY", "RECOVERING", "1:5", "b:3306", "8.0.33"),
+               ("3", "SECONDARY", "UNREACHABLE", "1:5", "c:3306", "8.0.33")]
+    view_id, partition_id = diagnose.group_view(members)
+    assert view_id == "1:5"
+    assert partition_id == GroupPartition(frozenset(["a:3306", "b:3306"]), []).id
+
+    # a member becoming UNREACHABLE changes the partition, not the view
+    members[1] = ("2", "SECONDARY", "UNREACHABLE", "1:5", "b:3306", "8.0.33")
+    assert diagnose.group_view(members) == (
+        "1:5", GroupPartition(frozenset(["a:3306"]), []).id)
+
+    assert diagnose.group_view([]) == (None, None)
+
+
+class Cluster:
+    namespace = "ns"
+    name = "mycluster"
+    deleting = False
+
+    def __init__(self, pods: list):
+        self.pods = pods
+
+    def get_pods(self) -> list:
+        return self.pods
+
+
+class ProbedPod(Pod):
+    def __init__(self, name: str, restarts: int = 0):
+        super().__init__(name)
+        self.metadata = type("Metadata", (), {"uid": name})
+        self.phase = "Running"
+        self.deleting = False
+        self.restarts = restarts
+
+    def check_containers_ready(self) -> bool:
+        return True
+
+    def get_container_restarts(self, container: str) -> int:
+        return self.restarts
+
+
+def online_status(pods: list, primary: int = 0) -> diagnose.ClusterStatus:
+    status = diagnose.ClusterStatus()
+    status.status = diagnose.ClusterDiagStatus.ONLINE
+    status.primary = pods[primary]
+    status.online_members = list(pods)
+    status.view_id = "1:5"
+    status.partition_id = GroupPartition(frozenset(p.endpoint for p in pods), []).id
+    return status
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list:
+    now = [1000.0]
+    monkeypatch.setattr(diagnose.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_cache_put_get(clock) -> None:
+    cache = diagnose.ClusterStatusCache(15)
+    pods = [ProbedPod(n) for n in "abc"]
+    cluster = Cluster(pods)
+    cache.put(cluster, pods, online_status(pods))
+
+    # a hit refers to the current pod objects
+    current = [ProbedPod(n) for n in "abc"]
+    cached = cache.get(cluster, current)
+    assert cached.cached
+    assert cached.primary is current[0]
+    assert [p is c for p, c in zip(cached.online_members, current)] == [True] * 3
+    assert cached.view_id == "1:5"
+
+    # pod state changes
+    assert cache.get(cluster, [ProbedPod("a"), ProbedPod("b"), ProbedPod("c", 1)]) is None
+    assert cache.get(cluster, current) is None
+
+    # TTL
+    cache.put(cluster, pods, online_status(pods))
+    clock[0] += 16
+    assert cache.get(cluster, pods) is None
+
+
+def test_cache_put_uncacheable(clock) -> None:
+    cache = diagnose.ClusterStatusCache(15)
+    pods = [ProbedPod(n) for n in "abc"]
+    cluster = Cluster(pods)
+    cache.put(cluster, pods, online_status(pods))
+
+    # states that will be acted upon replace what's cached
+    status = online_status(pods)
+    status.status = diagnose.ClusterDiagStatus.ONLINE_UNCERTAIN
+    cache.put(cluster, pods, status)
+    assert cache.get(cluster, pods) is None
+
+    status = online_status(pods)
+    status.partition_id = None
+    cache.put(cluster, pods, status)
+    assert cache.get(cluster, pods) is None
+
+
+def test_cache_invalidate(clock) -> None:
+    cache = diagnose.ClusterStatusCache(15)
+    pods = [ProbedPod(n) for n in "abc"]
+    cluster = Cluster(pods)
+    status = online_status(pods)
+
+    cache.put(cluster, pods, status)
+    cache.invalidate(cluster, status.view_id, status.partition_id)
+    assert cache.get(cluster, pods)
+
+    cache.invalidate(cluster, status.view_id, "other")
+    assert cache.get(cluster, pods) is None
+
+    cache.put(cluster, pods, status)
+    cache.invalidate(cluster, "1:6", status.partition_id)
+    assert cache.get(cluster, pods) is None
+
+    cache.put(cluster, pods, status)
+    cache.invalidate(cluster)
+    assert cache.get(cluster, pods) is None
+
+
+def test_diagnose_cluster_cached(clock, monkeypatch) -> None:
+    pods = [ProbedPod(n) for n in "abc"]
+    cluster = Cluster(pods)
+    status = online_status(pods)
+    monkeypatch.setattr(diagnose, "g_cluster_status_cache", diagnose.ClusterStatusCache(15))
+    diagnose.g_cluster_status_cache.put(cluster, pods, status)
+
+    probes = []
+    monkeypatch.setattr(diagnose, "do_diagnose_cluster",
+                        lambda cluster, logger: probes.append(cluster) or status)
+    view = [(status.view_id, status.partition_id)]
+    monkeypatch.setattr(diagnose, "query_group_view", lambda pod, logger: view[0])
+
+    assert diagnose.diagnose_cluster(cluster, logger, use_cache=True).cached
+    assert probes == []
+
+    # missed view changes
+    view[0] = ("1:6", status.partition_id)
+    assert diagnose.diagnose_cluster(cluster, logger, use_cache=True) is status
+    view[0] = (status.view_id, "other")
+    assert diagnose.diagnose_cluster(cluster, logger, use_cache=True) is status
+    # can't query the PRIMARY
+    view[0] = (None, None)
+    assert diagnose.diagnose_cluster(cluster, logger, use_cache=True) is status
+    assert len(probes) == 3
+
+    view[0] = (status.view_id, status.partition_id)
+    assert not diagnose.diagnose_cluster(cluster, logger, use_cache=False).cached
+    assert len(probes) == 4
@@ -5,6 +5,7 @@
 
 import pytest
 import copy
+import types
 from .controller import consts, utils, config, shellutils
 from .controller.storage_api import StorageSpec, OCIOSStorageSpec, PVCStorageSpec
 from .controller.api_utils import ApiSpecError
@@ -218,7 +219,8 @@ def pod_spec_correct_output() -> dict:
 
 @pytest.fixture
 def object_factory() -> list:
-    return [Snapshot(), DumpInstance()]
+    # snapshots only support persistentVolumeClaim storage, see test_snapshot_storage
+    return [DumpInstance()]
 
 
 def test_parse_correct(object_factory, storage_correct) -> None:
@@ -293,3 +295,39 @@ def test_add_to_pod_spec(object_factory, storage_correct, pod_spec_correct_input
         test_obj.add_to_pod_spec(pod_spec, "container-name")
 
         assert pod_spec == pod_spec_correct_output
+
+
+def test_snapshot_storage(storage_correct) -> None:
+    with pytest.raises(ApiSpecError, match="One of persistentVolumeClaim must be set in test.storage"):
+        Snapshot().parse(storage_correct, "test")
+
+    test_obj = Snapshot()
+    test_obj.parse({"storage": {"persistentVolumeClaim": {"claimName": "backups"}}}, "test")
+    assert test_obj.storage.persistentVolumeClaim.raw_data == {"claimName": "backups"}
+    assert test_obj.scratchSizeLimit is None
+
+    other = Snapshot()
+    other.parse({"storage": {"persistentVolumeClaim": {"claimName": "backups"}},
+                 "scratchSizeLimit": "100Gi"}, "test")
+    assert other.scratchSizeLimit == "100Gi"
+    assert test_obj != other
+
+
+def test_clone_scratch(pod_spec_correct_input) -> None:
+    profile = Snapshot()
+    profile.parse({"storage": {"persistentVolumeClaim": {"claimName": "backups"}}}, "test")
+    spec = types.SimpleNamespace(mysql_image="mysql-server:8.0.33", mysql_image_pull_policy="IfNotPresent",
+                                 backupProfile=types.SimpleNamespace(snapshot=profile))
+
+    pod_spec = copy.deepcopy(pod_spec_correct_input)
+    backup_objects.add_clone_scratch_to_pod_spec(pod_spec, spec, "container-name")
+    scratch = [c for c in pod_spec["spec"]["containers"] if c["name"] == "scratch-mysql"][0]
+    assert "resources" not in scratch
+    assert {"name": "scratch", "emptyDir": {}} in pod_spec["spec"]["volumes"]
+
+    profile.scratchSizeLimit = "100Gi"
+    pod_spec = copy.deepcopy(pod_spec_correct_input)
+    backup_objects.add_clone_scratch_to_pod_spec(pod_spec, spec, "container-name")
+    scratch = [c for c in pod_spec["spec"]["containers"] if c["name"] == "scratch-mysql"][0]
+    assert scratch["resources"] == {"requests": {"ephemeral-storage": "100Gi"}}
+    assert {"name": "scratch", "emptyDir": {"sizeLimit": "100Gi"}} in pod_spec["spec"]["volumes"]
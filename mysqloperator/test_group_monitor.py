@@ -0,0 +1,91 @@
+import socket
+import threading
+import time
+import pytest
+from .controller import group_monitor
+from .controller.group_monitor import GroupMonitor, GroupMonitorWorker
+
+
+class Cluster:
+    namespace = "ns"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.session = object()
+        self.notices = 0
+
+    def handle_notice(self) -> None:
+        self.notices += 1
+
+
+@pytest.fixture
+def worker():
+    worker = GroupMonitorWorker(0)
+    yield worker
+    worker.stop()
+
+
+def run_once(worker: GroupMonitorWorker, connect_time: float, timeout: float = None) -> None:
+    """Runs an iteration of the worker loop, with connects blocking it for connect_time"""
+    def connect_due():
+        time.sleep(connect_time)
+        worker.stopped = True
+        return timeout
+
+    worker.connect_due = connect_due
+    worker.run()
+
+
+def test_notice_wait_stall(worker) -> None:
+    a, b = socket.socketpair()
+    cluster = Cluster("a")
+    worker.clusters.append(cluster)
+    worker.selector.register(a, group_monitor.selectors.EVENT_READ, cluster)
+    try:
+        # a notice that arrived while the loop was blocked connecting other
+        # clusters waited for the connects too
+        b.send(b"x")
+        run_once(worker, 0.2)
+        assert cluster.notices == 1
+        stats = worker.stats()
+        assert stats["notices"] == 1
+        assert stats["noticeWaitMax"] >= 0.2
+        a.recv(10)
+
+        # one arriving while waiting in select() is handled right away
+        worker.stopped = False
+        threading.Timer(0.1, lambda: b.send(b"x")).start()
+        run_once(worker, 0, timeout=5)
+        assert cluster.notices == 2
+        stats = worker.stats()
+        assert stats["notices"] == 2
+        assert stats["noticeWaitMax"] >= 0.2
+        assert stats["noticeWaitAvg"] < stats["noticeWaitMax"]
+    finally:
+        a.close()
+        b.close()
+
+
+def test_stats(monkeypatch) -> None:
+    monitor = GroupMonitor(2)
+    w0, w1 = monitor.workers
+    w0.clusters.append(Cluster("a"))
+    w0.notice_waits.add(1.0)
+    w0.notice_waits.add(3.0)
+    w1.notice_waits.add(5.0)
+
+    stats = monitor.stats()
+    assert stats["clusters"] == 1
+    assert stats["notices"] == 3
+    assert stats["noticeWaitAvg"] == 3.0
+    assert stats["noticeWaitMax"] == 5.0
+    assert [w["notices"] for w in stats["workers"]] == [2, 1]
+
+    # logging the stats of the last interval doesn't reset the totals
+    w0.logged_notice_waits.add(1.0)
+    monkeypatch.setattr(group_monitor, "k_stats_log_interval", 0)
+    w0.log_stats_if_due()
+    assert w0.logged_notice_waits.count == 0
+    assert monitor.stats()["notices"] == 3
+    for w in monitor.workers:
+        w.stop()
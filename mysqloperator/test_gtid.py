@@ -0,0 +1,47 @@
+from .controller.gtid import GTIDSet, maximal_sets
+
+A = "3e11fa47-71ca-11e1-9e33-c80aa9429562"
+B = "4d8f6e3b-71ca-11e1-9e33-c80aa9429562"
+
+
+def test_parse_and_format() -> None:
+    s = GTIDSet.parse(f"{B}:1-5:7,\n{A.upper()}:1-3:4-10:12")
+    assert str(s) == f"{A}:1-10:12,{B}:1-5:7"
+    assert s.count() == 17
+    assert not GTIDSet.parse("")
+    assert GTIDSet.parse("").count() == 0
+
+
+def test_parse_tagged() -> None:
+    s = GTIDSet.parse(f"{A}:1-5:tag1:1-2:3")
+    assert s.count() == 8
+    assert s.contains(f"{A}:tag1", 3)
+    assert not s.contains(A, 6)
+
+
+def test_algebra() -> None:
+    x = GTIDSet.parse(f"{A}:1-10:20-30,{B}:1-5")
+    y = GTIDSet.parse(f"{A}:5-25")
+
+    assert str(x | y) == f"{A}:1-30,{B}:1-5"
+    assert str(x & y) == f"{A}:5-10:20-25"
+    assert str(x - y) == f"{A}:1-4:26-30,{B}:1-5"
+    assert str(y - x) == f"{A}:11-19"
+    assert (x & y) <= x
+    assert x >= (x & y)
+    assert not x <= y
+    assert (x - x).count() == 0
+    assert x == GTIDSet.parse(str(x))
+
+
+def test_maximal_sets() -> None:
+    sets = {
+        0: GTIDSet.parse(f"{A}:1-10"),
+        1: GTIDSet.parse(f"{A}:1-12"),
+        2: GTIDSet.parse(f"{A}:1-12"),
+    }
+    assert maximal_sets(sets) == [1, 2]
+
+    # more transactions, but not a superset
+    sets[0] = GTIDSet.parse(f"{A}:1-5,{B}:1-100")
+    assert maximal_sets(sets) == [0, 1, 2]
@@ -0,0 +1,122 @@
+import types
+import pytest
+from .controller import k8sobject
+from .controller.k8sobject import EventPublisher, make_event
+
+
+class FakeCoreApi:
+    def __init__(self):
+        self.created = []
+        self.patched = []
+
+    def create_namespaced_event(self, namespace: str, body: dict):
+        self.created.append(body)
+        return types.SimpleNamespace(
+            metadata=types.SimpleNamespace(name=f"evt-{len(self.created)}"))
+
+    def patch_namespaced_event(self, name: str, namespace: str, body: dict):
+        self.patched.append((name, body))
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list:
+    now = [1000.0]
+    monkeypatch.setattr(k8sobject.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def api(monkeypatch) -> FakeCoreApi:
+    api = FakeCoreApi()
+    monkeypatch.setattr(k8sobject, "api_core", api)
+    return api
+
+
+def event(name: str, message: str, type: str = "Normal", reason: str = "Test") -> dict:
+    return make_event("ns", {"kind": "Pod", "name": name, "uid": name},
+                      type=type, action="Testing", reason=reason, message=message)
+
+
+def publish(publisher: EventPublisher) -> None:
+    ready, _ = publisher.take_ready()
+    for key, ev in ready:
+        publisher.post(key, ev)
+
+
+def test_repeats(clock, api) -> None:
+    publisher = EventPublisher()
+    for _ in range(3):
+        publisher.enqueue(event("a", "hello"))
+    publish(publisher)
+    assert [(e["message"], e["count"]) for e in api.created] == [("hello", 3)]
+
+    # repeats of a posted event update it
+    publisher.enqueue(event("a", "hello"))
+    publish(publisher)
+    assert len(api.created) == 1
+    assert api.patched[0][0] == "evt-1"
+    assert api.patched[0][1]["count"] == 4
+
+
+def test_per_object_buckets(clock, api) -> None:
+    publisher = EventPublisher()
+    for i in range(k8sobject.k_event_burst):
+        publisher.enqueue(event("a", f"a{i}"))
+    # a is out of tokens, b isn't affected
+    publisher.enqueue(event("a", "over"))
+    publisher.enqueue(event("b", "b0"))
+    publish(publisher)
+
+    messages = [e["message"] for e in api.created]
+    assert len(messages) == k8sobject.k_event_burst + 1
+    assert messages[-1] == "b0"
+    assert len(publisher.pending) == 1
+
+
+def test_aggregate(clock, api) -> None:
+    publisher = EventPublisher()
+    for i in range(k8sobject.k_event_burst):
+        publisher.enqueue(event("a", f"a{i}"))
+    publish(publisher)
+
+    publisher.enqueue(event("a", "first", type="Warning", reason="Failed"))
+    publisher.enqueue(event("a", "second"))
+    publisher.enqueue(event("a", "third", reason="Other"))
+    # folded into a single event for the object
+    assert len(publisher.pending) == 1
+    (ev,) = publisher.pending.values()
+    assert ev.count == 3
+    assert ev.body["message"] == k8sobject.k_event_aggregate_prefix + "third"
+    assert ev.body["reason"] == "Other"
+    # the most severe type is kept
+    assert ev.body["type"] == "Warning"
+
+    # posted once the object gets a token
+    publish(publisher)
+    assert len(api.created) == k8sobject.k_event_burst
+    clock[0] += k8sobject.k_event_refill_interval
+    publish(publisher)
+    assert len(api.created) == k8sobject.k_event_burst + 1
+    assert api.created[-1]["count"] == 3
+    assert api.created[-1]["type"] == "Warning"
+
+    # later over-rate events add to the count of the posted aggregate
+    publisher.enqueue(event("a", "fourth"))
+    publisher.enqueue(event("a", "fifth"))
+    clock[0] += k8sobject.k_event_refill_interval
+    publish(publisher)
+    assert api.patched == [("evt-26", {
+        "count": 5,
+        "message": k8sobject.k_event_aggregate_prefix + "fifth",
+        "lastTimestamp": api.patched[0][1]["lastTimestamp"],
+        "series": {"count": 5, "lastObservedTime": api.patched[0][1]["lastTimestamp"]}
+    })]
+
+
+def test_stop_flushes(clock, api) -> None:
+    publisher = EventPublisher()
+    for i in range(k8sobject.k_event_burst + 1):
+        publisher.enqueue(event("a", f"a{i}"))
+    publisher.stopped = True
+    publish(publisher)
+    assert len(api.created) == k8sobject.k_event_burst + 1
@@ -0,0 +1,158 @@
+from .controller.manifests import diff_patch, load_manifest, rollout_changes
+
+
+LIVE = {
+    "spec": {
+        "replicas": 3,
+        "template": {
+            "spec": {
+                "containers": [
+                    {"name": "sidecar", "image": "op:1", "terminationMessagePath": "/dev/termination-log"},
+                    {"name": "mysql", "image": "mysql:8.0.31",
+                     "ports": [{"containerPort": 3306, "protocol": "TCP"}]},
+                ]
+            }
+        },
+        "volumeClaimTemplates": [
+            {"metadata": {"name": "datadir"},
+             "spec": {"accessModes": ["ReadWriteOnce"], "volumeMode": "Filesystem"}}
+        ]
+    }
+}
+
+
+def test_no_changes() -> None:
+    patch = {
+        "spec": {
+            "replicas": 3,
+            "template": {
+                "spec": {
+                    "containers": [
+                        {"name": "mysql", "image": "mysql:8.0.31", "ports": [{"containerPort": 3306}]},
+                        {"name": "sidecar", "image": "op:1"},
+                    ]
+                }
+            },
+            "volumeClaimTemplates": [
+                {"metadata": {"name": "datadir"}, "spec": {"accessModes": ["ReadWriteOnce"]}}
+            ]
+        }
+    }
+    assert diff_patch(LIVE, patch) == []
+
+
+def test_changes() -> None:
+    patch = {
+        "spec": {
+            "replicas": 1,
+            "template": {
+                "spec": {
+                    "containers": [
+                        {"name": "mysql", "image": "mysql:8.0.32", "ports": [{"containerPort": 3307}]},
+                        {"name": "router", "image": "router:1"},
+                    ]
+                }
+            },
+            "volumeClaimTemplates": [
+                {"metadata": {"name": "datadir"}, "spec": {"accessModes": ["ReadWriteOnce"]}},
+                {"metadata": {"name": "other"}}
+            ]
+        }
+    }
+    changes = diff_patch(LIVE, patch)
+    assert changes == [
+        "spec.replicas",
+        "spec.template.spec.containers[mysql].image",
+        "spec.template.spec.containers[mysql].ports",
+        "spec.template.spec.containers[router]",
+        "spec.volumeClaimTemplates",
+    ]
+    assert rollout_changes(changes) == changes[1:4]
+
+
+def test_unnamed_item_changes() -> None:
+    live = {
+        "spec": {
+            "template": {
+                "spec": {
+                    "tolerations": [
+                        {"key": "dedicated", "operator": "Equal", "value": "db", "effect": "NoSchedule"}
+                    ],
+                    "topologySpreadConstraints": [
+                        {"maxSkew": 1, "topologyKey": "zone", "whenUnsatisfiable": "DoNotSchedule",
+                         "labelSelector": {"matchLabels": {"app": "mysql", "tier": "db"}}}
+                    ]
+                }
+            }
+        }
+    }
+    # operator is defaulted by the server
+    same = {
+        "spec": {
+            "template": {
+                "spec": {
+                    "tolerations": [
+                        {"key": "dedicated", "value": "db", "effect": "NoSchedule"}
+                    ],
+                    "topologySpreadConstraints": [
+                        {"maxSkew": 1, "topologyKey": "zone", "whenUnsatisfiable": "DoNotSchedule",
+                         "labelSelector": {"matchLabels": {"app": "mysql", "tier": "db"}}}
+                    ]
+                }
+            }
+        }
+    }
+    assert diff_patch(live, same) == []
+
+    # keys removed from items of lists without names
+    removed = {
+        "spec": {
+            "template": {
+                "spec": {
+                    "tolerations": [
+                        {"key": "dedicated", "operator": "Equal", "value": "db"}
+                    ],
+                    "topologySpreadConstraints": [
+                        {"maxSkew": 1, "topologyKey": "zone", "whenUnsatisfiable": "DoNotSchedule",
+                         "labelSelector": {"matchLabels": {"app": "mysql"}}}
+                    ]
+                }
+            }
+        }
+    }
+    assert diff_patch(live, removed) == ["spec.template.spec.tolerations",
+                                         "spec.template.spec.topologySpreadConstraints"]
+
+
+def test_server_defaults_by_path() -> None:
+    def sts(ports: list, claim: dict) -> dict:
+        return {"spec": {
+            "template": {"spec": {"containers": [{"name": "mysql", "ports": ports}]}},
+            "volumeClaimTemplates": [claim]
+        }}
+
+    live = sts([{"containerPort": 3306, "protocol": "TCP"},
+                {"containerPort": 33061, "protocol": "UDP"}],
+               {"apiVersion": "v1", "kind": "PersistentVolumeClaim",
+                "metadata": {"name": "datadir"},
+                "spec": {"accessModes": ["ReadWriteOnce"], "volumeMode": "Filesystem"},
+                "status": {"phase": "Pending"}})
+    claim = {"metadata": {"name": "datadir"}, "spec": {"accessModes": ["ReadWriteOnce"]}}
+
+    assert diff_patch(live, sts([{"containerPort": 3306}, {"containerPort": 33061, "protocol": "UDP"}],
+                                claim)) == []
+    # UDP isn't the default, so it's removed
+    assert diff_patch(live, sts([{"containerPort": 3306}, {"containerPort": 33061}], claim)) == [
+        "spec.template.spec.containers[mysql].ports"]
+
+    # the same values elsewhere aren't defaults
+    live["spec"]["volumeClaimTemplates"][0]["spec"]["protocol"] = "TCP"
+    assert diff_patch(live, sts([{"containerPort": 3306}, {"containerPort": 33061, "protocol": "UDP"}],
+                                claim)) == ["spec.volumeClaimTemplates"]
+
+
+def test_load_manifest() -> None:
+    text = "a:\n  b: [1, 2]\n"
+    doc = load_manifest(text)
+    doc["a"]["b"].append(3)
+    assert load_manifest(text) == {"a": {"b": [1, 2]}}
@@ -0,0 +1,47 @@
+from .controller.gtid import GTIDSet
+from .controller.innodbcluster import recovery
+
+A = "3e11fa47-71ca-11e1-9e33-c80aa9429562"
+MB = 1024*1024
+
+
+def select(pod: str, donor: str, purged: str, binlog_size: int, data_size: int) -> str:
+    method, _ = recovery.select_recovery_method(
+        GTIDSet.parse(pod), GTIDSet.parse(donor), GTIDSet.parse(purged),
+        binlog_size, data_size)
+    return method
+
+
+def test_purged() -> None:
+    # transactions the instance needs are gone from the binlogs
+    assert select(f"{A}:1-10", f"{A}:1-100", f"{A}:1-20", 0, 1024*MB) == "clone"
+    assert select("", f"{A}:1-100", f"{A}:1", 0, 1024*MB) == "clone"
+    # purged before what the instance already has
+    assert select(f"{A}:1-20", f"{A}:1-100", f"{A}:1-20", 0, 1024*MB) == "incremental"
+
+
+def test_boundary() -> None:
+    # 1000 transactions in 200M of binlogs, all 1000 missing from the
+    # instance: incremental costs 3 * 200M = 600M, clone costs the dataset
+    # plus 512M, so they cost the same with an 88M dataset
+    pod = f"{A}:1-999000"
+    donor = f"{A}:1-1000000"
+    purged = f"{A}:1-999000"
+    incremental = 200 * MB * recovery.k_incremental_apply_cost_factor
+    break_even = incremental - recovery.k_clone_fixed_cost
+    assert break_even == 88 * MB
+
+    assert select(pod, donor, purged, 200 * MB, break_even) == "incremental"
+    assert select(pod, donor, purged, 200 * MB, break_even + 1) == "incremental"
+    assert select(pod, donor, purged, 200 * MB, break_even - 1) == "clone"
+    assert select(pod, donor, purged, 200 * MB, 0) == "clone"
+
+    # half the transactions missing halves the incremental cost
+    pod = f"{A}:1-999500"
+    assert select(pod, donor, purged, 200 * MB, 0) == "incremental"
+
+
+def test_nothing_missing() -> None:
+    assert select(f"{A}:1-100", f"{A}:1-100", "", 10 * MB, 0) == "incremental"
+    # no binlogs to estimate from
+    assert select("", f"{A}:1-100", "", 0, 0) == "incremental"
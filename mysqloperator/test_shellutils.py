@@ -0,0 +1,73 @@
+import threading
+import time
+import mysqlsh
+from .controller.shellutils import DbaPool, PooledDba
+
+
+class Session:
+    def __init__(self, hang: threading.Event = None, error: bool = False):
+        self.hang = hang
+        self.error = error
+        self.queries = 0
+        self.closed = False
+
+    def run_sql(self, sql: str):
+        self.queries += 1
+        if self.hang:
+            self.hang.wait(5)
+        if self.error:
+            raise mysqlsh.Error(2013, "Lost connection to MySQL server during query")
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class Dba:
+    def __init__(self, session: Session):
+        self.session = session
+
+
+def idle_entry(session: Session, idle: float = 60) -> PooledDba:
+    entry = PooledDba(Dba(session))
+    entry.last_used -= idle
+    return entry
+
+
+def test_ping() -> None:
+    pool = DbaPool(ping_timeout=1, ping_skip=5)
+
+    session = Session()
+    assert pool.ping(idle_entry(session))
+    assert session.queries == 1 and not session.closed
+
+    session = Session(error=True)
+    assert not pool.ping(idle_entry(session))
+    assert session.closed
+
+    # sessions used in the last ping_skip seconds aren't pinged
+    session = Session(error=True)
+    assert pool.ping(idle_entry(session, idle=1))
+    assert session.queries == 0
+
+
+def test_ping_hung() -> None:
+    pool = DbaPool(ping_timeout=0.1, ping_workers=2)
+    hang = threading.Event()
+    hung = [Session(hang) for _ in range(4)]
+    try:
+        for session in hung:
+            assert not pool.ping(idle_entry(session))
+        # the hung sessions can only take the executor threads, those
+        # queued behind them are never used
+        assert sum(s.queries for s in hung) == 2
+        assert len(pool.ping_executor._threads) == 2
+        assert not any(s.closed for s in hung)
+    finally:
+        hang.set()
+
+    # abandoned sessions are closed once they answer
+    deadline = time.monotonic() + 5
+    while not all(s.closed for s in hung):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert sum(s.queries for s in hung) == 2
@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import time
+
+from .controller import snapshot
+
+
+def make_tree(root: str) -> None:
+    os.makedirs(os.path.join(root, "db", "empty"))
+    with open(os.path.join(root, "ibdata1"), "wb") as f:
+        f.write(os.urandom(1000) + b"\0" * 100000)
+    with open(os.path.join(root, "db", "t.ibd"), "wb") as f:
+        f.write(b"x" * 10)
+    open(os.path.join(root, "db", "empty.txt"), "w").close()
+
+
+def test_write_snapshot(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(snapshot, "k_chunk_size", 4096)
+    make_tree(str(tmp_path / "src"))
+
+    manifest = snapshot.write_snapshot(str(tmp_path / "src"), str(tmp_path / "out"), 4,
+                                       {"gtidExecuted": "x:1-10"})
+
+    with open(tmp_path / "out" / snapshot.SNAPSHOT_MANIFEST) as f:
+        assert json.load(f) == manifest
+    assert manifest["gtidExecuted"] == "x:1-10"
+
+    files = {f["path"]: f for f in manifest["files"]}
+    assert files["db/empty"]["directory"]
+    assert len(files["ibdata1"]["chunks"]) == 25
+    assert files["db/empty.txt"]["chunks"] == []
+    assert manifest["stats"]["dataSize"] == 101010
+    assert manifest["stats"]["fileCount"] == 3
+    assert manifest["stats"]["size"] < manifest["stats"]["dataSize"]
+    assert len(os.listdir(tmp_path / "out" / snapshot.SNAPSHOT_CHUNKS_DIR)) == 26
+
+
+def test_restore_snapshot(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(snapshot, "k_chunk_size", 4096)
+    src = tmp_path / "src"
+    make_tree(str(src))
+    snapshot.write_snapshot(str(src), str(tmp_path / "out"), 4)
+
+    dest = tmp_path / "dest"
+    snapshot.restore_snapshot(str(tmp_path / "out"), str(dest), 4)
+
+    assert os.path.isdir(dest / "db" / "empty")
+    for path in ("ibdata1", "db/t.ibd", "db/empty.txt"):
+        assert (dest / path).read_bytes() == (src / path).read_bytes()
+
+
+def test_default_threads(monkeypatch) -> None:
+    assert 1 <= snapshot.available_cpus() <= os.cpu_count()
+
+    monkeypatch.setattr(snapshot, "available_cpus", lambda: 64)
+    assert snapshot.default_threads() == snapshot.k_max_threads
+    monkeypatch.setattr(snapshot, "available_cpus", lambda: 2)
+    assert snapshot.default_threads() == 2
+
+
+def test_clone_recipient_config() -> None:
+    cnf = snapshot.clone_recipient_config("/scratch", {
+        "group_replication": "group_replication.so",
+        "clone": "mysql_clone.so",
+        "keyring_file": "keyring_file.so"
+    }, {"character_set_server": "latin1", "innodb_page_size": "8192"})
+    lines = cnf.splitlines()
+
+    assert lines[0] == "[mysqld]"
+    assert lines.count("plugin-load-add=mysql_clone.so") == 1
+    assert "plugin-load-add=group_replication.so" in lines
+    assert "loose-group_replication_start_on_boot=OFF" in lines
+    assert "early-plugin-load=keyring_file.so" in lines
+    assert "character_set_server=latin1" in lines
+    assert "innodb_page_size=8192" in lines
+    assert "skip-networking" in lines
+    assert not any(l.startswith("collation_server") for l in lines)
+
+
+def start_clone_recipient(tmp_path, lifetime: int) -> subprocess.Popen:
+    bindir = tmp_path / "bin"
+    bindir.mkdir(exist_ok=True)
+    (bindir / "mysqld").write_text(f'#!/bin/sh\necho "$@" >> {tmp_path}/mysqld.log\n')
+    (bindir / "mysqld").chmod(0o755)
+    return subprocess.Popen(["bash", "-c", snapshot.clone_recipient_script(str(tmp_path), lifetime)],
+                            env=dict(os.environ, PATH=f"{bindir}:{os.environ['PATH']}"))
+
+
+def test_clone_recipient_script(tmp_path) -> None:
+    proc = start_clone_recipient(tmp_path, 60)
+    (tmp_path / snapshot.CLONE_RECIPIENT_CNF).write_text("[mysqld]\n")
+
+    log = tmp_path / "mysqld.log"
+    deadline = time.monotonic() + 10
+    while not log.exists() or len(log.read_text().splitlines()) < 2:
+        assert time.monotonic() < deadline and proc.poll() is None
+        time.sleep(0.1)
+    assert log.read_text().splitlines() == [
+        f"--defaults-file={tmp_path}/my.cnf --initialize-insecure",
+        f"--defaults-file={tmp_path}/my.cnf"]
+
+    # keeps running until told to stop
+    time.sleep(1)
+    assert proc.poll() is None
+    (tmp_path / snapshot.CLONE_RECIPIENT_DONE).touch()
+    assert proc.wait(timeout=10) == 0
+
+
+def test_clone_recipient_script_stops(tmp_path) -> None:
+    # the backup failed before configuring the instance
+    (tmp_path / snapshot.CLONE_RECIPIENT_DONE).touch()
+    assert start_clone_recipient(tmp_path, 60).wait(timeout=10) == 0
+    assert not (tmp_path / "mysqld.log").exists()
+
+    # the backup container never said anything
+    os.remove(tmp_path / snapshot.CLONE_RECIPIENT_DONE)
+    assert start_clone_recipient(tmp_path, 2).wait(timeout=10) == 1
@@ -0,0 +1,27 @@
+from .controller.utils import apply_merge_patch, combine_merge_patches
+
+
+def check_combined(target: dict, first: dict, second: dict) -> None:
+    combined = combine_merge_patches(first, second, target)
+    assert apply_merge_patch(target, combined) == \
+        apply_merge_patch(apply_merge_patch(target, first), second)
+
+
+def test_combine_merge_patches() -> None:
+    target = {"a": {"x": 0, "y": 0}, "b": 1}
+
+    check_combined(target, {"a": {"x": 1}}, {"a": {"y": 2}, "b": None})
+    check_combined(target, {"b": None}, {"b": 2})
+    check_combined(target, {"a": {"x": None}}, {"a": {"x": 3}})
+    assert combine_merge_patches({"a": {"x": 1}}, {"a": {"y": 2}}) == {"a": {"x": 1, "y": 2}}
+
+
+def test_combine_merge_patches_delete_then_set() -> None:
+    target = {"a": {"x": 0, "y": {"z": 0}}}
+
+    # a is replaced, not merged into the old a
+    combined = combine_merge_patches({"a": None}, {"a": {"x": 1}}, target)
+    assert apply_merge_patch(target, combined) == {"a": {"x": 1}}
+
+    check_combined(target, {"a": None}, {"a": {"y": {"w": 1}, "v": None}})
+    assert combine_merge_patches({"a": None}, {"a": {"x": 1}}) == {"a": {"x": 1}}
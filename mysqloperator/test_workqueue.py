@@ -0,0 +1,113 @@
+import threading
+import time
+from .controller.workqueue import WorkQueue
+
+
+def wait_for(cond, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_dedupe() -> None:
+    handled = []
+    queue = WorkQueue("test", lambda key, item: handled.append((key, item)))
+    queue.add("a", 1)
+    queue.add("b", 1)
+    queue.add("a", 2)
+    queue.add("a", 3)
+    assert len(queue) == 2
+
+    queue.start()
+    try:
+        wait_for(lambda: len(handled) == 2)
+        time.sleep(0.1)
+        assert handled == [("a", 3), ("b", 1)]
+    finally:
+        queue.stop()
+
+
+def test_requeue_in_flight() -> None:
+    handled = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(key, item):
+        handled.append(item)
+        if item == 1:
+            started.set()
+            release.wait(5)
+
+    queue = WorkQueue("test", handler, workers=4)
+    queue.start()
+    try:
+        queue.add("a", 1)
+        assert started.wait(5)
+        # added while a is processed, neither runs on another worker
+        queue.add("a", 2)
+        queue.add("a", 3)
+        time.sleep(0.1)
+        assert handled == [1]
+
+        release.set()
+        wait_for(lambda: len(handled) == 2)
+        time.sleep(0.1)
+        assert handled == [1, 3]
+    finally:
+        queue.stop()
+
+
+def test_ordering_per_key() -> None:
+    lock = threading.Lock()
+    active = set()
+    overlaps = []
+    handled = {}
+
+    def handler(key, item):
+        with lock:
+            if key in active:
+                overlaps.append(key)
+            active.add(key)
+        time.sleep(0.001)
+        with lock:
+            active.discard(key)
+            handled.setdefault(key, []).append(item)
+
+    queue = WorkQueue("test", handler, workers=4)
+    queue.start()
+    try:
+        for i in range(200):
+            queue.add(f"k{i % 4}", i)
+        wait_for(lambda: len(queue) == 0 and not queue.processing)
+
+        assert overlaps == []
+        for key, items in handled.items():
+            # items of a key are handled in the order they were added,
+            # skipping replaced ones, and the last one always is
+            assert items == sorted(items)
+            assert items[-1] == max(i for i in range(200) if f"k{i % 4}" == key)
+    finally:
+        queue.stop()
+
+
+def test_retry() -> None:
+    handled = []
+
+    def handler(key, item):
+        handled.append((key, item, time.monotonic()))
+        return 0.2 if len(handled) == 1 else None
+
+    queue = WorkQueue("test", handler)
+    queue.start()
+    try:
+        queue.add("a", 1)
+        wait_for(lambda: len(handled) == 1)
+        # replaces the item waiting for its retry, keeping the retry time
+        queue.add("a", 2)
+        queue.add("b", 1)
+        wait_for(lambda: len(handled) == 3)
+        assert [(key, item) for key, item, _ in handled] == [("a", 1), ("b", 1), ("a", 2)]
+        assert handled[2][2] - handled[0][2] >= 0.2
+    finally:
+        queue.stop()
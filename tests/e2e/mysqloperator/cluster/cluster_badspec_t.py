@@ -515,7 +515,7 @@ spec:
         self.assertGotClusterEvent(
             "mycluster", type="Normal", reason="Logging", msg=rf"Propagating spec.version=8.8.8 for {self.ns}/mycluster \(was None\)")
         self.assertGotClusterEvent(
-            "mycluster", type="Error", reason="Logging", msg="Handler 'on_innodbcluster_field_version/spec.version' failed permanently: version 8.8.8 must be between .*")
+            "mycluster", type="Error", reason="Logging", msg="Handler 'on_innodbcluster_update' failed permanently: version 8.8.8 must be between .*")
         self.assertGotClusterEvent(
             "mycluster", type="Normal", reason="Logging", msg="Updating is processed: 0 succeeded; 1 failed.")
 
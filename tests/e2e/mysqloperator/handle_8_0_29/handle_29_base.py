@@ -119,7 +119,7 @@ spec:
     def verify_update_rejected(self, update_time, from_version, to_version):
         # e.g.
         # 16m  Normal  Logging   innodbcluster/mycluster  Propagating spec.version=8.0.29 for namespace/mycluster (was 8.0.28)
-        # 16m  Error   Logging   innodbcluster/mycluster  Handler 'on_innodbcluster_field_version/spec.version' failed permanently: Support for MySQL 8.0.29 is disabled. Please see http://....
+        # 16m  Error   Logging   innodbcluster/mycluster  Handler 'on_innodbcluster_update' failed permanently: Support for MySQL 8.0.29 is disabled. Please see http://....
         # 16m  Normal  Logging   innodbcluster/mycluster  Updating is processed: 0 succeeded; 1 failed.
         self.wait_got_cluster_event(
             "mycluster", after=update_time, type="Normal",
@@ -128,7 +128,7 @@ spec:
         self.wait_got_cluster_event(
             "mycluster", after=update_time, type="Error",
             reason="Logging",
-            msg=rf"Handler 'on_innodbcluster_field_version/spec.version' failed permanently\: Support for MySQL {to_version} is disabled. Please see https\://dev.mysql.com/doc/relnotes/mysql-operator/en/news-8-0-29.html")
+            msg=rf"Handler 'on_innodbcluster_update' failed permanently\: Support for MySQL {to_version} is disabled. Please see https\://dev.mysql.com/doc/relnotes/mysql-operator/en/news-8-0-29.html")
         self.wait_got_cluster_event(
             "mycluster", after=update_time, type="Normal",
             reason="Logging",